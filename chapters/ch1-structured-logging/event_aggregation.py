@@ -0,0 +1,208 @@
+# event_aggregation.py
+#
+# Fixed-memory aggregation for high-volume structured events.
+#
+# Under a credential-stuffing attack, log_login_failure() writes one warning
+# per attempt — millions of near-identical lines. EventAggregator counts
+# events per dimension (user_id, error_type, ...) in a count-min sketch plus
+# a Space-Saving top-K, and logs:
+#   • each event individually while its key (by default the first dimension,
+#     e.g. user_id) is below `threshold` in the window
+#   • one summary record per window: estimated totals and the top offenders.
+#     With start(), a daemon thread emits it when the window ends, even if
+#     no further event arrives to notice that.
+#
+# Memory is width × depth counters plus top_k entries per dimension, no
+# matter how many distinct user_ids show up.
+import threading
+import time
+from array import array
+from typing import Callable, Hashable
+
+from loguru import logger
+
+
+class CountMinSketch:
+    """Approximate counts in fixed memory; estimates never undercount."""
+
+    def __init__(self, width: int = 2048, depth: int = 4):
+        self.width = width
+        self.depth = depth
+        self.rows = [array("Q", bytes(8 * width)) for _ in range(depth)]
+
+    def _cells(self, key: Hashable):
+        for seed, row in enumerate(self.rows):
+            yield row, hash((seed, key)) % self.width
+
+    def add(self, key: Hashable, count: int = 1) -> int:
+        """Add `count` to `key` and return its new estimate.
+
+        Uses conservative update: only the cells at the current minimum are
+        raised, which keeps over-estimation from hash collisions low.
+        """
+        cells = list(self._cells(key))
+        estimate = min(row[index] for row, index in cells) + count
+        for row, index in cells:
+            if row[index] < estimate:
+                row[index] = estimate
+        return estimate
+
+    def estimate(self, key: Hashable) -> int:
+        return min(row[index] for row, index in self._cells(key))
+
+    def clear(self) -> None:
+        for row in self.rows:
+            row[:] = array("Q", bytes(8 * self.width))
+
+
+class SpaceSaving:
+    """Top-K heavy hitters (Metwally et al.) in `k` slots.
+
+    Each entry's count overestimates the true count by at most its `error`.
+    """
+
+    def __init__(self, k: int = 10):
+        self.k = k
+        self.counters: dict[Hashable, list[int]] = {}  # key -> [count, error]
+
+    def add(self, key: Hashable, count: int = 1) -> None:
+        entry = self.counters.get(key)
+        if entry is not None:
+            entry[0] += count
+        elif len(self.counters) < self.k:
+            self.counters[key] = [count, 0]
+        else:
+            # Replace the smallest counter; the newcomer inherits its count.
+            victim = min(self.counters, key=lambda k: self.counters[k][0])
+            floor = self.counters.pop(victim)[0]
+            self.counters[key] = [floor + count, floor]
+
+    def top(self, n: int | None = None) -> list[tuple[Hashable, int, int]]:
+        """(key, count, error) sorted by count, largest first."""
+        ranked = sorted(self.counters.items(), key=lambda item: item[1][0], reverse=True)
+        return [(key, count, error) for key, (count, error) in ranked[:n]]
+
+    def clear(self) -> None:
+        self.counters.clear()
+
+
+class EventAggregator:
+    """Log an event individually while it's rare, as a window summary once it isn't.
+
+    Usage:
+        login_failures = EventAggregator("user_login_failed", dimensions=("user_id", "error_type"))
+        login_failures.record(user_id=123, error_type="invalid_password")
+    """
+
+    def __init__(
+        self,
+        event: str,
+        dimensions: tuple[str, ...],
+        threshold: int = 5,
+        threshold_dimensions: tuple[str, ...] | None = None,
+        window: float = 60.0,
+        top_k: int = 10,
+        width: int = 2048,
+        depth: int = 4,
+        level: str = "WARNING",
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.event = event
+        self.dimensions = dimensions
+        self.threshold = threshold
+        # Low-cardinality fields like error_type are counted but don't gate.
+        self.threshold_dimensions = threshold_dimensions or dimensions[:1]
+        self.window = window
+        self.level = level
+        self.clock = clock
+
+        self.sketch = CountMinSketch(width, depth)
+        self.top = {dimension: SpaceSaving(top_k) for dimension in dimensions}
+        self._lock = threading.Lock()
+        self._window_start = clock()
+        self._total = 0
+        self._suppressed = 0
+        self._reporter: threading.Thread | None = None
+        self._stopped = threading.Event()
+
+    def record(self, **fields) -> None:
+        """Count one event; log it individually unless its key is over threshold."""
+        with self._lock:
+            if self.clock() - self._window_start >= self.window:
+                self._flush_locked()
+            self._total += 1
+            noisy = False
+            for dimension in self.dimensions:
+                value = fields.get(dimension)
+                self.top[dimension].add(value)
+                estimate = self.sketch.add((dimension, value))
+                if estimate > self.threshold and dimension in self.threshold_dimensions:
+                    noisy = True
+            if noisy:
+                self._suppressed += 1
+                return
+        logger.bind(**fields).log(self.level, self.event)
+
+    def flush(self) -> None:
+        """Emit the summary for the current window now (e.g. at shutdown)."""
+        with self._lock:
+            self._flush_locked()
+
+    def flush_expired(self) -> bool:
+        """Close the current window if it has ended; True if it was closed."""
+        with self._lock:
+            if self.clock() - self._window_start < self.window:
+                return False
+            self._flush_locked()
+            return True
+
+    def start(self) -> bool:
+        """Close windows on time from a daemon thread; False if it already runs."""
+        if self._reporter is not None:
+            return False
+        with self._lock:
+            if self._reporter is not None:
+                return False
+            self._stopped.clear()
+            self._reporter = threading.Thread(
+                target=self._report_loop, name=f"{self.event}-aggregator", daemon=True
+            )
+            self._reporter.start()
+        return True
+
+    def _report_loop(self) -> None:
+        while True:
+            with self._lock:
+                remaining = self._window_start + self.window - self.clock()
+            if self._stopped.wait(max(remaining, 0.0)):
+                return
+            self.flush_expired()
+
+    def stop(self) -> None:
+        """Stop the reporter thread and emit the last summary."""
+        self._stopped.set()
+        if self._reporter is not None:
+            self._reporter.join()
+            self._reporter = None
+        self.flush()
+
+    def _flush_locked(self) -> None:
+        if self._suppressed:
+            summary = {
+                "window_s": round(self.clock() - self._window_start, 1),
+                "total_events": self._total,
+                "suppressed_events": self._suppressed,
+            }
+            for dimension, top in self.top.items():
+                summary[f"top_{dimension}"] = [
+                    {dimension: key, "count": count, "max_overcount": error}
+                    for key, count, error in top.top()
+                ]
+            logger.bind(**summary).log(self.level, f"{self.event}_summary")
+
+        self.sketch.clear()
+        for top in self.top.values():
+            top.clear()
+        self._window_start = self.clock()
+        self._total = 0
+        self._suppressed = 0
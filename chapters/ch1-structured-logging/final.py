@@ -1,8 +1,11 @@
+import atexit
 import sys
 import os
 from loguru import logger
 from dotenv import load_dotenv
 
+from event_aggregation import EventAggregator
+
 load_dotenv()
 
 # 1. Configure for Production (JSON)
@@ -19,6 +22,33 @@ def log_login_failure(user_id: int, error_type: str) -> None:
     # Log the event name
     context_logger.warning("user_login_failed")
 
+# 3. High-volume variant: individual events while rare, one summary per window
+login_failures = EventAggregator(
+    "user_login_failed",
+    dimensions=("user_id", "error_type"),
+    threshold=int(os.getenv("LOGIN_FAILURE_THRESHOLD", "5")),
+    window=float(os.getenv("LOGIN_FAILURE_WINDOW", "60")),
+)
+
+def record_login_failure(user_id: int, error_type: str) -> None:
+    # The reporter thread (summaries go out when each window ends) and the
+    # exit flush start with the first event, not when this module is imported.
+    if login_failures.start():
+        atexit.register(login_failures.stop)
+    login_failures.record(user_id=user_id, error_type=error_type)
+
 if __name__ == "__main__":
-    # 3. Simulate an event
+    # 4. Simulate an event
     log_login_failure(123, "invalid_password")
+
+    # 5. Simulate a credential-stuffing burst: `python final.py attack`
+    if sys.argv[1:] == ["attack"]:
+        import random
+
+        for _ in range(100_000):
+            # A few targeted accounts, plus a trickle of genuine failures
+            if random.random() < 0.999:
+                user_id = random.choice([7, 42, 1001])
+            else:
+                user_id = random.randint(1, 10**6)
+            record_login_failure(user_id, random.choice(["invalid_password", "account_locked"]))
@@ -0,0 +1,104 @@
+import time
+
+from loguru import logger
+
+from event_aggregation import CountMinSketch, EventAggregator, SpaceSaving
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _capture():
+    records = []
+    logger.remove()
+    logger.add(lambda message: records.append(message.record), level="DEBUG")
+    return records
+
+
+def test_count_min_never_undercounts():
+    sketch = CountMinSketch(width=64, depth=4)
+    for key in range(500):
+        for _ in range(key % 7):
+            sketch.add(key)
+
+    assert all(sketch.estimate(key) >= key % 7 for key in range(500))
+    assert sketch.estimate(3) < 500
+
+
+def test_space_saving_keeps_heavy_hitters_in_fixed_slots():
+    top = SpaceSaving(k=5)
+    for i in range(10_000):
+        top.add("attacker" if i % 2 else f"user-{i}")
+
+    key, count, error = top.top(1)[0]
+    assert key == "attacker"
+    assert count - error <= 5_000 <= count
+    assert len(top.counters) == 5
+
+
+def test_events_log_individually_until_threshold_then_summarize():
+    records = _capture()
+    clock = FakeClock()
+    failures = EventAggregator(
+        "user_login_failed",
+        dimensions=("user_id", "error_type"),
+        threshold=3,
+        window=60,
+        clock=clock,
+    )
+
+    for _ in range(1000):
+        failures.record(user_id=42, error_type="invalid_password")
+    failures.record(user_id=7, error_type="invalid_password")
+    assert [r["extra"]["user_id"] for r in records] == [42, 42, 42, 7]
+
+    clock.now = 61
+    failures.record(user_id=42, error_type="invalid_password")
+
+    summary = records[4]
+    assert summary["message"] == "user_login_failed_summary"
+    assert summary["extra"]["total_events"] == 1001
+    assert summary["extra"]["suppressed_events"] == 997
+    assert summary["extra"]["top_user_id"][0] == {"user_id": 42, "count": 1000, "max_overcount": 0}
+    # New window: user 42 is logged individually again.
+    assert records[5]["message"] == "user_login_failed"
+
+
+def test_expired_window_is_flushed_without_a_new_event():
+    records = _capture()
+    clock = FakeClock()
+    failures = EventAggregator("user_login_failed", dimensions=("user_id",), threshold=1, window=60, clock=clock)
+    for _ in range(5):
+        failures.record(user_id=42)
+
+    assert not failures.flush_expired()
+    clock.now = 60
+    assert failures.flush_expired()
+    assert records[-1]["extra"]["suppressed_events"] == 4
+
+
+def test_reporter_thread_emits_the_summary_when_the_window_ends():
+    records = _capture()
+    failures = EventAggregator("user_login_failed", dimensions=("user_id",), threshold=1, window=0.05)
+    failures.start()
+    try:
+        for _ in range(5):
+            failures.record(user_id=42)
+        deadline = time.monotonic() + 2
+        while not any(r["message"] == "user_login_failed_summary" for r in records):
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+    finally:
+        failures.stop()
+
+
+def test_start_reports_whether_it_launched_the_reporter():
+    failures = EventAggregator("user_login_failed", dimensions=("user_id",), window=60, clock=FakeClock())
+    assert failures.start() is True
+    assert failures.start() is False
+    failures.stop()
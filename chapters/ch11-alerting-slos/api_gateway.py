@@ -2,14 +2,21 @@
 #
 # Chapter 11: Alerting & Service Level Objectives (SLOs)
 #
-# Identical to Chapter 10. No application code changes — this chapter
-# focuses on configuring Grafana alerts and SLO-based burn rate alerting
-# on top of the metrics already emitted by these services.
+# The alerts and SLO burn rate rules are configuration on top of the metrics
+# Chapter 10 already emits. The code changes since Chapter 10 are
+# operational: the logging pipeline (logging_setup.py), runtime log levels
+# and debug requests (below), OTLP_EXPORT_MODE=app export on this event loop
+# (async_export.py) and ORDER_SERVICE_URL.
 #
 # The alert rules query these metric instruments:
 #   • gateway.requests.total  → error rate, traffic drop, burn rate alerts
 #   • gateway.request.duration → latency alert
 #   • gateway.order_service.errors.total → error breakdown
+#
+# Runtime log levels: GET/PUT /admin/log-levels (with LOG_ADMIN_TOKEN set),
+# and requests whose x-debug header carries LOG_DEBUG_TOKEN log at DEBUG here
+# and in order-service (see debug_control.py).
+import os
 import time
 from contextlib import asynccontextmanager
 
@@ -19,11 +26,13 @@ from fastapi.responses import JSONResponse
 from opentelemetry import metrics, trace
 from opentelemetry.trace import StatusCode
 
+from async_export import attach_to_running_loop
+from debug_control import admin_router, debug_middleware
 from logging_setup import setup_logging
 
 logger = setup_logging("api-gateway")
 
-ORDER_SERVICE_URL = "http://localhost:8001"
+ORDER_SERVICE_URL = os.getenv("ORDER_SERVICE_URL", "http://localhost:8001")
 
 tracer = trace.get_tracer(__name__)
 
@@ -56,12 +65,14 @@ request_duration = meter.create_histogram(
 # ──────────────────────────────────────────────
 @asynccontextmanager
 async def lifespan(application: FastAPI):
+    attach_to_running_loop()  # OTLP_EXPORT_MODE=app exports on this loop
     application.state.http_client = httpx.AsyncClient()
     yield
     await application.state.http_client.aclose()
 
 
 app = FastAPI(lifespan=lifespan)
+app.include_router(admin_router)
 
 
 # ──────────────────────────────────────────────
@@ -84,6 +95,10 @@ async def metrics_middleware(request: Request, call_next):
     return response
 
 
+# Registered last so it runs first: the debug flag is set before metrics_middleware.
+app.middleware("http")(debug_middleware)
+
+
 # ──────────────────────────────────────────────
 # /checkout — Pattern 2 at the gateway level
 # ──────────────────────────────────────────────
@@ -105,6 +120,7 @@ async def checkout():
         )
 
         body = response.json()
+        logger.debug("Order service responded", status_code=response.status_code, body=body)
 
         if response.status_code >= 500:
             error_msg = body.get("error", f"upstream returned {response.status_code}")
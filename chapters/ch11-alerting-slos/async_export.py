@@ -0,0 +1,506 @@
+# async_export.py
+#
+# OTLP/HTTP export for traces, metrics and logs on one asyncio loop.
+#
+# With `opentelemetry-instrument`, every signal gets its own export thread:
+# BatchSpanProcessor, PeriodicExportingMetricReader and BatchLogRecordProcessor
+# each wake up, export synchronously and go back to sleep — three more GIL
+# contenders next to the uvicorn event loop. AsyncOtlpExport replaces all
+# three with coroutines on a single loop:
+#
+#   OTLP_EXPORT_MODE=threads  the SDK default (no change)
+#   OTLP_EXPORT_MODE=loop     one dedicated "OtelTelemetryLoop" thread
+#   OTLP_EXPORT_MODE=app      the service's own event loop; nothing is
+#                             exported until the app starts (lifespan calls
+#                             attach_to_running_loop()). Encoding then runs
+#                             on the request loop, so keep batches small.
+#
+#   • spans and log records are appended to bounded per-signal buffers on
+#     the request path; a full buffer drops and counts
+#   • metrics are collected by the loop on the reader's interval
+#   • one pooled httpx.AsyncClient posts the encoded requests, at most
+#     OTLP_ASYNC_MAX_CONCURRENCY at a time, each within
+#     OTLP_ASYNC_EXPORT_BUDGET seconds. A batch that misses its budget is
+#     dropped and counted as failed — a slow Collector never backs up the app.
+#
+# The endpoint is OTLP/HTTP (OTLP_ASYNC_ENDPOINT, default
+# http://localhost:4318). The mode replaces the SDK's batch processors, so
+# it does not combine with SPAN_EXPORT_QUEUE=priority, EXPORT_DISK_QUEUE_DIR or
+# OTLP_CAPTURE_DIR.
+import asyncio
+import copy
+import gzip
+import os
+import threading
+from collections import deque
+
+import httpx
+from loguru import logger
+from opentelemetry._logs import get_logger_provider
+from opentelemetry.context import Context
+from opentelemetry.exporter.otlp.proto.common._log_encoder import encode_logs
+from opentelemetry.exporter.otlp.proto.common.metrics_encoder import encode_metrics
+from opentelemetry.exporter.otlp.proto.common.trace_encoder import encode_spans
+from opentelemetry.sdk._logs import LogRecordProcessor, ReadableLogRecord
+from opentelemetry.sdk._logs.export import BatchLogRecordProcessor
+from opentelemetry.sdk.metrics.export import MetricExporter, MetricExportResult, PeriodicExportingMetricReader
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import ReadableSpan, SpanProcessor
+
+from span_export import metric_readers, replace_batch_processors
+
+THREADS = "threads"
+LOOP = "loop"
+APP = "app"
+
+_PATHS = {"traces": "/v1/traces", "metrics": "/v1/metrics", "logs": "/v1/logs"}
+
+
+class _Channel:
+    """Spans or log records waiting for the telemetry loop."""
+
+    def __init__(self, signal: str, encode, max_queue_size: int, max_export_batch_size: int, delay: float):
+        self.signal = signal
+        self.encode = encode
+        self.max_queue_size = max_queue_size
+        self.max_export_batch_size = max_export_batch_size
+        self.delay = delay
+        self.items: deque = deque()
+        self.wake: asyncio.Event | None = None
+        self.signalled = False
+        self.dropped = 0
+
+    def take(self) -> list:
+        batch = []
+        items = self.items
+        while items and len(batch) < self.max_export_batch_size:
+            batch.append(items.popleft())
+        return batch
+
+
+class AsyncOtlpExport:
+    """All OTLP/HTTP export of one process, run by one asyncio loop."""
+
+    def __init__(
+        self,
+        endpoint: str = "http://localhost:4318",
+        max_concurrency: int = 4,
+        export_budget: float = 10.0,
+        compression: str = "gzip",
+        max_queue_size: int = 2048,
+        max_export_batch_size: int = 512,
+        span_delay_millis: float = 5000,
+        log_delay_millis: float = 1000,
+        max_connections: int = 4,
+    ):
+        self.endpoint = endpoint.rstrip("/")
+        self.max_concurrency = max_concurrency
+        self.export_budget = export_budget
+        self.gzip = compression == "gzip"
+        self.max_connections = max_connections
+        self.spans = _Channel("traces", encode_spans, max_queue_size, max_export_batch_size, span_delay_millis / 1000)
+        self.logs = _Channel("logs", encode_logs, max_queue_size, max_export_batch_size, log_delay_millis / 1000)
+        self._metric_readers: list[tuple[object, float]] = []
+        self._pending: deque[tuple[str, bytes, int]] = deque()  # encoded before the loop ran
+
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread: int | None = None
+        self._thread: threading.Thread | None = None
+        self._client: httpx.AsyncClient | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self._tasks: set[asyncio.Task] = set()
+        self._posts: set[asyncio.Task] = set()
+        self._users = 0
+        self._closed = False
+
+        self.exported = {signal: 0 for signal in _PATHS}
+        self.failed = {signal: 0 for signal in _PATHS}
+
+    # ──────────────────────────────────────────────
+    # SDK components
+    # ──────────────────────────────────────────────
+    def span_processor(self) -> "AsyncSpanProcessor":
+        self._users += 1
+        return AsyncSpanProcessor(self)
+
+    def log_processor(self) -> "AsyncLogRecordProcessor":
+        self._users += 1
+        return AsyncLogRecordProcessor(self)
+
+    def metric_exporter(self, preferred_temporality=None, preferred_aggregation=None) -> "AsyncMetricExporter":
+        self._users += 1
+        return AsyncMetricExporter(self, preferred_temporality, preferred_aggregation)
+
+    def add_metric_reader(self, reader, interval_millis: float = 60_000) -> None:
+        """Have the loop call reader.collect() every `interval_millis`."""
+        self._metric_readers.append((reader, interval_millis / 1000))
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._start_metric_pump, reader, interval_millis / 1000)
+
+    def put(self, channel: _Channel, item) -> None:
+        """Request path: buffer one span or log record."""
+        items = channel.items
+        if len(items) >= channel.max_queue_size:
+            channel.dropped += 1
+            return
+        items.append(item)
+        if len(items) >= channel.max_export_batch_size and not channel.signalled and self._loop is not None:
+            channel.signalled = True
+            try:
+                self._loop.call_soon_threadsafe(channel.wake.set)
+            except RuntimeError:  # the loop is closed; the next one drains
+                pass
+
+    def submit(self, signal: str, payload: bytes, count: int = 1) -> None:
+        """Post an already-encoded request from any thread."""
+        loop = self._loop
+        if loop is None or self._closed:
+            self._pending.append((signal, payload, count))
+        elif threading.get_ident() == self._loop_thread:
+            self._spawn_post(signal, payload, count)
+        else:
+            try:
+                loop.call_soon_threadsafe(self._spawn_post, signal, payload, count)
+            except RuntimeError:  # the loop is closed
+                self._pending.append((signal, payload, count))
+
+    # ──────────────────────────────────────────────
+    # Loop side
+    # ──────────────────────────────────────────────
+    def start(self) -> "AsyncOtlpExport":
+        """Run the loop on a dedicated daemon thread."""
+        ready = threading.Event()
+
+        def run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            self.attach(loop)
+            ready.set()
+            loop.run_forever()
+            loop.close()
+
+        self._thread = threading.Thread(name="OtelTelemetryLoop", target=run, daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def attach(self, loop: asyncio.AbstractEventLoop | None = None) -> None:
+        """Run export on `loop` (default: the running loop). Called on that loop's thread."""
+        loop = loop or asyncio.get_running_loop()
+        self._loop = loop
+        self._loop_thread = threading.get_ident()
+        self._client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+            timeout=self.export_budget,
+        )
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._tasks = set()
+        self._posts = set()
+        for channel in (self.spans, self.logs):
+            channel.wake = asyncio.Event()
+            channel.signalled = False
+            self._spawn(self._pump(channel))
+        for reader, interval in self._metric_readers:
+            self._start_metric_pump(reader, interval)
+        while self._pending:
+            self._spawn_post(*self._pending.popleft())
+
+    def _spawn(self, coroutine) -> asyncio.Task:
+        task = self._loop.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def _spawn_post(self, signal: str, payload: bytes, count: int, acquired: bool = False) -> None:
+        task = self._spawn(self._post(signal, payload, count, acquired))
+        self._posts.add(task)
+        task.add_done_callback(self._posts.discard)
+
+    def _start_metric_pump(self, reader, interval: float) -> None:
+        self._spawn(self._pump_metrics(reader, interval))
+
+    async def _pump(self, channel: _Channel) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(channel.wake.wait(), channel.delay)
+            except TimeoutError:
+                pass
+            channel.wake.clear()
+            channel.signalled = False
+            await self._drain(channel)
+
+    async def _drain(self, channel: _Channel) -> None:
+        while batch := channel.take():
+            payload = channel.encode(batch).SerializeToString()
+            await self._slots.acquire()  # bounded concurrency: wait for a free slot
+            self._spawn_post(channel.signal, payload, len(batch), acquired=True)
+
+    async def _pump_metrics(self, reader, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            reader.collect()  # calls AsyncMetricExporter.export() on this thread
+
+    async def _post(self, signal: str, payload: bytes, count: int, acquired: bool = False) -> None:
+        if not acquired:
+            await self._slots.acquire()
+        try:
+            headers = {"Content-Type": "application/x-protobuf"}
+            if self.gzip:
+                payload = gzip.compress(payload, compresslevel=6)
+                headers["Content-Encoding"] = "gzip"
+            response = await asyncio.wait_for(
+                self._client.post(self.endpoint + _PATHS[signal], content=payload, headers=headers),
+                self.export_budget,
+            )
+            if response.is_success:
+                self.exported[signal] += count
+            else:
+                self.failed[signal] += count
+                logger.warning("OTLP endpoint rejected a batch", signal=signal, status=response.status_code)
+        except (httpx.HTTPError, TimeoutError) as error:
+            self.failed[signal] += count
+            logger.warning("OTLP export failed", signal=signal, error=type(error).__name__)
+        finally:
+            self._slots.release()
+
+    async def flush_async(self) -> None:
+        """Export everything buffered; awaited on the export loop (app mode)."""
+        await self._flush()
+
+    async def _flush(self) -> None:
+        for channel in (self.spans, self.logs):
+            await self._drain(channel)
+        for reader, _interval in self._metric_readers:
+            reader.collect()
+        while self._pending:
+            self._spawn_post(*self._pending.popleft())
+        await asyncio.gather(*self._posts, return_exceptions=True)
+
+    async def _close(self) -> None:
+        await self._flush()
+        for task in list(self._tasks):
+            if task is not asyncio.current_task():
+                task.cancel()
+        await self._client.aclose()
+
+    # ──────────────────────────────────────────────
+    # Flush and shutdown (any thread)
+    # ──────────────────────────────────────────────
+    def _loop_usable(self) -> bool:
+        return self._loop is not None and self._loop.is_running() and not self._loop.is_closed()
+
+    def force_flush(self, timeout: float = 30.0) -> bool:
+        if not self._loop_usable() or threading.get_ident() == self._loop_thread:
+            return False  # can't block the loop on itself
+        future = asyncio.run_coroutine_threadsafe(self._flush(), self._loop)
+        try:
+            future.result(timeout)
+            return True
+        except TimeoutError:
+            return False
+
+    def release(self, timeout: float = 30.0) -> None:
+        """One SDK component shut down; the last one flushes and stops the loop."""
+        self._users -= 1
+        if self._users > 0 or self._closed:
+            return
+        self._closed = True
+        if self._loop_usable() and threading.get_ident() != self._loop_thread:
+            try:
+                asyncio.run_coroutine_threadsafe(self._close(), self._loop).result(timeout)
+            except TimeoutError:
+                logger.warning("Telemetry loop did not flush in time")
+            if self._thread is not None:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._thread.join(timeout)
+        elif not self._loop_usable():
+            # App mode at interpreter exit: the service's loop is gone, so
+            # the last batches go out on a short-lived loop of our own.
+            self._closed = False
+            try:
+                asyncio.run(self._final_flush())
+            finally:
+                self._closed = True
+
+    async def _final_flush(self) -> None:
+        self.attach(asyncio.get_running_loop())
+        await self._close()
+
+    def stats(self) -> dict:
+        return {
+            signal: {
+                "queued": len(channel.items) if channel else 0,
+                "dropped": channel.dropped if channel else 0,
+                "exported": self.exported[signal],
+                "failed": self.failed[signal],
+            }
+            for signal, channel in (("traces", self.spans), ("metrics", None), ("logs", self.logs))
+        }
+
+
+# ──────────────────────────────────────────────
+# SDK adapters
+# ──────────────────────────────────────────────
+class AsyncSpanProcessor(SpanProcessor):
+    """Buffers ended spans for AsyncOtlpExport."""
+
+    def __init__(self, export: AsyncOtlpExport):
+        self.telemetry = export
+        self._shutdown = False
+
+    def on_start(self, span, parent_context=None) -> None:
+        pass
+
+    def on_end(self, span: ReadableSpan) -> None:
+        if span.context.trace_flags.sampled and not self._shutdown:
+            self.telemetry.put(self.telemetry.spans, span)
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self.telemetry.force_flush(timeout_millis / 1000)
+
+    def shutdown(self) -> None:
+        if not self._shutdown:
+            self._shutdown = True
+            self.telemetry.release()
+
+
+class AsyncLogRecordProcessor(LogRecordProcessor):
+    """Buffers emitted log records for AsyncOtlpExport."""
+
+    def __init__(self, export: AsyncOtlpExport):
+        self.telemetry = export
+        self._shutdown = False
+
+    def on_emit(self, log_record) -> None:
+        if self._shutdown:
+            return
+        # Same copy as BatchLogRecordProcessor: drop the context reference.
+        api_log_record = copy.copy(log_record.log_record)
+        api_log_record.context = Context()
+        self.telemetry.put(
+            self.telemetry.logs,
+            ReadableLogRecord(
+                log_record=api_log_record,
+                resource=log_record.resource if log_record.resource is not None else Resource.create({}),
+                instrumentation_scope=log_record.instrumentation_scope,
+                limits=log_record.limits,
+            ),
+        )
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self.telemetry.force_flush(timeout_millis / 1000)
+
+    def shutdown(self) -> None:
+        if not self._shutdown:
+            self._shutdown = True
+            self.telemetry.release()
+
+
+class AsyncMetricExporter(MetricExporter):
+    """Encodes collected metrics and hands them to AsyncOtlpExport."""
+
+    def __init__(self, export: AsyncOtlpExport, preferred_temporality=None, preferred_aggregation=None):
+        super().__init__(preferred_temporality, preferred_aggregation)
+        self.telemetry = export
+        self._shutdown = False
+
+    def export(self, metrics_data, timeout_millis: float = 10_000, **kwargs) -> MetricExportResult:
+        self.telemetry.submit("metrics", encode_metrics(metrics_data).SerializeToString())
+        return MetricExportResult.SUCCESS
+
+    def force_flush(self, timeout_millis: float = 10_000) -> bool:
+        return True  # the reader collects; the loop flushes on shutdown
+
+    def shutdown(self, timeout_millis: float = 30_000, **kwargs) -> None:
+        if not self._shutdown:
+            self._shutdown = True
+            self.telemetry.release()
+
+
+# ──────────────────────────────────────────────
+# Installation
+# ──────────────────────────────────────────────
+_installed: AsyncOtlpExport | None = None
+_mode = THREADS
+
+
+def _env_number(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _replace_log_processors(export: AsyncOtlpExport) -> int:
+    provider = get_logger_provider()
+    multi = getattr(provider, "_multi_log_record_processor", None)
+    if multi is None:
+        return 0
+    replaced = []
+    with multi._lock:
+        processors = list(multi._log_record_processors)
+        for index, processor in enumerate(processors):
+            if isinstance(processor, BatchLogRecordProcessor):
+                processors[index] = export.log_processor()
+                replaced.append(processor)
+        multi._log_record_processors = tuple(processors)
+    for processor in replaced:
+        processor.shutdown()
+    return len(replaced)
+
+
+def _replace_metric_readers(export: AsyncOtlpExport) -> int:
+    replaced = 0
+    for reader in metric_readers():
+        if isinstance(reader, PeriodicExportingMetricReader):
+            old = reader._exporter
+            reader._exporter = export.metric_exporter(old._preferred_temporality, old._preferred_aggregation)
+            # Stop the reader's own thread (it collects once more, into our
+            # exporter); from now on the loop drives collection.
+            reader._shutdown_event.set()
+            reader._daemon_thread.join()
+            old.shutdown()
+            export.add_metric_reader(reader, reader._export_interval_millis)
+            replaced += 1
+    return replaced
+
+
+def install_async_export(mode: str | None = None) -> AsyncOtlpExport | None:
+    """Apply OTLP_EXPORT_MODE (or `mode`) to the global providers."""
+    global _installed, _mode
+    mode = (mode or os.getenv("OTLP_EXPORT_MODE", THREADS)).lower()
+    if mode == THREADS:
+        return None
+    if mode not in (LOOP, APP):
+        raise ValueError(f"unknown OTLP_EXPORT_MODE {mode!r}, expected threads, loop or app")
+    if (
+        os.getenv("SPAN_EXPORT_QUEUE", "batch").lower() != "batch"
+        or os.getenv("EXPORT_DISK_QUEUE_DIR")
+        or os.getenv("OTLP_CAPTURE_DIR")
+    ):
+        raise ValueError(
+            "OTLP_EXPORT_MODE replaces the SDK queues; unset SPAN_EXPORT_QUEUE, EXPORT_DISK_QUEUE_DIR and OTLP_CAPTURE_DIR"
+        )
+
+    export = AsyncOtlpExport(
+        endpoint=os.getenv("OTLP_ASYNC_ENDPOINT", "http://localhost:4318"),
+        max_concurrency=int(_env_number("OTLP_ASYNC_MAX_CONCURRENCY", 4)),
+        export_budget=_env_number("OTLP_ASYNC_EXPORT_BUDGET", 10),
+        compression=os.getenv("OTEL_EXPORTER_OTLP_COMPRESSION", "gzip").lower(),
+        max_queue_size=int(_env_number("OTEL_BSP_MAX_QUEUE_SIZE", 2048)),
+        max_export_batch_size=int(_env_number("OTEL_BSP_MAX_EXPORT_BATCH_SIZE", 512)),
+        span_delay_millis=_env_number("OTEL_BSP_SCHEDULE_DELAY", 5000),
+        log_delay_millis=_env_number("OTEL_BLRP_SCHEDULE_DELAY", 1000),
+    )
+    # The factory ignores the exporter: the old one is shut down with its processor.
+    replace_batch_processors(lambda _exporter: export.span_processor(), make_exporter=lambda old: old)
+    _replace_log_processors(export)
+    _replace_metric_readers(export)
+    if mode == LOOP:
+        export.start()
+    _installed, _mode = export, mode
+    return export
+
+
+def attach_to_running_loop() -> None:
+    """In OTLP_EXPORT_MODE=app, start exporting on the current event loop."""
+    if _installed is not None and _mode == APP:
+        _installed.attach()
@@ -0,0 +1,185 @@
+# async_sink.py
+#
+# Non-blocking Loguru sink: the event loop thread only appends the record to
+# a bounded queue; a writer thread encodes records and writes them to the
+# stream in large batches.
+#
+# A slow stdout pipe (container log driver under pressure) therefore stalls
+# the writer thread instead of every coroutine in the service. When the
+# buffer is full, an overflow policy decides what to give up:
+#
+#   drop_oldest        overwrite the oldest queued record
+#   drop_low_priority  shed DEBUG/INFO records first, then the oldest
+#   block              wait for space (the old synchronous behaviour)
+#
+# DEBUG/INFO and WARNING+ records wait in separate deques, tagged with a
+# sequence number. Evicting the oldest low-priority record is a popleft(),
+# and the writer merges the two deques back into arrival order.
+import sys
+import threading
+from collections import deque
+from typing import Callable, TextIO
+
+DROP_OLDEST = "drop_oldest"
+DROP_LOW_PRIORITY = "drop_low_priority"
+BLOCK = "block"
+OVERFLOW_POLICIES = (DROP_OLDEST, DROP_LOW_PRIORITY, BLOCK)
+
+# Records below WARNING are the first to go under DROP_LOW_PRIORITY.
+LOW_PRIORITY_MAX_LEVEL = 20  # INFO
+
+
+class BackgroundLogSink:
+    """Loguru sink backed by a bounded queue and a writer thread.
+
+    Pass it to `logger.add()` as a stream-like sink (it has `write` and
+    `stop`), so `logger.remove()` drains the buffer before returning.
+    """
+
+    def __init__(
+        self,
+        encode: Callable[[dict], str],
+        stream: TextIO | None = None,
+        capacity: int = 8192,
+        overflow: str = DROP_OLDEST,
+        batch_size: int = 512,
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(
+                f"unknown overflow policy {overflow!r}, expected one of {OVERFLOW_POLICIES}"
+            )
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+
+        self.encode = encode
+        self.stream = stream if stream is not None else sys.stdout
+        self.capacity = capacity
+        self.overflow = overflow
+        self.batch_size = batch_size
+
+        # (sequence number, record), oldest first
+        self._low: deque[tuple[int, dict]] = deque()
+        self._high: deque[tuple[int, dict]] = deque()
+        self._seq = 0
+        self._size = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+
+        self.enqueued = 0
+        self.dropped = 0
+        self.flushed = 0
+        self.max_depth = 0
+
+        self._writer = threading.Thread(
+            target=self._run, name="log-writer", daemon=True
+        )
+        self._writer.start()
+
+    # ──────────────────────────────────────────────
+    # Producer side (event loop thread)
+    # ──────────────────────────────────────────────
+    def write(self, message) -> None:
+        record = message.record
+        with self._lock:
+            if self._closed:
+                self.dropped += 1
+                return
+            if self._size == self.capacity and not self._make_room(record):
+                self.dropped += 1
+                return
+
+            queue = self._low if record["level"].no <= LOW_PRIORITY_MAX_LEVEL else self._high
+            queue.append((self._seq, record))
+            self._seq += 1
+            self._size += 1
+            self.enqueued += 1
+            if self._size > self.max_depth:
+                self.max_depth = self._size
+            self._not_empty.notify()
+
+    def _make_room(self, record: dict) -> bool:
+        """Free one slot according to the overflow policy (lock held).
+
+        Returns False when the incoming record itself should be dropped.
+        """
+        if self.overflow == BLOCK:
+            while self._size == self.capacity and not self._closed:
+                self._not_full.wait()
+            return not self._closed
+
+        if self.overflow == DROP_LOW_PRIORITY:
+            if record["level"].no <= LOW_PRIORITY_MAX_LEVEL:
+                return False
+            if self._low:
+                self._low.popleft()
+                self._size -= 1
+                self.dropped += 1
+                return True
+
+        # DROP_OLDEST, or DROP_LOW_PRIORITY with only WARNING+ queued
+        self._pop_oldest()
+        self._size -= 1
+        self.dropped += 1
+        return True
+
+    def _pop_oldest(self) -> dict:
+        """Remove and return the oldest queued record (lock held, queue not empty)."""
+        low, high = self._low, self._high
+        if not high or (low and low[0][0] < high[0][0]):
+            return low.popleft()[1]
+        return high.popleft()[1]
+
+    # ──────────────────────────────────────────────
+    # Consumer side (writer thread)
+    # ──────────────────────────────────────────────
+    def _take_batch(self) -> list[dict]:
+        with self._lock:
+            while self._size == 0 and not self._closed:
+                self._not_empty.wait()
+
+            count = min(self._size, self.batch_size)
+            batch = [self._pop_oldest() for _ in range(count)]
+            self._size -= count
+            self._not_full.notify_all()
+            return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return  # closed and fully drained
+            try:
+                self.stream.write("".join(map(self.encode, batch)))
+                flush = getattr(self.stream, "flush", None)
+                if flush is not None:
+                    flush()
+            except Exception as e:
+                sys.stderr.write(f"log-writer: failed to write batch: {e!r}\n")
+                with self._lock:
+                    self.dropped += len(batch)
+                continue
+            with self._lock:
+                self.flushed += len(batch)
+
+    def stop(self) -> None:
+        """Stop accepting records, drain the buffer and join the writer."""
+        with self._lock:
+            self._closed = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+        self._writer.join()
+        stop = getattr(self.stream, "stop", None)
+        if stop is not None:
+            stop()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "enqueued": self.enqueued,
+                "dropped": self.dropped,
+                "flushed": self.flushed,
+                "max_depth": self.max_depth,
+                "depth": self._size,
+            }
@@ -0,0 +1,145 @@
+# bench_async_export.py
+#
+# Gateway throughput with the SDK's export threads vs one asyncio export loop.
+#
+# Usage (from the chapter directory):
+#   uv run python -m benchmarks.bench_async_export [--requests 10000] [--concurrency 50]
+#
+# Starts a local OTLP/HTTP sink (otlp_stub.py) in its own process, then runs
+# the real api_gateway app in a fresh process per mode, driven in-process
+# through httpx's ASGI transport with order-service mocked. Every mode
+# exports traces, metrics and logs (LOG_SINKS=otlp) over OTLP/HTTP to the
+# sink, with short schedule delays so export work overlaps the requests:
+#
+#   threads  BatchSpanProcessor + PeriodicExportingMetricReader +
+#            BatchLogRecordProcessor, one thread and one HTTP pool each
+#   loop     OTLP_EXPORT_MODE=loop: one telemetry loop thread
+#   app      OTLP_EXPORT_MODE=app: export runs on the request loop
+#
+# For each mode it reports requests/sec, CPU per request and the threads
+# alive at the end of the run.
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+MODES = ("threads", "loop", "app")
+
+
+def _setup_providers(endpoint: str) -> None:
+    """What `opentelemetry-instrument` installs, over OTLP/HTTP."""
+    from opentelemetry import metrics, trace
+    from opentelemetry._logs import set_logger_provider
+    from opentelemetry.exporter.otlp.proto.http._log_exporter import OTLPLogExporter
+    from opentelemetry.exporter.otlp.proto.http.metric_exporter import OTLPMetricExporter
+    from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    from opentelemetry.sdk._logs import LoggerProvider
+    from opentelemetry.sdk._logs.export import BatchLogRecordProcessor
+    from opentelemetry.sdk.metrics import MeterProvider
+    from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+    resource = Resource.create({"service.name": "api-gateway"})
+    tracer_provider = TracerProvider(resource=resource)
+    tracer_provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=endpoint + "/v1/traces")))
+    trace.set_tracer_provider(tracer_provider)
+    reader = PeriodicExportingMetricReader(
+        OTLPMetricExporter(endpoint=endpoint + "/v1/metrics"), export_interval_millis=1000
+    )
+    metrics.set_meter_provider(MeterProvider(resource=resource, metric_readers=[reader]))
+    logger_provider = LoggerProvider(resource=resource)
+    logger_provider.add_log_record_processor(BatchLogRecordProcessor(OTLPLogExporter(endpoint=endpoint + "/v1/logs")))
+    set_logger_provider(logger_provider)
+
+
+def child(mode: str, endpoint: str, requests: int, concurrency: int) -> None:
+    os.environ.update(
+        {
+            "OTLP_EXPORT_MODE": mode,
+            "OTLP_ASYNC_ENDPOINT": endpoint,
+            "LOG_SINKS": "otlp",
+            "OTEL_BSP_SCHEDULE_DELAY": "200",
+            "OTEL_BLRP_SCHEDULE_DELAY": "200",
+        }
+    )
+    _setup_providers(endpoint)
+
+    import httpx
+
+    import api_gateway
+    from async_export import attach_to_running_loop
+
+    def order_service(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={"order_id": "ord-1042", "status": "created"})
+
+    async def drive(count: int) -> None:
+        attach_to_running_loop()
+        api_gateway.app.state.http_client = httpx.AsyncClient(transport=httpx.MockTransport(order_service))
+        transport = httpx.ASGITransport(app=api_gateway.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+            remaining = iter(range(count))
+
+            async def worker():
+                for _ in remaining:
+                    response = await client.get("/checkout")
+                    assert response.status_code == 200
+
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    async def run() -> dict:
+        await drive(min(requests, 1000))  # warm-up
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        await drive(requests)
+        return {
+            "wall": time.perf_counter() - wall,
+            "cpu": time.process_time() - cpu,
+            "threads": threading.active_count(),
+        }
+
+    result = asyncio.run(run())
+    print(json.dumps(result), flush=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Async OTLP export benchmark")
+    parser.add_argument("--requests", type=int, default=10_000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--endpoint", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child, args.endpoint, args.requests, args.concurrency)
+        return
+
+    sink = subprocess.Popen(
+        [sys.executable, "otlp_stub.py", "--http", "0"], stdout=subprocess.PIPE, text=True
+    )
+    endpoint = sink.stdout.readline().split()[-1]
+    print(f"requests: {args.requests:,}, concurrency: {args.concurrency}, cores: {os.cpu_count()}\n")
+    print(f"{'mode':<10} {'throughput':>14} {'CPU/req':>10} {'threads':>8}")
+    try:
+        for mode in MODES:
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_async_export", "--child", mode,
+                 "--endpoint", endpoint, "--requests", str(args.requests),
+                 "--concurrency", str(args.concurrency)],
+                capture_output=True, text=True, check=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(
+                f"{mode:<10} {args.requests / result['wall']:>10,.0f} req/s"
+                f" {result['cpu'] / args.requests * 1e6:>7.0f} µs {result['threads']:>8}"
+            )
+    finally:
+        sink.terminate()
+
+
+if __name__ == "__main__":
+    main()
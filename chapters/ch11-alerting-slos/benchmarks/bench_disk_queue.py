@@ -0,0 +1,121 @@
+# bench_disk_queue.py
+#
+# Spans lost during a Collector outage: the stock OTLP exporter vs the disk
+# queue.
+#
+# Usage (from the chapter directory):
+#   uv run python -m benchmarks.bench_disk_queue [--rate 1000] [--seconds 8] [--outage 2:6]
+#
+# Sends `rate` spans per second for `seconds` seconds through a
+# BatchSpanProcessor into a local StubOTLPReceiver (otlp_stub.py), which is
+# paused for the `outage` window. Modes:
+#
+#   stock OTLPSpanExporter   the exporter opentelemetry-instrument installs;
+#                            it retries inside export(), so the processor's
+#                            queue fills and drops spans
+#   DiskSpanExporter         spills to a temporary directory and replays
+#
+# For each mode it reports spans delivered and lost, the largest disk
+# backlog, and how much the process RSS grew.
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+from disk_queue import DiskExportQueue, DiskSpanExporter, GrpcSender
+from otlp_stub import StubOTLPReceiver
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1 << 20)
+
+
+def run(mode: str, rate: int, seconds: float, outage: tuple[float, float]) -> dict:
+    receiver = StubOTLPReceiver().start()
+    queue = directory = None
+    if mode == "disk":
+        directory = tempfile.mkdtemp(prefix="bench-disk-queue-")
+        queue = DiskExportQueue(directory, GrpcSender(receiver.endpoint, timeout=1), max_backoff=1)
+        exporter = DiskSpanExporter(queue)
+    else:
+        exporter = OTLPSpanExporter(endpoint=receiver.endpoint, insecure=True)
+    provider = TracerProvider()
+    provider.add_span_processor(BatchSpanProcessor(exporter, schedule_delay_millis=200))
+    tracer = provider.get_tracer(__name__)
+
+    peak_backlog = 0
+    done = threading.Event()
+
+    def watch():
+        nonlocal peak_backlog
+        while not done.wait(0.1):
+            if queue is not None:
+                peak_backlog = max(peak_backlog, queue.stats()["queued_bytes"])
+
+    watcher = threading.Thread(target=watch, daemon=True)
+    watcher.start()
+
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    paused = resumed = False
+    generated = 0
+    while (elapsed := time.perf_counter() - start) < seconds:
+        if not paused and elapsed >= outage[0]:
+            receiver.pause()
+            paused = True
+        if not resumed and elapsed >= outage[1]:
+            receiver.resume()
+            resumed = True
+        target = int(elapsed * rate)
+        while generated < target:
+            with tracer.start_as_current_span(f"span-{generated}", attributes={"http.route": "/checkout"}):
+                pass
+            generated += 1
+        time.sleep(0.005)
+    rss_growth = _rss_mb() - rss_before
+
+    provider.force_flush(30_000)
+    if queue is not None:
+        queue.flush(30)
+    done.set()
+    delivered = len(receiver.span_names())
+    provider.shutdown()
+    receiver.stop()
+    if directory is not None:
+        shutil.rmtree(directory)
+    return {
+        "generated": generated,
+        "delivered": delivered,
+        "lost": generated - delivered,
+        "peak_backlog_kb": peak_backlog // 1024,
+        "rss_growth_mb": rss_growth,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rate", type=int, default=1000)
+    parser.add_argument("--seconds", type=float, default=8)
+    parser.add_argument("--outage", default="2:6", help="start:end in seconds")
+    args = parser.parse_args()
+    outage = tuple(float(value) for value in args.outage.split(":"))
+
+    print(f"{args.rate} spans/s for {args.seconds:g}s, receiver paused {outage[0]:g}s–{outage[1]:g}s\n")
+    print(f"{'exporter':<22} {'generated':>10} {'delivered':>10} {'lost':>8} {'disk peak':>10} {'RSS +':>8}")
+    for label, mode in (("stock OTLPSpanExporter", "stock"), ("DiskSpanExporter", "disk")):
+        result = run(mode, args.rate, args.seconds, outage)
+        print(
+            f"{label:<22} {result['generated']:>10} {result['delivered']:>10} {result['lost']:>8}"
+            f" {result['peak_backlog_kb']:>7} KB {result['rss_growth_mb']:>6.1f} MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
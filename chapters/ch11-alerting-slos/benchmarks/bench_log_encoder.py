@@ -0,0 +1,82 @@
+# bench_log_encoder.py
+#
+# Compare the Chapter 6 format-string template with JsonLogEncoder.
+#
+# Usage (from the chapter directory):
+#   uv run python -m benchmarks.bench_log_encoder [--records 200000]
+#
+# Both sinks write to /dev/null so only formatting + Loguru overhead is
+# measured. Records carry the same kwargs as create_order's log calls.
+import argparse
+import os
+import time
+
+from loguru import logger
+
+from log_encoder import JsonLogEncoder
+from logging_setup import otel_patcher
+
+SERVICE_NAME = "order-service"
+
+# The template setup_logging() used before JsonLogEncoder (Chapters 6–10).
+LEGACY_FORMAT = (
+    '{{"timestamp": "{time:YYYY-MM-DDTHH:mm:ss.SSSZ}", '
+    '"level": "{level.name}", '
+    '"service": "' + SERVICE_NAME + '", '
+    '"message": "{message}", '
+    '"trace_id": "{extra[trace_id]}", '
+    '"span_id": "{extra[span_id]}", '
+    '"span_name": "{extra[span_name]}"}}'
+)
+
+
+def _run(records: int) -> float:
+    start = time.perf_counter()
+    for i in range(records):
+        logger.info(
+            "Inserting order record",
+            item="widget",
+            qty=2,
+            total_usd=49.98,
+            attempt=i,
+        )
+    return time.perf_counter() - start
+
+
+def bench(label: str, add_sink, records: int) -> None:
+    logger.remove()
+    logger.configure(patcher=otel_patcher)
+    with open(os.devnull, "w") as devnull:
+        add_sink(devnull)
+        _run(min(records, 10_000))  # warm-up
+        elapsed = _run(records)
+    logger.remove()
+
+    print(
+        f"{label:<28} {records / elapsed:>12,.0f} rec/s "
+        f"{elapsed / records * 1e6:>8.2f} µs/call"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Log encoder benchmark")
+    parser.add_argument("--records", type=int, default=200_000)
+    args = parser.parse_args()
+
+    print(f"records: {args.records:,}\n")
+    bench(
+        "legacy format template",
+        lambda out: logger.add(out, format=LEGACY_FORMAT, level="INFO"),
+        args.records,
+    )
+    bench(
+        "JsonLogEncoder",
+        lambda out: logger.add(
+            JsonLogEncoder(SERVICE_NAME, stream=out), format="{message}", level="INFO"
+        ),
+        args.records,
+    )
+
+
+if __name__ == "__main__":
+    main()
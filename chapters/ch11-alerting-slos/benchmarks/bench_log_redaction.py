@@ -0,0 +1,106 @@
+# bench_log_redaction.py
+#
+# Compare a naive redaction stage (one re.sub per PII pattern, on every
+# record) with PiiRedactor's single combined scanner + fast path.
+#
+# Usage (from the chapter directory):
+#   uv run python -m benchmarks.bench_log_redaction [--records 200000] [--pii-ratio 0.05]
+#
+# Records mimic the services' log calls: mostly clean INFO lines with
+# numeric kwargs, plus a fraction of user questions carrying PII. Every
+# variant logs through JsonLogEncoder to /dev/null.
+import argparse
+import os
+import random
+import re
+import time
+
+from loguru import logger
+
+from log_encoder import JsonLogEncoder
+from log_redaction import PiiRedactor
+from logging_setup import otel_patcher
+
+CLEAN = [
+    ("Processing checkout request", {"item": "widget", "qty": 2}),
+    ("Inserting order record", {"item": "widget", "qty": 2, "total_usd": 49.98}),
+    ("Payment processed successfully", {"order_id": "ord-1042"}),
+    ("Starting LLM generation", {}),
+]
+PII = [
+    (
+        "Question received",
+        {"question": "My SSN is 123-45-6789 and email john.smith@example.com"},
+    ),
+    ("Callback requested at +1 555-123-4567", {"card": "4111-1111-1111-1111"}),
+]
+
+# What a first attempt usually looks like: the Collector's patterns, chained.
+NAIVE_PATTERNS = [
+    (re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}"), "[EMAIL_REDACTED]"),
+    (re.compile(r"\b\d{3}-\d{2}-\d{4}\b"), "[SSN_REDACTED]"),
+    (re.compile(r"\b(?:\d[ -]?){12,18}\d\b"), "[CARD_REDACTED]"),
+    (
+        re.compile(r"(?:\+\d{1,3}[ .-]?)?(?:\(\d{3}\)|\d{3})[ .-]?\d{3}[ .-]?\d{4}\b"),
+        "[PHONE_REDACTED]",
+    ),
+]
+
+
+def _naive_scrub(text: str) -> str:
+    for pattern, replacement in NAIVE_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def naive_patcher(record: dict) -> None:
+    otel_patcher(record)
+    record["message"] = _naive_scrub(record["message"])
+    extra = record["extra"]
+    for key, value in extra.items():
+        if isinstance(value, str):
+            extra[key] = _naive_scrub(value)
+
+
+def _workload(records: int, pii_ratio: float) -> list[tuple[str, dict]]:
+    rng = random.Random(42)
+    return [
+        rng.choice(PII) if rng.random() < pii_ratio else rng.choice(CLEAN)
+        for _ in range(records)
+    ]
+
+
+def bench(label: str, patcher, workload, baseline: float | None) -> float:
+    logger.remove()
+    logger.configure(patcher=patcher)
+    with open(os.devnull, "w") as devnull:
+        logger.add(JsonLogEncoder("api-gateway", stream=devnull), format="{message}")
+        for message, fields in workload[:10_000]:  # warm-up
+            logger.info(message, **fields)
+        start = time.perf_counter()
+        for message, fields in workload:
+            logger.info(message, **fields)
+        elapsed = time.perf_counter() - start
+    logger.remove()
+
+    per_record = elapsed / len(workload) * 1e6
+    overhead = f"{per_record - baseline:+8.2f} µs" if baseline is not None else ""
+    print(f"{label:<28} {len(workload) / elapsed:>12,.0f} rec/s {per_record:>8.2f} µs/rec {overhead}")
+    return per_record
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="PII redaction benchmark")
+    parser.add_argument("--records", type=int, default=200_000)
+    parser.add_argument("--pii-ratio", type=float, default=0.05)
+    args = parser.parse_args()
+
+    workload = _workload(args.records, args.pii_ratio)
+    print(f"records: {args.records:,}, PII ratio: {args.pii_ratio:.0%}\n")
+    baseline = bench("no redaction", otel_patcher, workload, None)
+    bench("naive re.sub chain", naive_patcher, workload, baseline)
+    bench("PiiRedactor", PiiRedactor(otel_patcher), workload, baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# bench_otlp_capture.py
+#
+# Span export to capture files vs OTLP/gRPC, and replay pacing.
+#
+# Usage (from the chapter directory):
+#   uv run python -m benchmarks.bench_otlp_capture [--spans 50000] [--batch 512]
+#
+# Export: the same finished spans, in batches of `batch`, through
+# OTLPSpanExporter to a local sink (`python otlp_stub.py --grpc PORT`, in its
+# own process) and through FileSpanExporter to a temporary directory.
+# Reports spans/sec and CPU per span in this process.
+#
+# Replay: a capture of 200 trace requests spaced 10 ms apart (100 req/s) is
+# replayed to the sink at its original pace, at 4x, at 16x and at a fixed
+# 1000 req/s. Reports the target and achieved request rate and the worst
+# lag behind schedule.
+import argparse
+import subprocess
+import sys
+import tempfile
+import time
+
+from opentelemetry.exporter.otlp.proto.common.trace_encoder import encode_spans
+from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor, SpanExporter, SpanExportResult
+
+from disk_queue import TRACES, GrpcSender
+from otlp_capture import CaptureWriter, FileSpanExporter, read_capture, replay
+
+
+class _Collect(SpanExporter):
+    def __init__(self):
+        self.spans = []
+
+    def export(self, spans) -> SpanExportResult:
+        self.spans.extend(spans)
+        return SpanExportResult.SUCCESS
+
+
+def _make_spans(count: int) -> list:
+    collect = _Collect()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(collect))
+    tracer = provider.get_tracer("bench")
+    for i in range(count):
+        with tracer.start_as_current_span("POST /orders") as span:
+            span.set_attribute("http.method", "POST")
+            span.set_attribute("order.item", "widget")
+            span.set_attribute("order.qty", i % 5)
+    return collect.spans
+
+
+def _export(exporter, spans: list, batch: int) -> tuple[float, float]:
+    wall, cpu = time.perf_counter(), time.process_time()
+    for start in range(0, len(spans), batch):
+        assert exporter.export(spans[start:start + batch]) == SpanExportResult.SUCCESS
+    exporter.force_flush()
+    return time.perf_counter() - wall, time.process_time() - cpu
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="OTLP capture/replay benchmark")
+    parser.add_argument("--spans", type=int, default=50_000)
+    parser.add_argument("--batch", type=int, default=512)
+    args = parser.parse_args()
+
+    sink = subprocess.Popen([sys.executable, "otlp_stub.py", "--grpc", "0"], stdout=subprocess.PIPE, text=True)
+    endpoint = sink.stdout.readline().split()[-1]
+    spans = _make_spans(args.spans)
+    try:
+        print(f"spans: {args.spans:,}, batch: {args.batch}\n")
+        print(f"{'exporter':<20} {'throughput':>16} {'CPU/span':>10}")
+        with tempfile.TemporaryDirectory() as directory:
+            exporters = {
+                "OTLPSpanExporter": OTLPSpanExporter(endpoint=endpoint, insecure=True),
+                "FileSpanExporter": FileSpanExporter(CaptureWriter(directory)),
+            }
+            for name, exporter in exporters.items():
+                wall, cpu = _export(exporter, spans, args.batch)
+                exporter.shutdown()
+                print(f"{name:<20} {args.spans / wall:>10,.0f} span/s {cpu / args.spans * 1e6:>7.1f} µs")
+
+        with tempfile.TemporaryDirectory() as directory:
+            writer = CaptureWriter(directory)
+            request = encode_spans(spans[:20]).SerializeToString()
+            for i in range(200):
+                writer.append(TRACES, request, timestamp_ns=1_000_000_000_000 + i * 10_000_000)
+            writer.close()
+
+            print(f"\n{'replay':<20} {'target':>12} {'achieved':>12} {'max lag':>9}")
+            sender = GrpcSender(endpoint)
+            for label, speed, rate in (("original", 1, None), ("4x", 4, None), ("16x", 16, None), ("1000 req/s", 1, 1000)):
+                stats = replay(read_capture(directory), sender, speed=speed, rate=rate)
+                target = rate or 100 * speed
+                print(
+                    f"{label:<20} {target:>8,} r/s {stats['requests'] / stats['elapsed']:>8,.0f} r/s"
+                    f" {stats['max_lag'] * 1000:>6.1f} ms"
+                )
+            sender.close()
+    finally:
+        sink.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# bench_otlp_log_sink.py
+#
+# Loguru → stdout JSON (then parsed again by a log scraper) vs Loguru →
+# OtlpLogSink → BatchLogRecordProcessor → OTLP protobuf.
+#
+# No network is involved: the OTLP exporter encodes each batch to protobuf
+# bytes and discards them, and the stdout path writes to /dev/null and then
+# json-parses every line, as a filelog receiver would.
+#
+# "caller" is the time spent inside logger.info(). For the OTLP path it
+# includes GIL contention with the export thread, which does the protobuf
+# encoding in the same process — the stdout path leaves its parse step to
+# the scraper, which normally runs outside the service.
+#
+# Usage (from the chapter directory):
+#   uv run python -m benchmarks.bench_otlp_log_sink [--records 100000]
+import argparse
+import io
+import json
+import os
+import time
+
+from loguru import logger
+from opentelemetry.exporter.otlp.proto.common._log_encoder import encode_logs
+from opentelemetry.sdk._logs.export import LogRecordExporter, LogRecordExportResult
+
+from log_encoder import JsonLogEncoder
+from logging_setup import otel_patcher
+from otlp_log_sink import OtlpLogSink
+
+
+class EncodeOnlyExporter(LogRecordExporter):
+    """Pays the protobuf encoding cost of a real OTLP export, then discards."""
+
+    def __init__(self):
+        self.bytes_out = 0
+
+    def export(self, batch):
+        self.bytes_out += len(encode_logs(batch).SerializeToString())
+        return LogRecordExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return True
+
+
+def _emit(records: int) -> float:
+    start = time.perf_counter()
+    for i in range(records):
+        logger.info("Order created", order_id=f"ord-{i}", item="widget", qty=2)
+    return time.perf_counter() - start
+
+
+def bench_stdout(records: int) -> None:
+    buffer = io.StringIO()
+    logger.remove()
+    logger.configure(patcher=otel_patcher)
+    logger.add(JsonLogEncoder("order-service", stream=buffer), format="{message}")
+    caller = _emit(records)
+    logger.remove()
+
+    # The scraper's side: write out, then parse every line back.
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull:
+        devnull.write(buffer.getvalue())
+    for line in buffer.getvalue().splitlines():
+        json.loads(line)
+    scrape = time.perf_counter() - start
+    _report("stdout + re-parse", records, caller, caller + scrape)
+
+
+def bench_otlp(records: int) -> None:
+    exporter = EncodeOnlyExporter()
+    sink = OtlpLogSink(
+        "order-service",
+        exporter=exporter,
+        max_queue_size=records,
+        max_export_batch_size=512,
+    )
+    logger.remove()
+    logger.configure(patcher=otel_patcher)
+    logger.add(sink, format="{message}")
+    start = time.perf_counter()
+    caller = _emit(records)
+    logger.remove()  # shuts the provider down: waits for every batch
+    total = time.perf_counter() - start
+    _report("OTLP batch export", records, caller, total)
+    print(f"{'':<20} {exporter.bytes_out / records:>10.0f} protobuf bytes/record")
+
+
+def _report(label: str, records: int, caller: float, total: float) -> None:
+    print(
+        f"{label:<20} caller {caller / records * 1e6:>6.2f} µs/rec   "
+        f"end-to-end {records / total:>10,.0f} rec/s"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="OTLP log sink benchmark")
+    parser.add_argument("--records", type=int, default=100_000)
+    args = parser.parse_args()
+
+    bench_stdout(args.records)
+    bench_otlp(args.records)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# bench_route_sampler.py
+#
+# Gateway CPU and span volume with and without per-route head sampling.
+#
+# Usage (from the chapter directory):
+#   uv run python -m benchmarks.bench_route_sampler [--requests 6000] [--concurrency 50]
+#
+# Runs the real api_gateway app, FastAPI- and httpx-instrumented as under
+# opentelemetry-instrument, in a fresh process per mode. It is driven
+# in-process through httpx's ASGI transport with order-service mocked. Spans
+# go through a BatchSpanProcessor to a local OTLP/HTTP sink (otlp_stub.py).
+# The traffic mix is what a load balancer and a product page produce: 60%
+# GET /health, 30% GET /products/{id}, 10% GET /checkout.
+#
+#   all      no rules: every trace is recorded and exported (ch9's setup)
+#   rules    SAMPLING_RULES_FILE=sampling-rules.json: /health 1%,
+#            /products 10%, /checkout 100%
+#
+# Reports requests/sec, CPU per request and spans exported per request.
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+MODES = ("all", "rules")
+MIX = ["/health"] * 6 + ["/products/sku-1"] * 3 + ["/checkout"]
+
+
+def child(mode: str, endpoint: str, requests: int, concurrency: int) -> None:
+    os.environ.update(
+        {
+            "LOG_SINKS": "file",
+            "LOG_FILE_DIR": tempfile.mkdtemp(prefix="bench-route-sampler-"),
+            "OTEL_BSP_SCHEDULE_DELAY": "200",
+        }
+    )
+    if mode == "rules":
+        os.environ["SAMPLING_RULES_FILE"] = "sampling-rules.json"
+
+    from opentelemetry import trace
+    from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+    from opentelemetry.instrumentation.httpx import HTTPXClientInstrumentor
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import SpanProcessor, TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+    class Count(SpanProcessor):
+        ended = 0
+
+        def on_end(self, span) -> None:
+            Count.ended += 1
+
+    provider = TracerProvider(resource=Resource.create({"service.name": "api-gateway"}))
+    provider.add_span_processor(Count())
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=endpoint + "/v1/traces")))
+    trace.set_tracer_provider(provider)
+    FastAPIInstrumentor().instrument()
+    HTTPXClientInstrumentor().instrument()
+
+    import httpx
+
+    import api_gateway
+
+    def order_service(request: httpx.Request) -> httpx.Response:
+        if request.url.path.startswith("/products"):
+            return httpx.Response(200, json={"id": "sku-1", "source": "cache"})
+        return httpx.Response(200, json={"order_id": "ord-1042", "status": "created"})
+
+    async def drive(count: int) -> None:
+        api_gateway.app.state.http_client = httpx.AsyncClient(transport=httpx.MockTransport(order_service))
+        transport = httpx.ASGITransport(app=api_gateway.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+            remaining = iter(range(count))
+
+            async def worker():
+                for i in remaining:
+                    response = await client.get(MIX[i % len(MIX)])
+                    assert response.status_code == 200
+
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    async def run() -> dict:
+        await drive(min(requests, 1000))  # warm-up
+        provider.force_flush()
+        ended = Count.ended
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        await drive(requests)
+        provider.force_flush()
+        return {
+            "wall": time.perf_counter() - wall,
+            "cpu": time.process_time() - cpu,
+            "spans": Count.ended - ended,
+        }
+
+    result = asyncio.run(run())
+    print(json.dumps(result), flush=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Per-route head sampling benchmark")
+    parser.add_argument("--requests", type=int, default=6_000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--endpoint", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child, args.endpoint, args.requests, args.concurrency)
+        return
+
+    sink = subprocess.Popen(
+        [sys.executable, "otlp_stub.py", "--http", "0"], stdout=subprocess.PIPE, text=True
+    )
+    endpoint = sink.stdout.readline().split()[-1]
+    print(f"requests: {args.requests:,}, concurrency: {args.concurrency}, cores: {os.cpu_count()}\n")
+    print(f"{'mode':<8} {'throughput':>14} {'CPU/req':>10} {'spans/req':>10}")
+    try:
+        for mode in MODES:
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_route_sampler", "--child", mode,
+                 "--endpoint", endpoint, "--requests", str(args.requests),
+                 "--concurrency", str(args.concurrency)],
+                capture_output=True, text=True, check=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(
+                f"{mode:<8} {args.requests / result['wall']:>10,.0f} req/s"
+                f" {result['cpu'] / args.requests * 1e6:>7.0f} µs {result['spans'] / args.requests:>10.2f}"
+            )
+    finally:
+        sink.terminate()
+
+
+if __name__ == "__main__":
+    main()
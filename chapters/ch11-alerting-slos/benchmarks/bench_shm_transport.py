@@ -0,0 +1,123 @@
+# bench_shm_transport.py
+#
+# Gateway throughput with logs encoded inline, on a background thread, or in
+# a shared-memory shipper process.
+#
+# Usage (from the chapter directory):
+#   uv run python -m benchmarks.bench_shm_transport [--requests 20000] [--concurrency 50]
+#
+# Drives the real api_gateway app in-process through httpx's ASGI transport,
+# with order-service replaced by a canned httpx.MockTransport response, so
+# the gateway is the only thing doing work. Log output (the service's and the
+# shipper's) goes to /dev/null. For each mode it reports requests/sec and
+# CPU per request in the gateway process, the cost of a bare logger.info()
+# call there, and the total CPU the shipper spent (start-up included).
+#
+# The shipper needs a core of its own to pay off; on a single-core machine it
+# competes with the gateway for the same CPU.
+import argparse
+import asyncio
+import os
+import resource
+import sys
+import time
+
+import httpx
+
+import api_gateway
+from logging_setup import setup_logging
+
+MODES = {
+    "inline JsonLogEncoder": {},
+    "LOG_ASYNC_SINK=1": {"async_sink": True},
+    "LOG_TRANSPORT=shm": {"shm_transport": True},
+}
+
+
+def _order_service(request: httpx.Request) -> httpx.Response:
+    return httpx.Response(200, json={"order_id": "ord-1042", "status": "created"})
+
+
+async def _drive(requests: int, concurrency: int) -> None:
+    transport = httpx.ASGITransport(app=api_gateway.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+        remaining = iter(range(requests))
+
+        async def worker():
+            for _ in remaining:
+                response = await client.get("/checkout")
+                assert response.status_code == 200
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+def _children_cpu() -> float:
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _log_calls(logger, records: int) -> float:
+    start = time.process_time()
+    for _ in range(records):
+        logger.info("Checkout complete", order_id="ord-1042", item="widget", qty=2)
+    return (time.process_time() - start) / records * 1e6
+
+
+def bench(label: str, options: dict, args, report) -> None:
+    logger = setup_logging("api-gateway", sinks=args.sinks, **options)
+    api_gateway.app.state.http_client = httpx.AsyncClient(
+        transport=httpx.MockTransport(_order_service)
+    )
+    asyncio.run(_drive(min(args.requests, 1000), args.concurrency))  # warm-up
+
+    children_before = _children_cpu()
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    asyncio.run(_drive(args.requests, args.concurrency))
+    wall = time.perf_counter() - wall
+    cpu = time.process_time() - cpu
+    log_call_us = _log_calls(logger, args.records)
+    logger.remove()  # drains the sink; waits for the shipper to exit
+    shipper_cpu = _children_cpu() - children_before
+
+    report(
+        f"{label:<24} {args.requests / wall:>10,.0f} req/s "
+        f"{cpu / args.requests * 1e6:>10.1f} µs "
+        f"{log_call_us:>12.2f} µs "
+        f"{shipper_cpu:>12.2f} s"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Shared-memory log transport benchmark")
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--records", type=int, default=100_000, help="bare log calls")
+    parser.add_argument("--sinks", default="stdout", help="LOG_SINKS for every mode")
+    args = parser.parse_args()
+
+    # Send every log line (ours and the shipper's) to /dev/null, keep a
+    # handle on the real stdout for the report.
+    real_stdout = os.fdopen(os.dup(1), "w")
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    sys.stdout = os.fdopen(1, "w", closefd=False)
+
+    def report(line: str) -> None:
+        real_stdout.write(line + "\n")
+        real_stdout.flush()
+
+    report(
+        f"requests: {args.requests:,}, concurrency: {args.concurrency}, "
+        f"sinks: {args.sinks}, cores: {os.cpu_count()}\n"
+    )
+    report(
+        f"{'mode':<24} {'throughput':>16} {'gateway CPU/req':>14} "
+        f"{'CPU/log call':>15} {'shipper CPU':>14}"
+    )
+    for label, options in MODES.items():
+        bench(label, options, args, report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# bench_span_log_context.py
+#
+# Patcher cost per log call: the Chapter 6 otel_patcher (formats IDs on
+# every call) vs the span_log_context patcher (IDs formatted once per span
+# by LogContextSpanProcessor).
+#
+# Both are timed end to end: start a span, call the patcher `logs/span`
+# times inside it, end the span. The cached side pays for the processor's
+# on_start/on_end as part of the measurement. A span with no logs and no
+# processor, timed the same way, is subtracted, so the columns show what
+# logging adds to a span, per log line.
+#
+# Usage (from the chapter directory):
+#   uv run python -m benchmarks.bench_span_log_context [--calls 200000]
+import argparse
+import timeit
+
+from opentelemetry import trace
+from opentelemetry.sdk.trace import TracerProvider
+
+from span_log_context import LogContextSpanProcessor, otel_patcher
+
+REPEATS = 5
+SPAN_REPEATS = 25  # spans cost ~30 µs; take the best of many short runs
+
+
+def legacy_otel_patcher(record):
+    """The patcher from Chapters 6–10."""
+    span = trace.get_current_span()
+    if span.is_recording():
+        ctx = span.get_span_context()
+        record["extra"]["trace_id"] = format(ctx.trace_id, "032x")
+        record["extra"]["span_id"] = format(ctx.span_id, "016x")
+        record["extra"]["span_name"] = span.name
+    else:
+        record["extra"]["trace_id"] = "00000000000000000000000000000000"
+        record["extra"]["span_id"] = "0000000000000000"
+        record["extra"]["span_name"] = ""
+
+
+def _ns_per_call(func, calls: int) -> float:
+    return min(timeit.repeat(func, number=calls, repeat=REPEATS)) / calls * 1e9
+
+
+def _span_timer(tracer, patcher, logs_per_span: int) -> timeit.Timer:
+    record = {"extra": {}}
+
+    def one_span():
+        with tracer.start_as_current_span("create_order"):
+            for _ in range(logs_per_span):
+                patcher(record)
+
+    return timeit.Timer(one_span)
+
+
+def _ns_per_span(timers: list[timeit.Timer], spans: int) -> list[float]:
+    """Best time per span for each timer, interleaving the runs so they see the same noise."""
+    best = [float("inf")] * len(timers)
+    for _ in range(SPAN_REPEATS):
+        for i, timer in enumerate(timers):
+            best[i] = min(best[i], timer.timeit(spans) / spans * 1e9)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Span log-context benchmark")
+    parser.add_argument("--calls", type=int, default=200_000)
+    args = parser.parse_args()
+
+    legacy_tracer = TracerProvider().get_tracer(__name__)
+    provider = TracerProvider()
+    provider.add_span_processor(LogContextSpanProcessor())
+    cached_tracer = provider.get_tracer(__name__)
+
+    record = {"extra": {}}
+    with cached_tracer.start_as_current_span("create_order"):
+        legacy = _ns_per_call(lambda: legacy_otel_patcher(record), args.calls)
+        cached = _ns_per_call(lambda: otel_patcher(record), args.calls)
+    print(f"legacy patcher:  {legacy:>7.0f} ns/log (inside one open span)")
+    print(f"cached patcher:  {cached:>7.0f} ns/log\n")
+
+    spans = max(args.calls // 100, 100)
+    print(f"{'logs/span':>9} {'span alone':>11} {'legacy ns/log':>14} {'cached ns/log':>14} {'speedup':>8}")
+    for logs_per_span in (1, 2, 5, 20):
+        bare, legacy, cached = _ns_per_span(
+            [
+                _span_timer(legacy_tracer, legacy_otel_patcher, 0),
+                _span_timer(legacy_tracer, legacy_otel_patcher, logs_per_span),
+                _span_timer(cached_tracer, otel_patcher, logs_per_span),
+            ],
+            spans,
+        )
+        legacy, cached = (legacy - bare) / logs_per_span, (cached - bare) / logs_per_span
+        print(f"{logs_per_span:>9} {bare:>8.0f} ns {legacy:>14.0f} {cached:>14.0f} {legacy / cached:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+# bench_trace_index.py
+#
+# Build a trace_id index over a few million synthetic JSON log lines and
+# show that lookup time stays flat as the indexed volume grows, compared
+# with scanning every segment (what grep does). Then compress the segments
+# as file_sink.py does and compare lookups that decompress only the frames
+# they read with lookups that decompress whole segments.
+#
+# Usage (from the chapter directory):
+#   uv run python -m benchmarks.bench_trace_index [--lines 3000000] [--dir /tmp/trace-index-bench]
+import argparse
+import os
+import random
+import shutil
+import statistics
+import time
+from pathlib import Path
+
+from file_sink import FRAME_BYTES, ZSTD, compress_file, resolve_compression
+from trace_index import TraceIndex
+
+LINES_PER_TRACE = 6  # create_order logs up to six lines per request
+LINES_PER_SEGMENT = 500_000
+LOOKUPS = 200
+
+
+def _line(trace_id: str, span_id: str, n: int) -> str:
+    return (
+        '{"timestamp":"2025-01-01T12:00:00.000+00:00","level":"INFO",'
+        '"service":"order-service","message":"Inserting order record",'
+        f'"item":"widget","qty":2,"seq":{n},'
+        f'"trace_id":"{trace_id}","span_id":"{span_id}","span_name":"insert_order_record"}}\n'
+    )
+
+
+def generate(directory: Path, lines: int) -> tuple[list[Path], list[str]]:
+    """Write segments of interleaved traces; return segment paths and trace IDs."""
+    rng = random.Random(42)
+    segments, trace_ids = [], []
+    written = 0
+    while written < lines:
+        path = directory / f"order-service-{len(segments):05d}.jsonl"
+        count = min(LINES_PER_SEGMENT, lines - written)
+        open_traces: list[tuple[str, str]] = []
+        chunk = []
+        for n in range(count):
+            if len(open_traces) < 50 or rng.random() < 1 / LINES_PER_TRACE:
+                trace_id = f"{rng.getrandbits(128):032x}"
+                open_traces.append((trace_id, f"{rng.getrandbits(64):016x}"))
+                trace_ids.append(trace_id)
+            trace_id, span_id = open_traces[rng.randrange(len(open_traces))]
+            chunk.append(_line(trace_id, span_id, written + n))
+            if len(open_traces) > 200:
+                open_traces.pop(0)
+        path.write_text("".join(chunk))
+        segments.append(path)
+        written += count
+    return segments, trace_ids
+
+
+def _lookup_ms(index: TraceIndex, trace_ids: list[str], lookups: int = LOOKUPS) -> float:
+    rng = random.Random(7)
+    samples = []
+    for _ in range(lookups):
+        trace_id = trace_ids[rng.randrange(len(trace_ids))]
+        start = time.perf_counter()
+        index.lookup(trace_id)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def _scan_ms(segments: list[Path], trace_id: str) -> float:
+    needle = trace_id.encode()
+    start = time.perf_counter()
+    for path in segments:
+        with open(path, "rb") as f:
+            [line for line in f if needle in line]
+    return (time.perf_counter() - start) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Trace index benchmark")
+    parser.add_argument("--lines", type=int, default=3_000_000)
+    parser.add_argument("--dir", default="/tmp/trace-index-bench")
+    args = parser.parse_args()
+
+    directory = Path(args.dir)
+    shutil.rmtree(directory, ignore_errors=True)
+    directory.mkdir(parents=True)
+
+    start = time.perf_counter()
+    segments, trace_ids = generate(directory, args.lines)
+    size_mb = sum(p.stat().st_size for p in segments) / 1e6
+    print(
+        f"generated {args.lines:,} lines / {len(trace_ids):,} traces "
+        f"({size_mb:,.0f} MB) in {time.perf_counter() - start:.1f}s\n"
+    )
+
+    index = TraceIndex(directory / "trace-index.sqlite")
+    print(f"{'indexed lines':>14} {'build lines/s':>14} {'lookup ms (p50)':>16} {'full scan ms':>13}")
+    indexed = 0
+    for i, segment in enumerate(segments):
+        start = time.perf_counter()
+        index.index_file(segment)
+        build = time.perf_counter() - start
+        count = min(LINES_PER_SEGMENT, args.lines - i * LINES_PER_SEGMENT)
+        indexed += count
+        known = trace_ids[: len(trace_ids) * indexed // args.lines]
+        print(
+            f"{indexed:>14,} {count / build:>14,.0f} "
+            f"{_lookup_ms(index, known):>16.3f} "
+            f"{_scan_ms(segments[: i + 1], known[-1]):>13,.0f}"
+        )
+
+    index.close()
+    index_path = directory / "trace-index.sqlite"
+    print(f"\nindex size: {os.path.getsize(index_path) / 1e6:,.0f} MB")
+
+    # Same entries, no frame table: every lookup decompresses whole segments.
+    shutil.copy(index_path, directory / "whole-segments.sqlite")
+    compression = resolve_compression(ZSTD)
+    index = TraceIndex(index_path)
+    start = time.perf_counter()
+    for segment in segments:
+        _, frames = compress_file(segment, compression)
+        index.index_frames(segment, frames)
+    print(
+        f"\ncompressed {len(segments)} segments ({compression}, {FRAME_BYTES >> 10} KiB frames) "
+        f"in {time.perf_counter() - start:.1f}s"
+    )
+    whole = TraceIndex(directory / "whole-segments.sqlite")
+    print(f"lookup ms (p50): framed {_lookup_ms(index, trace_ids):,.3f}, whole segments {_lookup_ms(whole, trace_ids, 10):,.1f}")
+    index.close()
+    whole.close()
+
+
+if __name__ == "__main__":
+    main()
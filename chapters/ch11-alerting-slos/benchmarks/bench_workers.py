@@ -0,0 +1,195 @@
+# bench_workers.py
+#
+# Checkout throughput with 1..N worker processes per service (serve.py).
+#
+# Usage (from the chapter directory):
+#   uv run python -m benchmarks.bench_workers [--workers 1,2,4] [--duration 15] [--concurrency 200]
+#
+# For each worker count it starts order-service and api-gateway through
+# serve.py, exporting traces, metrics and logs over OTLP/gRPC to an in-process
+# stub receiver (otlp_stub.py), then drives GET /checkout from `concurrency`
+# clients for `duration` seconds. order-service's failure injection is off
+# (ORDER_FAILURE_RATE=0), so every request does the same work. On a host
+# with more than one core, the load generator and the stub are pinned to
+# core 0 and the services to the remaining cores, so they don't compete.
+# It reports:
+#
+#   throughput   responses/sec at the gateway (any status)
+#   5xx          share of responses that were errors
+#   failed       requests that got no response at all (timeouts, resets)
+#   svc CPU/req  CPU time of all service processes per request
+#   instances    distinct service.instance.id per service in the exported
+#                metrics; it should equal the worker count
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+from opentelemetry.proto.collector.metrics.v1.metrics_service_pb2 import ExportMetricsServiceRequest
+
+from otlp_stub import StubOTLPReceiver
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _cores() -> tuple[set[int], set[int]]:
+    """(load generator cores, service cores); the same set on one core."""
+    cores = sorted(os.sched_getaffinity(0))
+    if len(cores) == 1:
+        return set(cores), set(cores)
+    return {cores[0]}, set(cores[1:])
+
+
+def _serve(app: str, service: str, port: int, workers: int, env: dict) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "serve.py", app, "--service-name", service, "--port", str(port), "--workers", str(workers)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def _tree_cpu(root: int) -> float:
+    """CPU seconds used so far by `root` and all its live descendants."""
+    parents: dict[int, int] = {}
+    times: dict[int, float] = {}
+    tick = os.sysconf("SC_CLK_TCK")
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        parents[int(entry)] = int(fields[1])
+        times[int(entry)] = (int(fields[11]) + int(fields[12])) / tick  # utime + stime
+    tree, frontier = {root}, [root]
+    while frontier:
+        pid = frontier.pop()
+        children = [child for child, parent in parents.items() if parent == pid]
+        tree.update(children)
+        frontier.extend(children)
+    return sum(times.get(pid, 0.0) for pid in tree)
+
+
+def _wait_until_up(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up")
+
+
+async def _drive(url: str, duration: float, concurrency: int) -> dict:
+    counts = {"ok": 0, "5xx": 0, "failed": 0}
+    deadline = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=10.0) as client:
+
+        async def worker():
+            while time.monotonic() < deadline:
+                try:
+                    response = await client.get(url)
+                except httpx.HTTPError:
+                    counts["failed"] += 1
+                    continue
+                counts["5xx" if response.status_code >= 500 else "ok"] += 1
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return counts
+
+
+def _instances(receiver: StubOTLPReceiver) -> dict[str, set[str]]:
+    seen: dict[str, set[str]] = {}
+    for raw in list(receiver.requests["metrics"]):
+        for resource_metrics in ExportMetricsServiceRequest.FromString(raw).resource_metrics:
+            attributes = {a.key: a.value.string_value for a in resource_metrics.resource.attributes}
+            seen.setdefault(attributes.get("service.name", "?"), set()).add(attributes.get("service.instance.id", "-"))
+    return seen
+
+
+def run(workers: int, duration: float, concurrency: int, driver_cores: set[int], service_cores: set[int]) -> dict:
+    # Affinity is per thread: the stub's threads start on the driver cores,
+    # and the services inherit the service cores from the thread that starts
+    # them (their workers inherit it from serve.py).
+    os.sched_setaffinity(0, driver_cores)
+    receiver = StubOTLPReceiver().start()
+    order_port, gateway_port = _free_port(), _free_port()
+    with tempfile.TemporaryDirectory() as runtime_dir:
+        env = dict(
+            os.environ,
+            OTEL_TRACES_EXPORTER="otlp",
+            OTEL_METRICS_EXPORTER="otlp",
+            OTEL_LOGS_EXPORTER="otlp",
+            OTEL_EXPORTER_OTLP_ENDPOINT=f"http://{receiver.endpoint}",
+            OTEL_EXPORTER_OTLP_INSECURE="true",
+            OTEL_METRIC_EXPORT_INTERVAL="2000",
+            SERVE_RUNTIME_DIR=runtime_dir,
+            ORDER_SERVICE_URL=f"http://127.0.0.1:{order_port}",
+            ORDER_FAILURE_RATE="0",
+        )
+        os.sched_setaffinity(0, service_cores)
+        services = [
+            _serve("order_service:app", "order-service", order_port, workers,
+                   dict(env, SERVE_RUNTIME_DIR=os.path.join(runtime_dir, "order"))),
+            _serve("api_gateway:app", "api-gateway", gateway_port, workers,
+                   dict(env, SERVE_RUNTIME_DIR=os.path.join(runtime_dir, "gateway"))),
+        ]
+        os.sched_setaffinity(0, driver_cores)
+        try:
+            _wait_until_up(f"http://127.0.0.1:{order_port}/health")
+            _wait_until_up(f"http://127.0.0.1:{gateway_port}/health")
+            time.sleep(1.0)  # let every worker finish starting
+            cpu = sum(_tree_cpu(service.pid) for service in services)
+            counts = asyncio.run(_drive(f"http://127.0.0.1:{gateway_port}/checkout", duration, concurrency))
+            cpu = sum(_tree_cpu(service.pid) for service in services) - cpu
+            time.sleep(3.0)  # one more metric export from every worker
+        finally:
+            for service in services:
+                service.terminate()
+            for service in services:
+                service.wait(30)
+            receiver.stop()
+    return {**counts, "cpu": cpu, "instances": _instances(receiver)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Multi-worker serving benchmark")
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--concurrency", type=int, default=200)
+    args = parser.parse_args()
+
+    driver_cores, service_cores = _cores()
+    print(
+        f"duration: {args.duration:.0f}s, concurrency: {args.concurrency}, "
+        f"cores: {os.cpu_count()} (load generator {sorted(driver_cores)}, services {sorted(service_cores)})\n"
+    )
+    print(f"{'workers':<8} {'throughput':>14} {'5xx':>6} {'failed':>7} {'svc CPU/req':>12}  instances (gateway / order)")
+    for workers in (int(n) for n in args.workers.split(",")):
+        result = run(workers, args.duration, args.concurrency, driver_cores, service_cores)
+        total = result["ok"] + result["5xx"]
+        instances = result["instances"]
+        print(
+            f"{workers:<8} {total / args.duration:>10,.0f} req/s"
+            f" {result['5xx'] / max(total, 1):>6.0%} {result['failed']:>7}"
+            f" {result['cpu'] / max(total, 1) * 1000:>9.1f} ms"
+            f"  {len(instances.get('api-gateway', ()))} / {len(instances.get('order-service', ()))}"
+        )
+
+
+if __name__ == "__main__":
+    main()
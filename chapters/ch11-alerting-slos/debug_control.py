@@ -0,0 +1,326 @@
+# debug_control.py
+#
+# Runtime log levels and per-request debug-on-demand.
+#
+# setup_logging() used to fix the sink at INFO, so getting DEBUG detail out of
+# production meant a redeploy that turned it on for all traffic. This module
+# provides three pieces:
+#
+#   • LevelControl — the sink filter. It holds a default level plus
+#     per-module overrides that can be changed at runtime through
+#     admin_router (GET/PUT /admin/log-levels, only with LOG_ADMIN_TOKEN set).
+#     The sink's Loguru level follows the lowest level in use, so records
+#     below it are discarded before any filter runs.
+#   • DebugHeaderPropagator — a request whose `x-debug` header carries the
+#     shared LOG_DEBUG_TOKEN puts a debug flag in the OTel context. The flag
+#     is re-injected on outgoing calls, so order-service inherits it through
+#     the same context propagation as traceparent. Any other x-debug value is
+#     ignored and stripped: an untrusted client must not be able to turn on
+#     DEBUG logs and 100% sampling for its requests.
+#   • DebugSampler — always samples spans whose context carries the flag.
+#     The middleware also marks the span `debug.requested=true` so the
+#     Collector's tail sampler keeps the trace.
+#
+# Requests without the header only pay for a context lookup in the filter.
+import hmac
+import os
+import threading
+
+from fastapi import APIRouter, Header, HTTPException, Request
+from loguru import logger
+from opentelemetry import context as otel_context
+from opentelemetry import propagate, trace
+from opentelemetry.context import Context
+from opentelemetry.propagators.composite import CompositePropagator
+from opentelemetry.propagators.textmap import (
+    CarrierT,
+    Getter,
+    Setter,
+    TextMapPropagator,
+    default_getter,
+    default_setter,
+)
+from opentelemetry.sdk.trace.sampling import Decision, Sampler, SamplingResult
+from pydantic import BaseModel
+
+DEBUG_HEADER = "x-debug"
+DEBUG_ATTRIBUTE = "debug.requested"
+DEBUG_REQUEST_LEVEL = "DEBUG"
+_DEBUG_KEY = otel_context.create_key("debug-requested")
+
+
+def _matches_secret(value: str | None, env_var: str) -> bool:
+    """Constant-time compare of `value` with a secret; False when it is unset."""
+    secret = os.getenv(env_var)
+    if not secret or value is None:
+        return False
+    return hmac.compare_digest(value.encode(), secret.encode())
+
+
+def is_trusted_debug_header(value: str | None) -> bool:
+    """True when an x-debug header value is the shared LOG_DEBUG_TOKEN."""
+    return _matches_secret(value, "LOG_DEBUG_TOKEN")
+
+
+def is_debug_request(ctx: Context | None = None) -> bool:
+    """True when the (current) context carries the x-debug flag."""
+    return otel_context.get_value(_DEBUG_KEY, ctx) is True
+
+
+def set_debug_request(ctx: Context | None = None) -> Context:
+    return otel_context.set_value(_DEBUG_KEY, True, ctx)
+
+
+# ──────────────────────────────────────────────
+# Per-module levels
+# ──────────────────────────────────────────────
+class LevelControl:
+    """Loguru filter with runtime-adjustable per-module levels.
+
+    Overrides match the record's module name and its dotted parents, so an
+    override for `opentelemetry` also covers `opentelemetry.sdk`. Debug
+    requests pass at any level the sink accepts.
+
+    add_sink() registers the sink at the starting default level, so Loguru
+    drops lower records before formatting them. A second handler for the
+    levels below it exists only while an override or a debug request needs
+    them.
+    """
+
+    def __init__(self, default: str = "INFO"):
+        self.default = self.initial_default = logger.level(default.upper()).name
+        self.overrides: dict[str, str] = {}
+        self._thresholds: dict[str | None, int] = {}
+        self._lock = threading.Lock()
+        self._debug_requests = 0
+        self._sink = None
+        self._filter = self
+        self._base = logger.level(self.default).no
+        self._low: tuple[int, int] | None = None  # (handler id, level no)
+
+    def add_sink(self, sink, filter=None) -> int:
+        """Add `sink` to Loguru; `filter` replaces this control as the filter
+        and must call it."""
+        with self._lock:
+            self._sink, self._filter = sink, filter or self
+            self._base = logger.level(self.default).no
+            if self._low is not None:
+                try:
+                    logger.remove(self._low[0])
+                except ValueError:
+                    pass  # already removed with logger.remove()
+                self._low = None
+            handler_id = logger.add(sink, format="{message}", level=self._base, filter=self._filter)
+            self._update_low_handler()
+        return handler_id
+
+    def _update_low_handler(self) -> None:
+        """Add, move or remove the below-default handler (lock held)."""
+        if self._sink is None:
+            return
+        levels = [self.default, *self.overrides.values()]
+        if self._debug_requests:
+            levels.append(DEBUG_REQUEST_LEVEL)
+        lowest = min(logger.level(level).no for level in levels)
+        wanted = lowest if lowest < self._base else None
+        if wanted == (self._low[1] if self._low else None):
+            return
+        if self._low is not None:
+            logger.remove(self._low[0])
+            self._low = None
+        if wanted is not None:
+            base, accept = self._base, self._filter
+            # A bound method is a callable sink, which Loguru doesn't stop on
+            # remove(); the sink itself stays with the main handler.
+            handler_id = logger.add(
+                getattr(self._sink, "write", self._sink),
+                format="{message}",
+                level=wanted,
+                filter=lambda record: record["level"].no < base and accept(record),
+            )
+            self._low = (handler_id, wanted)
+
+    def debug_started(self) -> None:
+        with self._lock:
+            self._debug_requests += 1
+            if self._debug_requests == 1:
+                self._update_low_handler()
+
+    def debug_finished(self) -> None:
+        with self._lock:
+            self._debug_requests -= 1
+            if self._debug_requests == 0:
+                self._update_low_handler()
+
+    def set_level(self, module: str | None, level: str | None) -> None:
+        """Set (or with level=None, clear) the level of a module or the default.
+
+        Clearing the default restores the level this control started with.
+        """
+        if level is not None:
+            level = logger.level(level.upper()).name  # ValueError if unknown
+        if not module:
+            self.default = level or self.initial_default
+        elif level is None:
+            self.overrides.pop(module, None)
+        else:
+            self.overrides[module] = level
+        self._thresholds = {}
+        with self._lock:
+            self._update_low_handler()
+
+    def threshold(self, name: str | None) -> int:
+        threshold = self._thresholds.get(name)
+        if threshold is None:
+            level = self.default
+            module = name or ""
+            while module:
+                if module in self.overrides:
+                    level = self.overrides[module]
+                    break
+                module = module.rpartition(".")[0]
+            threshold = self._thresholds[name] = logger.level(level).no
+        return threshold
+
+    def levels(self) -> dict:
+        return {"default": self.default, "modules": dict(self.overrides)}
+
+    def __call__(self, record: dict) -> bool:
+        return record["level"].no >= self.threshold(record["name"]) or is_debug_request()
+
+
+level_control = LevelControl(os.getenv("LOG_LEVEL", "INFO"))
+
+
+# ──────────────────────────────────────────────
+# Propagation and sampling
+# ──────────────────────────────────────────────
+class DebugHeaderPropagator(TextMapPropagator):
+    """Carry the debug flag across services as an `x-debug: <LOG_DEBUG_TOKEN>` header."""
+
+    def extract(
+        self,
+        carrier: CarrierT,
+        context: Context | None = None,
+        getter: Getter[CarrierT] = default_getter,
+    ) -> Context:
+        values = getter.get(carrier, DEBUG_HEADER)
+        if values and is_trusted_debug_header(values[0]):
+            return set_debug_request(context)
+        return context if context is not None else otel_context.get_current()
+
+    def inject(
+        self,
+        carrier: CarrierT,
+        context: Context | None = None,
+        setter: Setter[CarrierT] = default_setter,
+    ) -> None:
+        token = os.getenv("LOG_DEBUG_TOKEN")
+        if token and is_debug_request(context):
+            setter.set(carrier, DEBUG_HEADER, token)
+
+    @property
+    def fields(self) -> set[str]:
+        return {DEBUG_HEADER}
+
+
+class DebugSampler(Sampler):
+    """Sample debug requests unconditionally, defer to `delegate` otherwise."""
+
+    def __init__(self, delegate: Sampler):
+        self.delegate = delegate
+
+    def should_sample(
+        self, parent_context, trace_id, name, kind=None, attributes=None, links=None, trace_state=None
+    ) -> SamplingResult:
+        if is_debug_request(parent_context):
+            parent = trace.get_current_span(parent_context).get_span_context()
+            return SamplingResult(
+                Decision.RECORD_AND_SAMPLE,
+                {DEBUG_ATTRIBUTE: True},
+                parent.trace_state if parent.is_valid else None,
+            )
+        return self.delegate.should_sample(
+            parent_context, trace_id, name, kind, attributes, links, trace_state
+        )
+
+    def get_description(self) -> str:
+        return f"DebugSampler{{{self.delegate.get_description()}}}"
+
+
+_installed = False
+
+
+def install_debug_propagation() -> None:
+    """Add the x-debug propagator and wrap the SDK sampler (idempotent)."""
+    global _installed
+    if _installed:
+        return
+    propagate.set_global_textmap(
+        CompositePropagator([propagate.get_global_textmap(), DebugHeaderPropagator()])
+    )
+    provider = trace.get_tracer_provider()
+    # Tracers created from here on (the ASGI server span's included) use it.
+    if isinstance(getattr(provider, "sampler", None), Sampler):
+        provider.sampler = DebugSampler(provider.sampler)
+    _installed = True
+
+
+async def debug_middleware(request: Request, call_next):
+    """Honour a trusted x-debug even without auto-instrumentation, strip an
+    untrusted one, tag the server span and lower the sink level meanwhile."""
+    token = None
+    value = request.headers.get(DEBUG_HEADER)
+    if value is not None and not is_debug_request():
+        if is_trusted_debug_header(value):
+            token = otel_context.attach(set_debug_request())
+        else:
+            request.scope["headers"] = [
+                (name, raw) for name, raw in request.scope["headers"] if name != DEBUG_HEADER.encode()
+            ]
+    debug = is_debug_request()
+    if debug:
+        trace.get_current_span().set_attribute(DEBUG_ATTRIBUTE, True)
+        level_control.debug_started()
+    try:
+        return await call_next(request)
+    finally:
+        if debug:
+            level_control.debug_finished()
+        if token is not None:
+            otel_context.detach(token)
+
+
+# ──────────────────────────────────────────────
+# Admin endpoint
+# ──────────────────────────────────────────────
+class LevelChange(BaseModel):
+    module: str | None = None  # None/"" changes the default level
+    level: str | None = None   # None removes the module override
+
+
+admin_router = APIRouter(prefix="/admin", tags=["admin"])
+
+
+def _check_token(token: str | None) -> None:
+    if not os.getenv("LOG_ADMIN_TOKEN"):
+        raise HTTPException(status_code=403, detail="admin endpoint disabled: LOG_ADMIN_TOKEN is not set")
+    if not _matches_secret(token, "LOG_ADMIN_TOKEN"):
+        raise HTTPException(status_code=403, detail="invalid admin token")
+
+
+@admin_router.get("/log-levels")
+async def get_log_levels(x_admin_token: str | None = Header(default=None)):
+    _check_token(x_admin_token)
+    return level_control.levels()
+
+
+@admin_router.put("/log-levels")
+async def put_log_level(change: LevelChange, x_admin_token: str | None = Header(default=None)):
+    _check_token(x_admin_token)
+    try:
+        level_control.set_level(change.module, change.level)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    logger.warning("Log level changed", module=change.module or "*", new_level=change.level)
+    return level_control.levels()
@@ -0,0 +1,515 @@
+# disk_queue.py
+#
+# A disk-backed write-ahead queue between the SDK and the Collector.
+#
+# When the Collector at localhost:4317 restarts or is overloaded, the OTLP
+# exporters block the export thread in their retry loop, the SDK queues
+# behind them fill up, and new spans are dropped — including the error
+# traces we most want. DiskExportQueue takes each exported batch as an
+# encoded OTLP request (bytes) and:
+#
+#   • sends it straight away while the endpoint is healthy and nothing is
+#     waiting on disk (one short-timeout attempt, no retry loop)
+#   • otherwise appends it to a segmented, append-only log (SegmentLog)
+#     and returns — the export thread is never held up by an outage
+#   • replays the log in order from its own thread once the endpoint is
+#     back, with exponential backoff while it isn't
+#   • caps the log at max_bytes by deleting the oldest segment
+#
+# Memory stays flat through an outage: only the batch being sent is held in
+# memory. Everything runs on the SDK's export threads and the replay thread,
+# never on the event loop. The log survives restarts; a service that comes
+# back up replays what the previous run could not deliver.
+#
+# Record format: 4-byte length, 1-byte signal, 4-byte CRC32, payload. A torn
+# record at the end of a segment (crash mid-write) is truncated on open.
+import os
+import struct
+import threading
+import zlib
+from collections import deque
+from pathlib import Path
+
+from loguru import logger
+from opentelemetry import metrics
+from opentelemetry.exporter.otlp.proto.common.metrics_encoder import encode_metrics
+from opentelemetry.exporter.otlp.proto.common.trace_encoder import encode_spans
+from opentelemetry.metrics import CallbackOptions, Observation
+from opentelemetry.sdk.metrics.export import MetricExporter, MetricExportResult
+from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+
+TRACES = 1
+METRICS = 2
+
+_HEADER = struct.Struct(">IBI")  # payload length, signal, crc32
+_SUFFIX = ".seg"
+_CURSOR = "cursor"
+
+
+class _Segment:
+    __slots__ = ("seq", "path", "size", "records")
+
+    def __init__(self, seq: int, path: Path, size: int = 0, records: int = 0):
+        self.seq = seq
+        self.path = path
+        self.size = size
+        self.records = records
+
+
+def _scan(path: Path) -> list[int]:
+    """Offsets of the valid records in a segment, plus the end of the last one."""
+    offsets = [0]
+    with open(path, "rb") as f:
+        data = f.read()
+    position = 0
+    while position + _HEADER.size <= len(data):
+        length, _signal, crc = _HEADER.unpack_from(data, position)
+        end = position + _HEADER.size + length
+        if end > len(data) or zlib.crc32(data[position + _HEADER.size:end]) != crc:
+            break
+        position = end
+        offsets.append(position)
+    return offsets
+
+
+class SegmentLog:
+    """Append-only records in numbered segment files, read back in order.
+
+    Not thread-safe: DiskExportQueue serializes access with its lock.
+    """
+
+    def __init__(
+        self,
+        directory: str | Path,
+        segment_bytes: int = 8 << 20,
+        max_bytes: int = 256 << 20,
+        fsync: bool = False,
+    ):
+        if max_bytes < 2 * segment_bytes:
+            raise ValueError("max_bytes must hold at least two segments")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.fsync = fsync
+
+        self._segments: deque[_Segment] = deque()
+        self._read_offset = 0  # in the oldest segment
+        self._read_index = 0   # records already acked in the oldest segment
+        self._reader = None
+        self._load()
+        self._writer = open(self._segments[-1].path, "ab")
+
+    def _path(self, seq: int) -> Path:
+        return self.directory / f"{seq:020d}{_SUFFIX}"
+
+    def _load(self) -> None:
+        cursor_seq, cursor_offset = 0, 0
+        cursor = self.directory / _CURSOR
+        if cursor.exists():
+            cursor_seq, cursor_offset = map(int, cursor.read_text().split())
+
+        for path in sorted(self.directory.glob(f"*{_SUFFIX}")):
+            seq = int(path.stem)
+            if seq < cursor_seq:  # fully replayed, deletion was interrupted
+                path.unlink()
+                continue
+            offsets = _scan(path)
+            if offsets[-1] != path.stat().st_size:
+                logger.warning("Truncating torn export queue record", segment=path.name, offset=offsets[-1])
+                os.truncate(path, offsets[-1])
+            self._segments.append(_Segment(seq, path, offsets[-1], len(offsets) - 1))
+            if seq == cursor_seq and cursor_offset in offsets:
+                self._read_offset = cursor_offset
+                self._read_index = offsets.index(cursor_offset)
+
+        if not self._segments:
+            self._segments.append(_Segment(cursor_seq + 1, self._path(cursor_seq + 1)))
+            self._segments[-1].path.touch()
+
+    # ──────────────────────────────────────────────
+    # Writing
+    # ──────────────────────────────────────────────
+    def append(self, signal: int, payload: bytes) -> int:
+        """Append one record; return how many unread records were evicted."""
+        active = self._segments[-1]
+        if active.size >= self.segment_bytes:
+            active = self._roll()
+        self._writer.write(_HEADER.pack(len(payload), signal, zlib.crc32(payload)))
+        self._writer.write(payload)
+        self._writer.flush()
+        if self.fsync:
+            os.fsync(self._writer.fileno())
+        active.size += _HEADER.size + len(payload)
+        active.records += 1
+
+        evicted = 0
+        while self.size > self.max_bytes and len(self._segments) > 1:
+            evicted += self._evict_oldest()
+        return evicted
+
+    def _roll(self) -> _Segment:
+        self._writer.close()
+        seq = self._segments[-1].seq + 1
+        segment = _Segment(seq, self._path(seq))
+        self._segments.append(segment)
+        self._writer = open(segment.path, "ab")
+        return segment
+
+    def _evict_oldest(self) -> int:
+        oldest = self._segments[0]
+        unread = oldest.records - self._read_index
+        self._drop_oldest()
+        return unread
+
+    def _drop_oldest(self) -> None:
+        oldest = self._segments.popleft()
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+        self._read_offset = self._read_index = 0
+        self._save_cursor()
+        oldest.path.unlink(missing_ok=True)
+
+    # ──────────────────────────────────────────────
+    # Reading
+    # ──────────────────────────────────────────────
+    def peek(self) -> tuple[int, bytes, tuple[int, int, int]] | None:
+        """The oldest unread record as (signal, payload, token), or None.
+
+        Pass the token to ack(). It names the record by segment and offset,
+        so an ack that arrives after the segment was evicted is ignored.
+        """
+        oldest = self._segments[0]
+        if self._read_index >= oldest.records:
+            if len(self._segments) == 1:
+                return None
+            self._drop_oldest()  # fully replayed
+            return self.peek()
+        if self._reader is None:
+            self._reader = open(oldest.path, "rb")
+        self._reader.seek(self._read_offset)
+        length, signal, _crc = _HEADER.unpack(self._reader.read(_HEADER.size))
+        token = (oldest.seq, self._read_offset, self._read_offset + _HEADER.size + length)
+        return signal, self._reader.read(length), token
+
+    def ack(self, token: tuple[int, int, int]) -> None:
+        """Mark the record peek() returned with `token` as delivered."""
+        seq, offset, end = token
+        if seq != self._segments[0].seq or offset != self._read_offset:
+            return  # evicted since peek(); the cursor already moved past it
+        self._read_offset = end
+        self._read_index += 1
+        self._save_cursor()
+
+    def _save_cursor(self) -> None:
+        tmp = self.directory / (_CURSOR + ".tmp")
+        tmp.write_text(f"{self._segments[0].seq} {self._read_offset}")
+        os.replace(tmp, self.directory / _CURSOR)
+
+    def __len__(self) -> int:
+        return sum(segment.records for segment in self._segments) - self._read_index
+
+    @property
+    def size(self) -> int:
+        return sum(segment.size for segment in self._segments)
+
+    @property
+    def segments(self) -> int:
+        return len(self._segments)
+
+    def close(self) -> None:
+        self._writer.close()
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+
+# ──────────────────────────────────────────────
+# Senders: one encoded OTLP request → the endpoint
+# ──────────────────────────────────────────────
+# send() returns True when the request is done with (accepted, or rejected
+# for good and logged) and False when it should be retried later.
+_GRPC_METHODS = {
+    TRACES: "/opentelemetry.proto.collector.trace.v1.TraceService/Export",
+    METRICS: "/opentelemetry.proto.collector.metrics.v1.MetricsService/Export",
+}
+_HTTP_PATHS = {TRACES: "/v1/traces", METRICS: "/v1/metrics"}
+_RETRYABLE_HTTP = {429, 502, 503, 504}
+
+
+class GrpcSender:
+    """Send already-encoded OTLP requests over one gRPC channel."""
+
+    def __init__(self, endpoint: str = "localhost:4317", insecure: bool = True, compression: str = "gzip", timeout: float = 5.0):
+        import grpc
+
+        self._grpc = grpc
+        self._retryable = {
+            grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.DEADLINE_EXCEEDED,
+            grpc.StatusCode.RESOURCE_EXHAUSTED, grpc.StatusCode.ABORTED,
+            grpc.StatusCode.CANCELLED, grpc.StatusCode.OUT_OF_RANGE, grpc.StatusCode.DATA_LOSS,
+        }
+        secure = endpoint.startswith("https://")
+        target = endpoint.split("://", 1)[-1].rstrip("/")
+        codec = grpc.Compression.Gzip if compression == "gzip" else grpc.Compression.NoCompression
+        if secure or not insecure:
+            self._channel = grpc.secure_channel(target, grpc.ssl_channel_credentials(), compression=codec)
+        else:
+            self._channel = grpc.insecure_channel(target, compression=codec)
+        # No serializers: the request is sent as the bytes we pass in.
+        self._calls = {signal: self._channel.unary_unary(method) for signal, method in _GRPC_METHODS.items()}
+        self.timeout = timeout
+
+    def send(self, signal: int, payload: bytes) -> bool:
+        try:
+            self._calls[signal](payload, timeout=self.timeout)
+            return True
+        except self._grpc.RpcError as error:
+            if error.code() in self._retryable:
+                return False
+            logger.warning("OTLP endpoint rejected a batch", code=error.code().name, details=error.details())
+            return True
+
+    def close(self) -> None:
+        self._channel.close()
+
+
+class HttpSender:
+    """Send already-encoded OTLP requests over HTTP/protobuf."""
+
+    def __init__(self, endpoint: str = "http://localhost:4318", compression: str = "gzip", timeout: float = 5.0):
+        import requests
+
+        self._requests = requests
+        self._session = requests.Session()
+        self._session.headers["Content-Type"] = "application/x-protobuf"
+        self.endpoint = endpoint.rstrip("/")
+        self.gzip = compression == "gzip"
+        if self.gzip:
+            self._session.headers["Content-Encoding"] = "gzip"
+        self.timeout = timeout
+
+    def send(self, signal: int, payload: bytes) -> bool:
+        body = zlib.compress(payload, wbits=31) if self.gzip else payload
+        try:
+            response = self._session.post(self.endpoint + _HTTP_PATHS[signal], data=body, timeout=self.timeout)
+        except self._requests.RequestException:
+            return False
+        if response.ok:
+            return True
+        if response.status_code in _RETRYABLE_HTTP:
+            return False
+        logger.warning("OTLP endpoint rejected a batch", status=response.status_code)
+        return True
+
+    def close(self) -> None:
+        self._session.close()
+
+
+def build_sender(protocol: str | None = None, endpoint: str | None = None):
+    """A sender for the OTEL_EXPORTER_OTLP_* settings opentelemetry-instrument uses."""
+    protocol = (protocol or os.getenv("OTEL_EXPORTER_OTLP_PROTOCOL", "grpc")).lower()
+    compression = os.getenv("OTEL_EXPORTER_OTLP_COMPRESSION", "gzip").lower()
+    timeout = float(os.getenv("EXPORT_DISK_QUEUE_SEND_TIMEOUT", "5"))
+    if protocol == "grpc":
+        return GrpcSender(
+            endpoint or os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "localhost:4317"),
+            insecure=os.getenv("OTEL_EXPORTER_OTLP_INSECURE", "true").lower() == "true",
+            compression=compression,
+            timeout=timeout,
+        )
+    if protocol == "http/protobuf":
+        return HttpSender(
+            endpoint or os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4318"),
+            compression=compression,
+            timeout=timeout,
+        )
+    raise ValueError(f"unsupported OTLP protocol {protocol!r}")
+
+
+# ──────────────────────────────────────────────
+# The queue
+# ──────────────────────────────────────────────
+class DiskExportQueue:
+    """Send encoded OTLP requests, spilling to a SegmentLog during outages."""
+
+    def __init__(
+        self,
+        directory: str | Path,
+        sender,
+        max_bytes: int = 256 << 20,
+        segment_bytes: int = 8 << 20,
+        min_backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        fsync: bool = False,
+    ):
+        self.sender = sender
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self._log = SegmentLog(directory, segment_bytes=segment_bytes, max_bytes=max_bytes, fsync=fsync)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._drained = threading.Event()
+        self._healthy = True
+        self._closed = False
+        self._users = 0
+
+        self.sent = 0       # delivered directly
+        self.spilled = 0    # written to disk
+        self.replayed = 0   # delivered from disk
+        self.evicted = 0    # deleted unread to stay under max_bytes
+
+        self._worker = threading.Thread(name="OtelDiskExportQueue", target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(self, signal: int, payload: bytes) -> None:
+        """Deliver `payload` now if possible, otherwise queue it on disk."""
+        with self._lock:
+            direct = self._healthy and not self._closed and len(self._log) == 0
+        if direct:
+            if self.sender.send(signal, payload):
+                self.sent += 1
+                return
+            self._healthy = False
+            logger.warning("OTLP endpoint unavailable, spilling exports to disk", directory=str(self._log.directory))
+        with self._lock:
+            self.evicted += self._log.append(signal, payload)
+            self.spilled += 1
+            self._drained.clear()
+        self._wake.set()
+
+    def _run(self) -> None:
+        backoff = self.min_backoff
+        while not self._stop.is_set():
+            try:
+                with self._lock:
+                    record = self._log.peek()
+                    if record is None:
+                        self._healthy = True
+                        self._drained.set()
+                        self._wake.clear()
+                if record is None:
+                    self._wake.wait()
+                    continue
+                signal, payload, token = record
+                if not self.sender.send(signal, payload):
+                    self._stop.wait(backoff)
+                    backoff = min(backoff * 2, self.max_backoff)
+                    continue
+                if backoff > self.min_backoff:
+                    logger.info("OTLP endpoint is back, replaying exports from disk", queued=len(self._log))
+                backoff = self.min_backoff
+                with self._lock:
+                    self._log.ack(token)
+                    self.replayed += 1
+            except Exception:
+                # Keep the replay thread alive; the record is retried after the backoff.
+                logger.exception("Export queue replay failed", directory=str(self._log.directory))
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+
+    def flush(self, timeout: float = 30.0) -> bool:
+        """Wait until nothing is left on disk."""
+        return self._drained.wait(timeout)
+
+    def retain(self) -> "DiskExportQueue":
+        """Register one more exporter; the queue closes when the last releases."""
+        with self._lock:
+            self._users += 1
+        return self
+
+    def release(self) -> None:
+        with self._lock:
+            self._users -= 1
+            last = self._users <= 0
+        if last:
+            self.close()
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Stop replaying; whatever is still queued stays on disk for the next run.
+
+        Batches submitted after close() go straight to disk.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._stop.set()
+        self._wake.set()
+        self._worker.join(timeout)
+        self.sender.close()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "queued": len(self._log),
+                "queued_bytes": self._log.size,
+                "segments": self._log.segments,
+                "sent": self.sent,
+                "spilled": self.spilled,
+                "replayed": self.replayed,
+                "evicted": self.evicted,
+            }
+
+
+# ──────────────────────────────────────────────
+# SDK exporters
+# ──────────────────────────────────────────────
+class DiskSpanExporter(SpanExporter):
+    """SpanExporter that hands OTLP-encoded batches to a DiskExportQueue."""
+
+    def __init__(self, queue: DiskExportQueue):
+        self.queue = queue.retain()
+
+    def export(self, spans) -> SpanExportResult:
+        self.queue.submit(TRACES, encode_spans(spans).SerializeToString())
+        return SpanExportResult.SUCCESS
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self.queue.flush(timeout_millis / 1000)
+
+    def shutdown(self) -> None:
+        self.queue.release()
+
+
+class DiskMetricExporter(MetricExporter):
+    """MetricExporter that hands OTLP-encoded metrics to a DiskExportQueue."""
+
+    def __init__(self, queue: DiskExportQueue, preferred_temporality=None, preferred_aggregation=None):
+        super().__init__(preferred_temporality, preferred_aggregation)
+        self.queue = queue.retain()
+
+    def export(self, metrics_data, timeout_millis: float = 10_000, **kwargs) -> MetricExportResult:
+        self.queue.submit(METRICS, encode_metrics(metrics_data).SerializeToString())
+        return MetricExportResult.SUCCESS
+
+    def force_flush(self, timeout_millis: float = 10_000) -> bool:
+        return self.queue.flush(timeout_millis / 1000)
+
+    def shutdown(self, timeout_millis: float = 30_000, **kwargs) -> None:
+        self.queue.release()
+
+
+def register_disk_queue_metrics(queue: DiskExportQueue) -> None:
+    """Export the queue's counters and backlog through the OTel meter."""
+    meter = metrics.get_meter(__name__)
+
+    def observe(field: str):
+        def callback(_options: CallbackOptions):
+            yield Observation(queue.stats()[field])
+        return callback
+
+    for field in ("spilled", "replayed", "evicted"):
+        meter.create_observable_counter(
+            name=f"otel.export.disk_queue.{field}",
+            callbacks=[observe(field)],
+            description=f"Export batches {field} by the disk queue",
+            unit="1",
+        )
+    meter.create_observable_gauge(
+        name="otel.export.disk_queue.size",
+        callbacks=[observe("queued_bytes")],
+        description="Bytes of export batches waiting on disk",
+        unit="By",
+    )
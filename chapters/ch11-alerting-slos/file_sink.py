@@ -0,0 +1,258 @@
+# file_sink.py
+#
+# High-throughput rotating log files for hosts that can't ship logs over
+# the network (and don't want to go through the container log driver).
+#
+# RotatingFileWriter is a text stream for JsonLogEncoder / BackgroundLogSink:
+#   • each segment is preallocated (posix_fallocate) and written through a
+#     large userspace buffer, so a record is usually just a memcpy
+#   • on a size or time boundary the segment is truncated to its real
+#     length, closed, and a new one is opened. The time boundary is also
+#     checked from the compressor thread, so an idle service still closes
+#     (and compresses and indexes) its last segment.
+#   • closed segments are compressed (zstd by default, or gzip) by a
+#     background thread — the event loop never pays for compression. Each FRAME_BYTES of lines becomes its own zstd frame
+#     or gzip member, so a reader that knows the frame offsets
+#     (trace_index.py) can decompress one frame instead of the segment.
+#
+# The writer deliberately has no flush() method: JsonLogEncoder flushes its
+# stream after every record, which would defeat the buffer.
+import gzip
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable
+
+import zstandard
+
+ZSTD = "zstd"
+GZIP = "gzip"
+NONE = "none"
+
+FRAME_BYTES = 256 << 10  # uncompressed bytes per independently decompressible frame
+
+
+def resolve_compression(name: str) -> str:
+    """Normalize and validate a codec name."""
+    name = (name or NONE).lower()
+    if name not in (ZSTD, GZIP, NONE):
+        raise ValueError(f"unknown compression {name!r}, expected zstd, gzip or none")
+    return name
+
+
+def compress_file(
+    path: Path, compression: str, frame_bytes: int = FRAME_BYTES
+) -> tuple[Path, list[tuple[int, int, int]]]:
+    """Compress `path` next to itself and remove the original.
+
+    The output is a sequence of zstd frames or gzip members, each holding
+    about `frame_bytes` of whole lines; zstdcat/zcat still read it as one
+    stream. Returns the new path and its frame table: (offset in the
+    original, offset in the compressed file, compressed length) per frame.
+    """
+    if compression == ZSTD:
+        target = path.with_name(path.name + ".zst")
+        compress = zstandard.ZstdCompressor(level=3).compress
+    else:
+        target = path.with_name(path.name + ".gz")
+        compress = lambda block: gzip.compress(block, compresslevel=6)
+
+    frames = []
+    raw_offset = file_offset = 0
+    pending = b""
+    with open(path, "rb") as src, open(target, "wb") as dst:
+        while True:
+            chunk = src.read(frame_bytes)
+            data = pending + chunk
+            if chunk:
+                cut = data.rfind(b"\n") + 1
+                if cut == 0:
+                    pending = data  # a line longer than a frame: keep reading
+                    continue
+                block, pending = data[:cut], data[cut:]
+            else:
+                block, pending = data, b""
+            if block:
+                frame = compress(block)
+                dst.write(frame)
+                frames.append((raw_offset, file_offset, len(frame)))
+                raw_offset += len(block)
+                file_offset += len(frame)
+            if not chunk:
+                break
+    path.unlink()
+    return target, frames
+
+
+class RotatingFileWriter:
+    """Text stream that writes into rotating, preallocated segment files."""
+
+    def __init__(
+        self,
+        directory: str | os.PathLike,
+        prefix: str,
+        segment_bytes: int = 64 << 20,
+        rotate_interval: float = 3600.0,
+        buffer_size: int = 1 << 20,
+        compression: str = ZSTD,
+        on_segment_closed: Callable[[Path], None] | None = None,
+        on_segment_compressed: Callable[[Path, list[tuple[int, int, int]]], None] | None = None,
+        frame_bytes: int = FRAME_BYTES,
+        idle_check: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.prefix = prefix
+        self.segment_bytes = segment_bytes
+        self.rotate_interval = rotate_interval
+        self.buffer_size = buffer_size
+        self.compression = resolve_compression(compression)
+        self.on_segment_closed = on_segment_closed
+        self.on_segment_compressed = on_segment_compressed
+        self.frame_bytes = frame_bytes
+        self.idle_check = idle_check
+        self.clock = clock
+
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self._file = None
+        self._path: Path | None = None
+        self._segment_written = 0
+        self._opened_at = 0.0
+
+        self.bytes_written = 0
+        self.segments_closed = 0
+        self.bytes_before_compression = 0
+        self.bytes_after_compression = 0
+        self.last_rotation_ms = 0.0
+        self.max_rotation_ms = 0.0
+
+        self._closed_segments: queue.Queue[Path | None] = queue.Queue()
+        self._compressor = threading.Thread(
+            target=self._compress_loop, name="log-compressor", daemon=True
+        )
+        self._compressor.start()
+        self._open_segment()
+
+    # ──────────────────────────────────────────────
+    # Writing
+    # ──────────────────────────────────────────────
+    def write(self, text: str) -> int:
+        data = text.encode()
+        with self._lock:
+            if self._file is None:
+                raise ValueError("write to a stopped RotatingFileWriter")
+            self._file.write(data)
+            self._segment_written += len(data)
+            self.bytes_written += len(data)
+            if (
+                self._segment_written >= self.segment_bytes
+                or self.clock() - self._opened_at >= self.rotate_interval
+            ):
+                self._rotate()
+        return len(text)
+
+    def _open_segment(self) -> None:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        self._sequence += 1
+        name = f"{self.prefix}-{stamp}-{os.getpid()}-{self._sequence:05d}.jsonl"
+        self._path = self.directory / name
+        self._file = open(self._path, "wb", buffering=self.buffer_size)
+        if hasattr(os, "posix_fallocate"):
+            try:
+                os.posix_fallocate(self._file.fileno(), 0, self.segment_bytes)
+            except OSError:
+                pass  # e.g. filesystems without fallocate support
+        self._segment_written = 0
+        self._opened_at = self.clock()
+
+    def _close_segment(self) -> None:
+        self._file.flush()
+        # Drop the unused preallocated tail so readers never see NUL bytes.
+        os.ftruncate(self._file.fileno(), self._segment_written)
+        self._file.close()
+        self._file = None
+        self.segments_closed += 1
+        self._closed_segments.put(self._path)
+
+    def _rotate(self) -> None:
+        start = time.perf_counter()
+        self._close_segment()
+        self._open_segment()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.last_rotation_ms = elapsed_ms
+        self.max_rotation_ms = max(self.max_rotation_ms, elapsed_ms)
+
+    def _rotate_if_due(self) -> None:
+        with self._lock:
+            if self._file is None or self.clock() - self._opened_at < self.rotate_interval:
+                return
+            if self._segment_written:
+                self._rotate()
+            else:
+                self._opened_at = self.clock()  # nothing to close; restart the interval
+
+    def rotate(self) -> None:
+        """Close the current segment now (e.g. before an external backup)."""
+        with self._lock:
+            if self._file is not None:
+                self._rotate()
+
+    @property
+    def current_path(self) -> Path | None:
+        return self._path
+
+    # ──────────────────────────────────────────────
+    # Compression (background thread)
+    # ──────────────────────────────────────────────
+    def _compress_loop(self) -> None:
+        while True:
+            try:
+                path = self._closed_segments.get(timeout=self.idle_check)
+            except queue.Empty:
+                self._rotate_if_due()  # no write() has come along to do it
+                continue
+            if path is None:
+                return
+            try:
+                if self.on_segment_closed is not None:
+                    self.on_segment_closed(path)
+                if self.compression == NONE:
+                    continue
+                size = path.stat().st_size
+                compressed, frames = compress_file(path, self.compression, self.frame_bytes)
+                if self.on_segment_compressed is not None:
+                    self.on_segment_compressed(path, frames)
+                with self._lock:
+                    self.bytes_before_compression += size
+                    self.bytes_after_compression += compressed.stat().st_size
+            except Exception as e:
+                sys.stderr.write(f"log-compressor: failed on {path}: {e!r}\n")
+
+    def stop(self) -> None:
+        """Close the last segment and wait for pending compression."""
+        with self._lock:
+            if self._file is not None:
+                self._close_segment()
+        self._closed_segments.put(None)
+        self._compressor.join()
+
+    def stats(self) -> dict[str, float]:
+        with self._lock:
+            ratio = (
+                self.bytes_before_compression / self.bytes_after_compression
+                if self.bytes_after_compression
+                else 0.0
+            )
+            return {
+                "bytes_written": self.bytes_written,
+                "segments_closed": self.segments_closed,
+                "compression_ratio": round(ratio, 2),
+                "last_rotation_ms": round(self.last_rotation_ms, 3),
+                "max_rotation_ms": round(self.max_rotation_ms, 3),
+            }
@@ -0,0 +1,98 @@
+# log_encoder.py
+#
+# One-pass JSON encoder used as a Loguru sink by logging_setup.py.
+#
+# The Chapter 6 template built JSON by string-formatting a Loguru format
+# string. That approach:
+#   • dropped every bound kwarg (item=, qty=, order_id= ...)
+#   • produced invalid JSON when a message contained a quote
+#   • re-rendered the timestamp for every record
+#
+# JsonLogEncoder serializes the record plus all `extra` fields in a single
+# orjson dump and caches the
+# `{"timestamp": ..., "level": ..., "service": ...` prefix per millisecond.
+# Extras named like a record field are written as `extra.<name>` instead of
+# duplicating or overwriting it.
+import json
+import sys
+import traceback
+from typing import Any, TextIO
+
+import orjson
+
+
+def _dumps(obj: dict) -> str:
+    try:
+        return orjson.dumps(obj, default=str).decode()
+    except orjson.JSONEncodeError:
+        # orjson rejects integers wider than 64 bits; json writes them.
+        return json.dumps(obj, default=str, ensure_ascii=False, separators=(",", ":"))
+
+
+RESERVED_FIELDS = frozenset({"timestamp", "level", "service", "message", "exception"})
+
+
+class JsonLogEncoder:
+    """Loguru sink that writes one JSON object per line.
+
+    The record's `extra` dict (OTel IDs from the patcher plus any bound
+    kwargs) is merged into the top level of the JSON object.
+    """
+
+    def __init__(self, service_name: str, stream: TextIO | None = None):
+        self.service_name = service_name
+        self.stream = stream if stream is not None else sys.stdout
+        self._flush = getattr(self.stream, "flush", None)
+
+        self._service_json = _dumps(service_name)
+        self._prefix_key: tuple[int, str] | None = None
+        self._prefix = ""
+
+    def _prefix_for(self, record: dict) -> str:
+        """Return the cached `{"timestamp":...,"level":...,"service":...,` prefix."""
+        when = record["time"]
+        level = record["level"].name
+        key = (int(when.timestamp() * 1000), level)
+        if key != self._prefix_key:
+            timestamp = when.isoformat(timespec="milliseconds")
+            self._prefix = (
+                f'{{"timestamp":"{timestamp}",'
+                f'"level":"{level}",'
+                f'"service":{self._service_json},'
+            )
+            self._prefix_key = key
+        return self._prefix
+
+    def encode(self, record: dict) -> str:
+        """Encode a Loguru record as a single JSON line (with trailing newline)."""
+        extra = record["extra"]
+        body: dict[str, Any] = {"message": record["message"]}
+        if RESERVED_FIELDS.isdisjoint(extra):
+            body.update(extra)
+        else:
+            for key, value in extra.items():
+                body[f"extra.{key}" if key in RESERVED_FIELDS else key] = value
+
+        exception = record["exception"]
+        if exception is not None and exception.type is not None:
+            body["exception"] = "".join(
+                traceback.format_exception(
+                    exception.type, exception.value, exception.traceback
+                )
+            )
+
+        # _dumps(body) starts with "{" — splice it after the cached prefix.
+        return self._prefix_for(record) + _dumps(body)[1:] + "\n"
+
+    def write(self, message) -> None:
+        self.stream.write(self.encode(message.record))
+        if self._flush is not None:
+            self._flush()
+
+    __call__ = write
+
+    def stop(self) -> None:
+        # Like Loguru's own stream sinks: stop the stream only if it can be.
+        stop = getattr(self.stream, "stop", None)
+        if stop is not None:
+            stop()
@@ -0,0 +1,99 @@
+# log_redaction.py
+#
+# Scrub PII from log records before any sink sees them.
+#
+# The Collector's transform processor (otel-collector-config.yaml) only
+# scrubs the `user.query` span attribute. Log lines go to stdout, or to the
+# logs pipeline, without passing through it, so a logged question
+# (ask_question) would reach the log store unredacted.
+#
+# PiiRedactor is a Loguru patcher that rewrites the message and string
+# extras in place:
+#   • one combined, precompiled regex (named alternation) scans each string
+#     once for email, SSN, card number and phone; chaining one re.sub per
+#     pattern would scan it four times
+#   • a fast path skips strings containing neither a digit nor '@', which
+#     covers most log lines, with a single C-level search
+#   • card matches must pass a Luhn check, so order IDs and timestamps
+#     stay readable
+#
+# Replacement tokens match the Collector's: [EMAIL_REDACTED], [SSN_REDACTED]...
+import re
+
+# Order matters: SSN before phone, card before phone.
+_PII_RE = re.compile(
+    r"(?P<EMAIL>[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,})"
+    r"|(?P<SSN>\b\d{3}-\d{2}-\d{4}\b)"
+    r"|(?P<CARD>\b(?:\d[ -]?){12,18}\d\b)"
+    r"|(?P<PHONE>(?<![\w+])(?:\+\d{1,3}[ .-]?)?(?:\(\d{3}\)|\d{3})[ .-]?\d{3}[ .-]?\d{4}\b)"
+)
+_CANDIDATE = re.compile(r"[\d@]").search
+
+# Correlation fields are hex and always contain digits — never PII.
+_SKIP_KEYS = frozenset(("trace_id", "span_id", "span_name"))
+
+
+def _luhn_ok(digits: str) -> bool:
+    total = 0
+    for position, char in enumerate(reversed(digits)):
+        value = ord(char) - 48
+        if position % 2:
+            value *= 2
+            if value > 9:
+                value -= 9
+        total += value
+    return total % 10 == 0
+
+
+def _replace(match: re.Match) -> str:
+    kind = match.lastgroup
+    if kind == "CARD":
+        digits = match.group().replace(" ", "").replace("-", "")
+        if not _luhn_ok(digits):
+            return match.group()
+    return f"[{kind}_REDACTED]"
+
+
+def redact(text: str) -> str:
+    """Return `text` with emails, SSNs, card numbers and phones replaced."""
+    if _CANDIDATE(text) is None:
+        return text
+    return _PII_RE.sub(_replace, text)
+
+
+class PiiRedactor:
+    """Loguru patcher that redacts the message and string extras.
+
+    Chain it after otel_patcher (Loguru keeps a single configured patcher)
+    so the correlation IDs are already in `extra` and are skipped.
+    """
+
+    def __init__(self, patcher=None):
+        self.patcher = patcher
+        self.scanned = 0
+        self.redacted = 0
+
+    def __call__(self, record: dict) -> None:
+        if self.patcher is not None:
+            self.patcher(record)
+
+        message = record["message"]
+        if _CANDIDATE(message) is not None:
+            self.scanned += 1
+            clean = _PII_RE.sub(_replace, message)
+            if clean != message:
+                record["message"] = clean
+                self.redacted += 1
+
+        extra = record["extra"]
+        for key, value in extra.items():
+            if (
+                type(value) is str
+                and key not in _SKIP_KEYS
+                and _CANDIDATE(value) is not None
+            ):
+                self.scanned += 1
+                clean = _PII_RE.sub(_replace, value)
+                if clean != value:
+                    extra[key] = clean
+                    self.redacted += 1
@@ -0,0 +1,158 @@
+# log_suppression.py
+#
+# Log storm suppression: a Loguru filter that keeps log volume bounded when
+# a dependency goes down (pg-primary → "Order insert failed" for a third of
+# all requests, mirrored by "Order service returned error" at the gateway).
+#
+# Two mechanisms:
+#   • Token bucket — each callsite (module, function, line) may emit `rate`
+#     records/s per level, bursting to `burst`, whatever the message. A
+#     DEBUG flood can't use up the budget of the same callsite's ERRORs.
+#     Under normal traffic nothing is suppressed.
+#   • Duplicate collapsing — once a callsite is over budget, records with
+#     the same level and message within `window` seconds are counted
+#     instead of written. The first occurrence in every window always
+#     passes with its trace_id.
+#
+# Suppressed records are reported as ONE summary record per message and
+# window, carrying `suppressed_count`, `first_trace_id` and `callsite`.
+import threading
+import time
+from typing import Callable
+
+from loguru import logger
+
+# (module, function, line)
+Callsite = tuple[str, str, int]
+
+
+class _Window:
+    __slots__ = ("start", "first_trace_id", "suppressed")
+
+    def __init__(self, start: float, first_trace_id: str | None):
+        self.start = start
+        self.first_trace_id = first_trace_id
+        self.suppressed = 0
+
+
+class LogStormFilter:
+    """Loguru `filter=` callable with per-callsite rate limiting."""
+
+    def __init__(
+        self,
+        rate: float = 10.0,
+        burst: int = 20,
+        window: float = 10.0,
+        max_tracked: int = 10_000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.window = window
+        self.max_tracked = max_tracked
+        self.clock = clock
+
+        self._lock = threading.Lock()
+        # (callsite, level name) → [tokens, last refill]
+        self._buckets: dict[tuple[Callsite, str], list[float]] = {}
+        # (callsite, level name, message) → duplicate window
+        self._windows: dict[tuple, _Window] = {}
+        self._pending: list[tuple[tuple, _Window]] = []  # closed, not yet reported
+        self._reporter: threading.Thread | None = None
+        self._stopped = threading.Event()
+
+        self.suppressed_total = 0
+
+    # ──────────────────────────────────────────────
+    # Filter
+    # ──────────────────────────────────────────────
+    def __call__(self, record) -> bool:
+        extra = record["extra"]
+        if "suppressed_count" in extra or "tail_summary" in extra:
+            return True  # summary records from this filter or log_tail_buffer
+
+        callsite = (record["name"], record["function"], record["line"])
+        level = record["level"].name
+        key = (callsite, level, record["message"])
+        now = self.clock()
+
+        with self._lock:
+            has_token = self._take_token((callsite, level), now)
+            window = self._windows.get(key)
+
+            if window is None or now - window.start >= self.window:
+                # First occurrence in a new window — always let it through.
+                if window is not None and window.suppressed:
+                    self._pending.append((key, window))
+                if window is not None or len(self._windows) < self.max_tracked:
+                    self._windows[key] = _Window(now, extra.get("trace_id"))
+                elif not has_token:
+                    self.suppressed_total += 1
+                    return False  # too many distinct messages to track
+                return True
+
+            if has_token:
+                return True
+            window.suppressed += 1
+            self.suppressed_total += 1
+            return False
+
+    def _take_token(self, bucket_key: tuple[Callsite, str], now: float) -> bool:
+        bucket = self._buckets.get(bucket_key)
+        if bucket is None:
+            self._buckets[bucket_key] = [self.burst - 1.0, now]
+            return True
+        tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if tokens >= 1.0:
+            bucket[0] = tokens - 1.0
+            return True
+        bucket[0] = tokens
+        return False
+
+    # ──────────────────────────────────────────────
+    # Summaries
+    # ──────────────────────────────────────────────
+    def flush(self, force: bool = False) -> int:
+        """Emit summary records for closed windows; returns how many.
+
+        With force=True, open windows are closed and reported as well
+        (used at shutdown).
+        """
+        now = self.clock()
+        with self._lock:
+            closed, self._pending = self._pending, []
+            for key, window in list(self._windows.items()):
+                if force or now - window.start >= self.window:
+                    del self._windows[key]
+                    if window.suppressed:
+                        closed.append((key, window))
+
+        for ((module, function, line), level, message), window in closed:
+            logger.bind(
+                suppressed_count=window.suppressed,
+                first_trace_id=window.first_trace_id,
+                callsite=f"{module}:{function}:{line}",
+                window_s=self.window,
+            ).log(level, message)
+        return len(closed)
+
+    def start(self) -> None:
+        """Report summaries from a daemon thread every `window` seconds."""
+        if self._reporter is not None:
+            return
+        self._reporter = threading.Thread(
+            target=self._report_loop, name="log-storm-reporter", daemon=True
+        )
+        self._reporter.start()
+
+    def _report_loop(self) -> None:
+        while not self._stopped.wait(self.window):
+            self.flush()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._reporter is not None:
+            self._reporter.join()
+            self._reporter = None
+        self.flush(force=True)
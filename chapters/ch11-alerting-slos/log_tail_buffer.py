@@ -0,0 +1,224 @@
+# log_tail_buffer.py
+#
+# Tail-based log buffering — the log equivalent of the ch9 Collector's
+# `tail_sampling` processor.
+#
+# DEBUG/INFO records that carry a trace_id (injected by otel_patcher) are
+# held in a small per-trace buffer instead of being written:
+#   • an ERROR record of that trace is logged, or a span of it ends with
+#     StatusCode.ERROR → the buffer is written in full (before the ERROR
+#     record), and later records of the trace pass straight through
+#   • the trace's local root span ends without error → the buffer is
+#     dropped, or reduced to one "Trace completed" summary line
+#
+# WARNING+ records and records outside a trace are never held. Traces that
+# never close are evicted after `ttl` seconds or when `max_traces` is hit.
+# A completed trace leaves a tombstone for `tombstone_ttl` seconds, so a
+# late record (e.g. from a background task) follows the trace's outcome
+# instead of opening a new buffer.
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+
+from loguru import logger
+from opentelemetry.sdk.trace import ReadableSpan, SpanProcessor
+from opentelemetry.trace import StatusCode
+
+INVALID_TRACE_ID = "00000000000000000000000000000000"
+WARNING_LEVEL_NO = 30
+ERROR_LEVEL_NO = 40
+
+SUMMARY = "summary"
+DROP = "drop"
+
+
+class _TraceLogs:
+    __slots__ = ("created", "messages", "overflow", "errored")
+
+    def __init__(self, created: float):
+        self.created = created
+        self.messages: list = []
+        self.overflow = 0
+        self.errored = False
+
+
+class TailLogBuffer:
+    """Stream-like Loguru sink that holds DEBUG/INFO records per trace.
+
+    `downstream` is the next sink stage (anything with `write(message)`).
+    """
+
+    def __init__(
+        self,
+        downstream,
+        on_success: str = SUMMARY,
+        max_traces: int = 10_000,
+        max_records_per_trace: int = 200,
+        ttl: float = 60.0,
+        tombstone_ttl: float = 5.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if on_success not in (SUMMARY, DROP):
+            raise ValueError(f"on_success must be {SUMMARY!r} or {DROP!r}")
+        self.downstream = downstream
+        self.on_success = on_success
+        self.max_traces = max_traces
+        self.max_records_per_trace = max_records_per_trace
+        self.ttl = ttl
+        self.tombstone_ttl = tombstone_ttl
+        self.clock = clock
+
+        self._lock = threading.Lock()
+        self._traces: OrderedDict[str, _TraceLogs] = OrderedDict()
+        # Completed traces: trace_id → (completed at, errored)
+        self._completed: OrderedDict[str, tuple[float, bool]] = OrderedDict()
+
+        self.flushed = 0
+        self.discarded = 0
+        self.evicted_traces = 0
+
+    # ──────────────────────────────────────────────
+    # Sink side
+    # ──────────────────────────────────────────────
+    def write(self, message) -> None:
+        record = message.record
+        extra = record["extra"]
+        trace_id = extra.get("trace_id")
+
+        if not trace_id or trace_id == INVALID_TRACE_ID or "tail_summary" in extra:
+            self.downstream.write(message)
+            return
+        level_no = record["level"].no
+        if level_no >= WARNING_LEVEL_NO:
+            if level_no >= ERROR_LEVEL_NO:
+                self.flush_trace(trace_id)  # the context goes out before the error
+            self.downstream.write(message)
+            return
+
+        with self._lock:
+            entry = self._entry(trace_id)
+            if entry is None:
+                if not self._completed[trace_id][1]:
+                    self.discarded += 1  # late record of a successful trace
+                    return
+            elif not entry.errored:
+                if len(entry.messages) < self.max_records_per_trace:
+                    entry.messages.append(message)
+                else:
+                    entry.overflow += 1
+                return
+        self.downstream.write(message)
+
+    def _entry(self, trace_id: str) -> _TraceLogs | None:
+        """Get or create the buffer for a trace; None once it completed (lock held)."""
+        entry = self._traces.get(trace_id)
+        if entry is not None:
+            return entry
+
+        now = self.clock()
+        self._prune_completed(now)
+        if trace_id in self._completed:
+            return None
+        # Oldest first: drop traces that never closed, then enforce the cap.
+        while self._traces:
+            oldest = next(iter(self._traces.values()))
+            if now - oldest.created < self.ttl and len(self._traces) < self.max_traces:
+                break
+            self._traces.popitem(last=False)
+            self.evicted_traces += 1
+            self.discarded += len(oldest.messages) + oldest.overflow
+
+        entry = self._traces[trace_id] = _TraceLogs(now)
+        return entry
+
+    def _prune_completed(self, now: float) -> None:
+        """Drop expired tombstones, oldest first (lock held)."""
+        completed = self._completed
+        while completed:
+            completed_at, _ = next(iter(completed.values()))
+            if now - completed_at < self.tombstone_ttl and len(completed) <= self.max_traces:
+                break
+            completed.popitem(last=False)
+
+    def stop(self) -> None:
+        stop = getattr(self.downstream, "stop", None)
+        if stop is not None:
+            stop()
+
+    # ──────────────────────────────────────────────
+    # Span side (called by TailLogSpanProcessor)
+    # ──────────────────────────────────────────────
+    def flush_trace(self, trace_id: str) -> None:
+        """Write everything held for the trace; pass later records through."""
+        with self._lock:
+            entry = self._entry(trace_id)
+            if entry is None:
+                self._completed[trace_id] = (self._completed[trace_id][0], True)
+                return
+            entry.errored = True
+            messages, entry.messages = entry.messages, []
+            self.flushed += len(messages)
+        for message in messages:
+            self.downstream.write(message)
+
+    def complete_trace(self, trace_id: str, span_id: str, span_name: str) -> None:
+        """The trace's local root span ended — release its buffer."""
+        with self._lock:
+            entry = self._traces.pop(trace_id, None)
+            now = self.clock()
+            self._prune_completed(now)
+            self._completed[trace_id] = (now, entry is not None and entry.errored)
+            if entry is None or entry.errored:
+                return
+            held = len(entry.messages) + entry.overflow
+            self.discarded += held
+
+        if self.on_success == SUMMARY and held:
+            levels: dict[str, int] = {}
+            for message in entry.messages:
+                name = message.record["level"].name
+                levels[name] = levels.get(name, 0) + 1
+
+            def set_ids(record):
+                # on_end runs after the span is detached — restore its IDs.
+                record["extra"].update(
+                    trace_id=trace_id, span_id=span_id, span_name=span_name
+                )
+
+            logger.patch(set_ids).bind(
+                tail_summary=True,
+                buffered_records=held,
+                buffered_levels=levels,
+            ).info("Trace completed without errors")
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "open_traces": len(self._traces),
+                "completed_traces": len(self._completed),
+                "flushed": self.flushed,
+                "discarded": self.discarded,
+                "evicted_traces": self.evicted_traces,
+            }
+
+
+class TailLogSpanProcessor(SpanProcessor):
+    """Drive a TailLogBuffer from span status and local-root span ends."""
+
+    def __init__(self, buffer: TailLogBuffer):
+        self.buffer = buffer
+
+    def on_end(self, span: ReadableSpan) -> None:
+        ctx = span.context
+        trace_id = format(ctx.trace_id, "032x")
+        if span.status.status_code is StatusCode.ERROR:
+            self.buffer.flush_trace(trace_id)
+        if span.parent is None or span.parent.is_remote:
+            self.buffer.complete_trace(trace_id, format(ctx.span_id, "016x"), span.name)
+
+    def shutdown(self) -> None:
+        pass
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return True
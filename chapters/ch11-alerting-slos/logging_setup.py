@@ -1,38 +1,287 @@
-# logging_setup.py  (identical to Chapter 6, 7, 8, 9, 10 — no changes needed)
+# logging_setup.py
+#
+# Same log fields as Chapters 6–10, produced by a faster pipeline:
+#   • JsonLogEncoder (log_encoder.py) keeps bound kwargs, escapes messages
+#     correctly and caches the timestamp prefix.
+#   • otel_patcher (span_log_context.py) reads hex trace/span IDs that a
+#     span processor formatted once at span start.
+#
+# Opt-in stages (environment variables, see README):
+#   LOG_SINKS=stdout,otlp    also (or only) export to the Collector's logs
+#                            pipeline (otlp_log_sink.py)
+#   LOG_SINKS=file           rotating, compressed segment files
+#                            (file_sink.py); LOG_FILE_INDEX=1 also indexes
+#                            closed segments by trace_id (trace_index.py)
+#   LOG_ASYNC_SINK=1         stdout writes move off the event loop thread
+#                            (async_sink.py)
+#   LOG_STORM_SUPPRESSION=1  per-callsite rate limiting + duplicate
+#                            collapsing (log_suppression.py)
+#   LOG_TAIL_BUFFER=1        hold INFO per trace, write only failed traces
+#                            (log_tail_buffer.py)
+#   LOG_REDACT_PII=1         scrub emails, SSNs, card numbers and phones
+#                            from messages and extras (log_redaction.py)
+#   LOG_TRANSPORT=shm        hand records to a shipper process through a
+#                            shared-memory ring; it encodes and writes the
+#                            LOG_SINKS outputs (shm_transport.py)
+#
+# Span export: SPAN_EXPORT_QUEUE=priority replaces the SDK's BatchSpanProcessor
+# with one that sheds fast successful spans before error, debug and slow ones;
+# EXPORT_DISK_QUEUE_DIR spills span and metric batches to disk while the
+# Collector is unreachable and replays them later (span_export.py);
+# OTLP_CAPTURE_DIR writes them to local files for `otlp_capture.py replay`.
+# OTLP_EXPORT_MODE=loop|app moves span, metric and log export onto a single
+# asyncio loop with one pooled OTLP/HTTP client (async_export.py).
+# SAMPLING_RULES_FILE samples root spans per route and method, from a rules
+# file that is reloaded on change (route_sampler.py).
+#
+# Levels are runtime-adjustable per module (LOG_LEVEL sets the default) and a
+# request whose x-debug header carries LOG_DEBUG_TOKEN logs at DEBUG end to
+# end (debug_control.py).
+import atexit
+import os
 import sys
-from opentelemetry import trace
+from pathlib import Path
+from opentelemetry import metrics, trace
+from opentelemetry._logs import get_logger_provider
+from opentelemetry.metrics import CallbackOptions, Observation
+from opentelemetry.sdk._logs import LoggerProvider
 from loguru import logger
 
+from async_export import install_async_export
+from async_sink import DROP_OLDEST, BackgroundLogSink
+from debug_control import install_debug_propagation, level_control
+from file_sink import ZSTD, RotatingFileWriter
+from log_encoder import JsonLogEncoder
+from log_redaction import PiiRedactor
+from log_suppression import LogStormFilter
+from log_tail_buffer import SUMMARY, TailLogBuffer, TailLogSpanProcessor
+from otlp_log_sink import OtlpLogSink
+from route_sampler import install_route_sampler
+from shm_transport import DROP, ShmLogSink
+from span_export import install_span_export
+from span_log_context import install_span_processor, otel_patcher
+from trace_index import INDEX_FILENAME, TraceIndex
 
-def otel_patcher(record):
-    """Inject OTel context into every log record."""
-    span = trace.get_current_span()
-    if span.is_recording():
-        ctx = span.get_span_context()
-        record["extra"]["trace_id"] = format(ctx.trace_id, "032x")
-        record["extra"]["span_id"] = format(ctx.span_id, "016x")
-        record["extra"]["span_name"] = span.name
-    else:
-        record["extra"]["trace_id"] = "00000000000000000000000000000000"
-        record["extra"]["span_id"] = "0000000000000000"
-        record["extra"]["span_name"] = ""
 
+def _env_flag(name: str) -> bool:
+    return os.getenv(name, "").lower() in ("1", "true", "yes")
 
-def setup_logging(service_name: str):
-    """Configure Loguru for production with OTel correlation."""
-    logger.remove()
-    logger.configure(patcher=otel_patcher)
-
-    # JSON format for production
-    log_format = (
-        '{{"timestamp": "{time:YYYY-MM-DDTHH:mm:ss.SSSZ}", '
-        '"level": "{level.name}", '
-        '"service": "' + service_name + '", '
-        '"message": "{message}", '
-        '"trace_id": "{extra[trace_id]}", '
-        '"span_id": "{extra[span_id]}", '
-        '"span_name": "{extra[span_name]}"}}'
+
+def register_sink_metrics(sink: BackgroundLogSink) -> None:
+    """Export the background sink's counters through the OTel meter."""
+    meter = metrics.get_meter(__name__)
+
+    def observe(field: str):
+        def callback(_options: CallbackOptions):
+            yield Observation(sink.stats()[field])
+        return callback
+
+    for field in ("enqueued", "dropped", "flushed"):
+        meter.create_observable_counter(
+            name=f"logging.records.{field}",
+            callbacks=[observe(field)],
+            description=f"Log records {field} by the background sink",
+            unit="1",
+        )
+    meter.create_observable_gauge(
+        name="logging.queue.max_depth",
+        callbacks=[observe("max_depth")],
+        description="High-water mark of the background log queue",
+        unit="1",
+    )
+
+
+def register_file_metrics(writer: RotatingFileWriter) -> None:
+    """Export the rotating file writer's counters through the OTel meter."""
+    meter = metrics.get_meter(__name__)
+
+    def observe(field: str):
+        def callback(_options: CallbackOptions):
+            yield Observation(writer.stats()[field])
+        return callback
+
+    meter.create_observable_counter(
+        name="logging.file.bytes_written",
+        callbacks=[observe("bytes_written")],
+        description="Bytes written to log segment files",
+        unit="By",
+    )
+    meter.create_observable_gauge(
+        name="logging.file.compression_ratio",
+        callbacks=[observe("compression_ratio")],
+        description="Uncompressed / compressed size of closed log segments",
+        unit="1",
+    )
+    meter.create_observable_gauge(
+        name="logging.file.rotation_latency",
+        callbacks=[observe("max_rotation_ms")],
+        description="Worst segment rotation time seen by the writing thread",
+        unit="ms",
     )
 
-    logger.add(sys.stdout, format=log_format, level="INFO")
+
+def _segment_index() -> TraceIndex | None:
+    """With LOG_FILE_INDEX=1, the index that closed segments are added to."""
+    if not _env_flag("LOG_FILE_INDEX"):
+        return None
+    directory = Path(os.getenv("LOG_FILE_DIR", "logs"))
+    directory.mkdir(parents=True, exist_ok=True)
+    return TraceIndex(directory / INDEX_FILENAME)
+
+
+def _add_span_processor(processor) -> bool:
+    """Register a processor on the global SDK tracer provider, if there is one."""
+    provider = trace.get_tracer_provider()
+    if not hasattr(provider, "add_span_processor"):
+        return False
+    provider.add_span_processor(processor)
+    return True
+
+
+def _sdk_logger_provider() -> LoggerProvider | None:
+    """The LoggerProvider installed by `opentelemetry-instrument --logs_exporter`."""
+    provider = get_logger_provider()
+    return provider if isinstance(provider, LoggerProvider) else None
+
+
+class FanOutSink:
+    """Send every record to several output sinks."""
+
+    def __init__(self, outputs: list):
+        self.outputs = outputs
+
+    def write(self, message) -> None:
+        for output in self.outputs:
+            output.write(message)
+
+    def stop(self) -> None:
+        for output in self.outputs:
+            stop = getattr(output, "stop", None)
+            if stop is not None:
+                stop()
+
+
+def build_outputs(
+    service_name: str,
+    sinks: str,
+    async_sink: bool = False,
+    buffer_size: int | None = None,
+    overflow: str | None = None,
+) -> list:
+    """Create the output sinks named in `sinks` (comma-separated)."""
+    outputs = []
+    for name in sinks.split(","):
+        name = name.strip()
+        if name in ("stdout", "file"):
+            if name == "stdout":
+                stream = sys.stdout
+            else:
+                index = _segment_index()
+                stream = RotatingFileWriter(
+                    os.getenv("LOG_FILE_DIR", "logs"),
+                    prefix=service_name,
+                    segment_bytes=int(os.getenv("LOG_FILE_SEGMENT_MB", "64")) << 20,
+                    rotate_interval=float(os.getenv("LOG_FILE_ROTATE_SECONDS", "3600")),
+                    compression=os.getenv("LOG_FILE_COMPRESSION", ZSTD),
+                    on_segment_closed=index.index_file if index else None,
+                    on_segment_compressed=index.index_frames if index else None,
+                )
+                register_file_metrics(stream)
+            # JSON lines for production — one dump per record, extras included
+            output = JsonLogEncoder(service_name, stream=stream)
+            if async_sink:
+                output = BackgroundLogSink(
+                    output.encode,
+                    stream=stream,
+                    capacity=buffer_size or int(os.getenv("LOG_BUFFER_SIZE", "8192")),
+                    overflow=overflow or os.getenv("LOG_OVERFLOW_POLICY", DROP_OLDEST),
+                )
+                register_sink_metrics(output)
+        elif name == "otlp":
+            output = OtlpLogSink(service_name, logger_provider=_sdk_logger_provider())
+        else:
+            raise ValueError(f"unknown log sink {name!r}, expected stdout, file or otlp")
+        outputs.append(output)
+
+    return outputs
+
+
+def setup_logging(
+    service_name: str,
+    async_sink: bool | None = None,
+    buffer_size: int | None = None,
+    overflow: str | None = None,
+    suppress_storms: bool | None = None,
+    tail_buffer: bool | None = None,
+    sinks: str | None = None,
+    redact_pii: bool | None = None,
+    shm_transport: bool | None = None,
+    shm_mb: int | None = None,
+):
+    """Configure Loguru for production with OTel correlation.
+
+    `sinks` (or LOG_SINKS) is a comma-separated list of outputs: `stdout`
+    (JSON lines, the default), `file` (rotating compressed segments) and
+    `otlp` (Collector logs pipeline). With `shm_transport` (or
+    LOG_TRANSPORT=shm) those outputs live in a shipper process instead.
+    """
+    logger.remove()
+    install_span_processor()
+    install_span_export()
+    install_async_export()
+    install_route_sampler()
+    install_debug_propagation()
+
+    if redact_pii is None:
+        redact_pii = _env_flag("LOG_REDACT_PII")
+    # Patchers run once per record, before every sink and filter.
+    logger.configure(patcher=PiiRedactor(otel_patcher) if redact_pii else otel_patcher)
+
+    if async_sink is None:
+        async_sink = _env_flag("LOG_ASYNC_SINK")
+    if suppress_storms is None:
+        suppress_storms = _env_flag("LOG_STORM_SUPPRESSION")
+    if tail_buffer is None:
+        tail_buffer = _env_flag("LOG_TAIL_BUFFER")
+    if shm_transport is None:
+        shm_transport = os.getenv("LOG_TRANSPORT", "inline").lower() == "shm"
+
+    sinks = sinks or os.getenv("LOG_SINKS", "stdout")
+    if shm_transport:
+        # Encoding and I/O happen in a separate shipper process.
+        sink = ShmLogSink(
+            service_name,
+            sinks=sinks,
+            capacity=(shm_mb or int(os.getenv("LOG_SHM_MB", "16"))) << 20,
+            overflow=os.getenv("LOG_SHM_OVERFLOW", DROP),
+        )
+        register_sink_metrics(sink)
+    else:
+        outputs = build_outputs(service_name, sinks, async_sink, buffer_size, overflow)
+        sink = outputs[0] if len(outputs) == 1 else FanOutSink(outputs)
+
+    if tail_buffer:
+        sink = TailLogBuffer(
+            sink,
+            on_success=os.getenv("LOG_TAIL_ON_SUCCESS", SUMMARY),
+            max_traces=int(os.getenv("LOG_TAIL_MAX_TRACES", "10000")),
+            ttl=float(os.getenv("LOG_TAIL_TTL", "60")),
+        )
+        _add_span_processor(TailLogSpanProcessor(sink))
+
+    log_filter = level_control
+    if suppress_storms:
+        storm_filter = LogStormFilter(
+            rate=float(os.getenv("LOG_RATE_PER_CALLSITE", "10")),
+            burst=int(os.getenv("LOG_RATE_BURST", "20")),
+            window=float(os.getenv("LOG_DEDUP_WINDOW", "10")),
+        )
+        storm_filter.start()
+        # Runs before Loguru's own atexit handler, so summaries still get out.
+        atexit.register(storm_filter.stop)
+        log_filter = lambda record: level_control(record) and storm_filter(record)
+
+    # Added at LOG_LEVEL; level_control lowers it only while an override or a
+    # debug request needs lower records, and decides per module/request.
+    level_control.add_sink(sink, filter=log_filter)
     return logger
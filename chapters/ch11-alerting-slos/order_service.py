@@ -2,12 +2,23 @@
 #
 # Chapter 11: Alerting & Service Level Objectives (SLOs)
 #
-# Identical to Chapter 10. No application code changes — this chapter
-# focuses on configuring Grafana alerts and SLO-based burn rate alerting
-# on top of the metrics already emitted by these services.
+# The alerts and SLO burn rate rules are configuration on top of the metrics
+# Chapter 10 already emits. The code changes since Chapter 10 are
+# operational:
+#   • setup_logging() builds the faster logging pipeline and its opt-in
+#     stages (logging_setup.py).
+#   • GET/PUT /admin/log-levels changes log levels at runtime (with
+#     LOG_ADMIN_TOKEN set), and requests whose x-debug header carries
+#     LOG_DEBUG_TOKEN (forwarded by the gateway) log at DEBUG
+#     (see debug_control.py).
+#   • The lifespan hook lets OTLP_EXPORT_MODE=app export on this event loop
+#     (async_export.py).
+#   • ORDER_FAILURE_RATE overrides the 35% failure injection.
 import asyncio
+import os
 import random
 import time
+from contextlib import asynccontextmanager
 from typing import Any
 
 from fastapi import FastAPI
@@ -15,6 +26,8 @@ from fastapi.responses import JSONResponse
 from opentelemetry import metrics, trace
 from opentelemetry.trace import StatusCode
 
+from async_export import attach_to_running_loop
+from debug_control import admin_router, debug_middleware
 from logging_setup import setup_logging
 
 logger = setup_logging("order-service")
@@ -22,7 +35,8 @@ logger = setup_logging("order-service")
 # ──────────────────────────────────────────────
 # Configuration
 # ──────────────────────────────────────────────
-FAILURE_RATE: float = 0.35  # ~35 % of DB calls will fail
+# ~35 % of DB calls fail; ORDER_FAILURE_RATE=0 turns the injection off (benchmarks)
+FAILURE_RATE: float = float(os.getenv("ORDER_FAILURE_RATE", "0.35"))
 
 
 # ──────────────────────────────────────────────
@@ -176,7 +190,15 @@ async def call_external_api(
 # ──────────────────────────────────────────────
 # FastAPI app
 # ──────────────────────────────────────────────
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(application: FastAPI):
+    attach_to_running_loop()  # OTLP_EXPORT_MODE=app exports on this loop
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
+app.include_router(admin_router)
+app.middleware("http")(debug_middleware)
 
 
 # ──────────────────────────────────────────────
@@ -199,6 +221,7 @@ async def create_order(order: dict):
         inv_ms = (time.perf_counter() - inv_start) * 1000
         inventory_check_duration.record(inv_ms, {"item": item})
         logger.info("Inventory check complete", item=item, available=True)
+        logger.debug("Inventory check timing", item=item, duration_ms=round(inv_ms, 2))
 
     # ── DB insert — Pattern 2 ─────────────────────
     with tracer.start_as_current_span("insert_order_record") as span:
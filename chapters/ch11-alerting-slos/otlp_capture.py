@@ -0,0 +1,340 @@
+# otlp_capture.py
+#
+# Capture exported spans and metrics to local files, and replay them later.
+#
+# With OTLP_CAPTURE_DIR=<dir>, the span and metric exporters that
+# `opentelemetry-instrument` set up are replaced by ones that append each
+# batch, encoded as an OTLP request, to rotating files in <dir>. Nothing goes
+# over the network and nothing is retried, so export runs at encoding speed:
+#
+#   OTLP_CAPTURE_DIR=captures/order make run-order
+#
+# `replay` sends the captured requests to any OTLP endpoint, e.g. the ch9
+# Collector with its tail_sampling pipeline, with the original spacing, a
+# multiple of it, or at a fixed rate:
+#
+#   python otlp_capture.py replay captures/ --endpoint localhost:4317
+#   python otlp_capture.py replay captures/ --speed 10
+#   python otlp_capture.py replay captures/ --rate 500 --shift-timestamps
+#   python otlp_capture.py info captures/
+#
+# Record format: 4-byte length, 1-byte signal, 8-byte capture time (Unix ns),
+# 4-byte CRC32, payload. Files are <seq>.otlp; a torn record at the end of a
+# file (crash mid-write) ends that file on read. Replaying several
+# directories (one per service or worker) merges them by capture time.
+import argparse
+import heapq
+import struct
+import threading
+import time
+import zlib
+from pathlib import Path
+
+from opentelemetry.exporter.otlp.proto.common.metrics_encoder import encode_metrics
+from opentelemetry.exporter.otlp.proto.common.trace_encoder import encode_spans
+from opentelemetry.proto.collector.metrics.v1.metrics_service_pb2 import ExportMetricsServiceRequest
+from opentelemetry.proto.collector.trace.v1.trace_service_pb2 import ExportTraceServiceRequest
+from opentelemetry.sdk.metrics.export import MetricExporter, MetricExportResult
+from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+
+from disk_queue import METRICS, TRACES, build_sender
+
+_HEADER = struct.Struct(">IBQI")  # payload length, signal, capture time ns, crc32
+_SUFFIX = ".otlp"
+
+
+# ──────────────────────────────────────────────
+# Writing
+# ──────────────────────────────────────────────
+class CaptureWriter:
+    """Append encoded OTLP requests to rotating files in `directory`.
+
+    Writes are buffered; flush() makes them visible. Thread-safe: the span
+    and metric export threads share one writer.
+    """
+
+    def __init__(
+        self,
+        directory: str | Path,
+        rotate_bytes: int = 64 << 20,
+        max_files: int = 0,
+        buffer_bytes: int = 1 << 20,
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.rotate_bytes = rotate_bytes
+        self.max_files = max_files  # 0 = keep every file
+        self.buffer_bytes = buffer_bytes
+        self.records = 0
+        self.bytes = 0
+        self.deleted_files = 0
+        self._lock = threading.Lock()
+        self._users = 0
+        existing = capture_files(self.directory)
+        # A restart continues after the last file instead of overwriting it.
+        self._seq = int(existing[-1].stem) if existing else 0
+        self._file = None
+        self._file_size = 0
+        self._open_next()
+
+    def _open_next(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        self._seq += 1
+        self._file = open(self.directory / f"{self._seq:08d}{_SUFFIX}", "ab", buffering=self.buffer_bytes)
+        self._file_size = 0
+        if self.max_files:
+            files = capture_files(self.directory)
+            for path in files[: max(len(files) - self.max_files, 0)]:
+                path.unlink(missing_ok=True)
+                self.deleted_files += 1
+
+    def append(self, signal: int, payload: bytes, timestamp_ns: int | None = None) -> None:
+        header = _HEADER.pack(len(payload), signal, timestamp_ns or time.time_ns(), zlib.crc32(payload))
+        with self._lock:
+            if self._file is None:
+                raise ValueError("capture writer is closed")
+            if self._file_size and self._file_size + len(header) + len(payload) > self.rotate_bytes:
+                self._open_next()
+            self._file.write(header)
+            self._file.write(payload)
+            self._file_size += len(header) + len(payload)
+            self.records += 1
+            self.bytes += len(header) + len(payload)
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def retain(self) -> "CaptureWriter":
+        """Register one more exporter; the file closes when the last releases."""
+        with self._lock:
+            self._users += 1
+        return self
+
+    def release(self) -> None:
+        with self._lock:
+            self._users -= 1
+            last = self._users <= 0
+        if last:
+            self.close()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class FileSpanExporter(SpanExporter):
+    """SpanExporter that appends OTLP-encoded batches to a CaptureWriter."""
+
+    def __init__(self, writer: CaptureWriter):
+        self.writer = writer.retain()
+
+    def export(self, spans) -> SpanExportResult:
+        self.writer.append(TRACES, encode_spans(spans).SerializeToString())
+        return SpanExportResult.SUCCESS
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        self.writer.flush()
+        return True
+
+    def shutdown(self) -> None:
+        self.writer.release()
+
+
+class FileMetricExporter(MetricExporter):
+    """MetricExporter that appends OTLP-encoded metrics to a CaptureWriter."""
+
+    def __init__(self, writer: CaptureWriter, preferred_temporality=None, preferred_aggregation=None):
+        super().__init__(preferred_temporality, preferred_aggregation)
+        self.writer = writer.retain()
+
+    def export(self, metrics_data, timeout_millis: float = 10_000, **kwargs) -> MetricExportResult:
+        self.writer.append(METRICS, encode_metrics(metrics_data).SerializeToString())
+        return MetricExportResult.SUCCESS
+
+    def force_flush(self, timeout_millis: float = 10_000) -> bool:
+        self.writer.flush()
+        return True
+
+    def shutdown(self, timeout_millis: float = 30_000, **kwargs) -> None:
+        self.writer.release()
+
+
+# ──────────────────────────────────────────────
+# Reading
+# ──────────────────────────────────────────────
+def capture_files(path: str | Path) -> list[Path]:
+    """The capture files under `path` (a file or a directory, recursively)."""
+    path = Path(path)
+    if path.is_file():
+        return [path]
+    return sorted(path.rglob(f"*{_SUFFIX}"), key=lambda p: (p.parent, p.name))
+
+
+def _read_file(path: Path):
+    with open(path, "rb") as f:
+        while header := f.read(_HEADER.size):
+            if len(header) < _HEADER.size:
+                return
+            length, signal, timestamp_ns, crc = _HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                return  # torn record: the writer died mid-append
+            yield timestamp_ns, signal, payload
+
+
+def _read_writer(files: list[Path]):
+    for path in files:
+        yield from _read_file(path)
+
+
+def read_capture(*paths: str | Path):
+    """Yield (capture time ns, signal, payload) from `paths` in capture order."""
+    by_directory: dict[Path, list[Path]] = {}
+    for path in paths:
+        for file in capture_files(path):
+            by_directory.setdefault(file.parent, []).append(file)
+    # Each directory is one writer, already in order; writers are merged.
+    streams = [_read_writer(files) for files in by_directory.values()]
+    return heapq.merge(*streams, key=lambda record: record[0])
+
+
+# ──────────────────────────────────────────────
+# Replay
+# ──────────────────────────────────────────────
+def shift_timestamps(signal: int, payload: bytes, delta_ns: int) -> bytes:
+    """Move every span, event and data point time in `payload` by `delta_ns`."""
+    if signal == TRACES:
+        request = ExportTraceServiceRequest.FromString(payload)
+        for resource_spans in request.resource_spans:
+            for scope_spans in resource_spans.scope_spans:
+                for span in scope_spans.spans:
+                    span.start_time_unix_nano += delta_ns
+                    span.end_time_unix_nano += delta_ns
+                    for event in span.events:
+                        event.time_unix_nano += delta_ns
+        return request.SerializeToString()
+
+    request = ExportMetricsServiceRequest.FromString(payload)
+    for resource_metrics in request.resource_metrics:
+        for scope_metrics in resource_metrics.scope_metrics:
+            for metric in scope_metrics.metrics:
+                data = getattr(metric, metric.WhichOneof("data"))
+                for point in data.data_points:
+                    if point.start_time_unix_nano:
+                        point.start_time_unix_nano += delta_ns
+                    point.time_unix_nano += delta_ns
+    return request.SerializeToString()
+
+
+def replay(
+    records,
+    sender,
+    speed: float = 1.0,
+    rate: float | None = None,
+    shift: bool = False,
+    clock=time.monotonic,
+    sleep=time.sleep,
+) -> dict:
+    """Send `records` from read_capture() through `sender`.
+
+    With `rate`, requests go out at that many per second. Otherwise the
+    captured spacing is kept, divided by `speed`; speed=0 sends as fast as
+    the endpoint takes them. With `shift`, timestamps are moved so the
+    first request looks like it was captured now.
+    """
+    stats = {"requests": 0, "traces": 0, "metrics": 0, "failed": 0, "bytes": 0, "max_lag": 0.0}
+    start = clock()
+    first_ns = None
+    delta_ns = 0
+    for index, (timestamp_ns, signal, payload) in enumerate(records):
+        if first_ns is None:
+            first_ns = timestamp_ns
+            delta_ns = time.time_ns() - first_ns
+        if rate:
+            due = start + index / rate
+        elif speed > 0:
+            due = start + (timestamp_ns - first_ns) / 1e9 / speed
+        else:
+            due = clock()
+        wait = due - clock()
+        if wait > 0:
+            sleep(wait)
+        else:
+            stats["max_lag"] = max(stats["max_lag"], -wait)
+
+        if shift:
+            payload = shift_timestamps(signal, payload, delta_ns)
+        if not sender.send(signal, payload):
+            stats["failed"] += 1
+        stats["requests"] += 1
+        stats["traces" if signal == TRACES else "metrics"] += 1
+        stats["bytes"] += len(payload)
+    stats["elapsed"] = clock() - start
+    return stats
+
+
+# ──────────────────────────────────────────────
+# CLI
+# ──────────────────────────────────────────────
+def _info(paths: list[str]) -> int:
+    counts = {TRACES: 0, METRICS: 0}
+    spans = size = 0
+    first = last = None
+    for timestamp_ns, signal, payload in read_capture(*paths):
+        counts[signal] += 1
+        size += len(payload)
+        first = first or timestamp_ns
+        last = timestamp_ns
+        if signal == TRACES:
+            request = ExportTraceServiceRequest.FromString(payload)
+            spans += sum(len(s.spans) for rs in request.resource_spans for s in rs.scope_spans)
+    if first is None:
+        print("no captured requests")
+        return 1
+    print(f"files:    {sum(len(capture_files(p)) for p in paths)}")
+    print(f"requests: {counts[TRACES]} traces ({spans} spans), {counts[METRICS]} metrics")
+    print(f"payload:  {size / (1 << 20):.1f} MB")
+    print(f"duration: {(last - first) / 1e9:.1f} s, {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(first / 1e9))}")
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Inspect and replay OTLP capture files")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    info = commands.add_parser("info", help="summarize captured requests")
+    info.add_argument("paths", nargs="+")
+
+    send = commands.add_parser("replay", help="send captured requests to an OTLP endpoint")
+    send.add_argument("paths", nargs="+", help="capture files or directories")
+    send.add_argument("--endpoint", help="default: OTEL_EXPORTER_OTLP_ENDPOINT or localhost:4317")
+    send.add_argument("--protocol", choices=("grpc", "http/protobuf"), help="default: OTEL_EXPORTER_OTLP_PROTOCOL or grpc")
+    timing = send.add_mutually_exclusive_group()
+    timing.add_argument("--speed", type=float, default=1.0, help="multiple of the captured pace; 0 = no waiting")
+    timing.add_argument("--rate", type=float, help="fixed requests per second")
+    send.add_argument("--shift-timestamps", action="store_true", help="make the data look current")
+    args = parser.parse_args(argv)
+
+    if args.command == "info":
+        return _info(args.paths)
+
+    sender = build_sender(args.protocol, args.endpoint)
+    try:
+        stats = replay(read_capture(*args.paths), sender, speed=args.speed, rate=args.rate, shift=args.shift_timestamps)
+    finally:
+        sender.close()
+    print(
+        f"sent {stats['requests']} requests ({stats['traces']} traces, {stats['metrics']} metrics, "
+        f"{stats['bytes'] / (1 << 20):.1f} MB) in {stats['elapsed']:.1f} s; "
+        f"failed {stats['failed']}, max lag {stats['max_lag'] * 1000:.0f} ms"
+    )
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,122 @@
+# otlp_log_sink.py
+#
+# Send Loguru records straight to the Collector's `logs` pipeline as OTel
+# LogRecords — no stdout scraping, no second JSON serialize/parse per line.
+#
+# The Makefiles pass `--logs_exporter otlp`, which only wires up the stdlib
+# `logging` module. OtlpLogSink bridges Loguru into the same LoggerProvider
+# (or its own, if none is installed) behind a BatchLogRecordProcessor.
+# Batch size, flush interval and queue limit come from the constructor or
+# the standard OTEL_BLRP_* environment variables:
+#   OTEL_BLRP_MAX_EXPORT_BATCH_SIZE  (default 512)
+#   OTEL_BLRP_SCHEDULE_DELAY         (default 1000 ms)
+#   OTEL_BLRP_MAX_QUEUE_SIZE         (default 2048)
+import traceback
+
+from opentelemetry._logs import LogRecord, SeverityNumber
+from opentelemetry.sdk._logs import LoggerProvider
+from opentelemetry.sdk._logs.export import BatchLogRecordProcessor, LogRecordExporter
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.trace import TraceFlags
+
+INVALID_TRACE_ID = "00000000000000000000000000000000"
+
+SEVERITY = {
+    "TRACE": SeverityNumber.TRACE,
+    "DEBUG": SeverityNumber.DEBUG,
+    "INFO": SeverityNumber.INFO,
+    "SUCCESS": SeverityNumber.INFO2,
+    "WARNING": SeverityNumber.WARN,
+    "ERROR": SeverityNumber.ERROR,
+    "CRITICAL": SeverityNumber.FATAL,
+}
+
+# Correlation fields become LogRecord fields, not attributes.
+_CORRELATION_KEYS = ("trace_id", "span_id", "span_name")
+
+
+def _attribute_value(value):
+    if isinstance(value, (str, bool, int, float)):
+        return value
+    return str(value)
+
+
+def to_log_record(record: dict) -> LogRecord:
+    """Convert a Loguru record into an OTel LogRecord."""
+    extra = record["extra"]
+    attributes = {
+        key: _attribute_value(value)
+        for key, value in extra.items()
+        if key not in _CORRELATION_KEYS
+    }
+    attributes["code.namespace"] = record["name"] or ""
+    attributes["code.function"] = record["function"]
+    attributes["code.lineno"] = record["line"]
+
+    exception = record["exception"]
+    if exception is not None and exception.type is not None:
+        attributes["exception.type"] = exception.type.__name__
+        attributes["exception.message"] = str(exception.value)
+        attributes["exception.stacktrace"] = "".join(
+            traceback.format_exception(
+                exception.type, exception.value, exception.traceback
+            )
+        )
+
+    trace_id = extra.get("trace_id", INVALID_TRACE_ID)
+    correlated = trace_id != INVALID_TRACE_ID
+    level = record["level"].name
+    return LogRecord(
+        timestamp=int(record["time"].timestamp() * 1e9),
+        trace_id=int(trace_id, 16) if correlated else 0,
+        span_id=int(extra["span_id"], 16) if correlated else 0,
+        trace_flags=TraceFlags(TraceFlags.SAMPLED if correlated else TraceFlags.DEFAULT),
+        severity_text=level,
+        severity_number=SEVERITY.get(level, SeverityNumber.UNSPECIFIED),
+        body=record["message"],
+        attributes=attributes,
+    )
+
+
+class OtlpLogSink:
+    """Stream-like Loguru sink that emits OTel LogRecords in batches."""
+
+    def __init__(
+        self,
+        service_name: str,
+        exporter: LogRecordExporter | None = None,
+        logger_provider: LoggerProvider | None = None,
+        max_export_batch_size: int | None = None,
+        schedule_delay_millis: float | None = None,
+        max_queue_size: int | None = None,
+    ):
+        self._owns_provider = logger_provider is None
+        if logger_provider is None:
+            if exporter is None:
+                from opentelemetry.exporter.otlp.proto.grpc._log_exporter import (
+                    OTLPLogExporter,
+                )
+
+                exporter = OTLPLogExporter()
+            logger_provider = LoggerProvider(
+                resource=Resource.create({"service.name": service_name})
+            )
+            logger_provider.add_log_record_processor(
+                BatchLogRecordProcessor(
+                    exporter,
+                    schedule_delay_millis=schedule_delay_millis,
+                    max_export_batch_size=max_export_batch_size,
+                    max_queue_size=max_queue_size,
+                )
+            )
+        self.logger_provider = logger_provider
+        self._otel_logger = logger_provider.get_logger("loguru")
+
+    def write(self, message) -> None:
+        self._otel_logger.emit(to_log_record(message.record))
+
+    def stop(self) -> None:
+        if self._owns_provider:
+            self.logger_provider.shutdown()
+        else:
+            self.logger_provider.force_flush()
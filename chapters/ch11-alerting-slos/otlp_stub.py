@@ -0,0 +1,200 @@
+# otlp_stub.py
+#
+# Local OTLP receivers for exercising exporters against outages.
+#
+# StubOTLPReceiver (gRPC) and StubOTLPHttpReceiver (HTTP/protobuf) accept
+# Export calls on 127.0.0.1 and keep the raw requests. pause() makes them
+# answer UNAVAILABLE / 503 — what an exporter sees while the Collector
+# restarts — until resume(). `latency` delays every answer, like an
+# overloaded Collector.
+#
+#   receiver = StubOTLPReceiver().start()
+#   os.environ["OTEL_EXPORTER_OTLP_ENDPOINT"] = receiver.endpoint
+#   receiver.pause(); ...; receiver.resume()
+#
+# Standalone, as a sink for benchmarks (counts requests, keeps nothing):
+#   python otlp_stub.py --http 4318
+import argparse
+import gzip
+import threading
+import time
+from concurrent import futures
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import grpc
+from opentelemetry.proto.collector.logs.v1.logs_service_pb2 import ExportLogsServiceRequest
+from opentelemetry.proto.collector.metrics.v1.metrics_service_pb2 import ExportMetricsServiceRequest
+from opentelemetry.proto.collector.trace.v1.trace_service_pb2 import ExportTraceServiceRequest
+
+
+class _Recorder:
+    """Raw requests per signal, plus pause state."""
+
+    def __init__(self, latency: float = 0.0, keep: bool = True):
+        self.latency = latency
+        self.keep = keep
+        self.requests: dict[str, list[bytes]] = {"traces": [], "metrics": [], "logs": []}
+        self.received = 0
+        self.rejected = 0
+        self._paused = threading.Event()
+        self._lock = threading.Lock()
+
+    def pause(self) -> None:
+        self._paused.set()
+
+    def resume(self) -> None:
+        self._paused.clear()
+
+    def _record(self, signal: str, request: bytes) -> bool:
+        """Store one request; False while paused."""
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            if self._paused.is_set():
+                self.rejected += 1
+                return False
+            self.received += 1
+            if self.keep:
+                self.requests[signal].append(request)
+        return True
+
+    def span_names(self) -> list[str]:
+        """Names of every span received, in arrival order."""
+        names = []
+        with self._lock:
+            requests = list(self.requests["traces"])
+        for raw in requests:
+            request = ExportTraceServiceRequest.FromString(raw)
+            for resource_spans in request.resource_spans:
+                for scope_spans in resource_spans.scope_spans:
+                    names.extend(span.name for span in scope_spans.spans)
+        return names
+
+    def metric_names(self) -> list[str]:
+        names = []
+        with self._lock:
+            requests = list(self.requests["metrics"])
+        for raw in requests:
+            request = ExportMetricsServiceRequest.FromString(raw)
+            for resource_metrics in request.resource_metrics:
+                for scope_metrics in resource_metrics.scope_metrics:
+                    names.extend(metric.name for metric in scope_metrics.metrics)
+        return names
+
+    def log_bodies(self) -> list[str]:
+        bodies = []
+        with self._lock:
+            requests = list(self.requests["logs"])
+        for raw in requests:
+            request = ExportLogsServiceRequest.FromString(raw)
+            for resource_logs in request.resource_logs:
+                for scope_logs in resource_logs.scope_logs:
+                    bodies.extend(record.body.string_value for record in scope_logs.log_records)
+        return bodies
+
+
+class StubOTLPReceiver(_Recorder):
+    """In-process OTLP/gRPC receiver that can be paused and resumed."""
+
+    def __init__(self, port: int = 0, latency: float = 0.0, keep: bool = True):
+        super().__init__(latency, keep)
+        self._server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+        handlers = {
+            "opentelemetry.proto.collector.trace.v1.TraceService": "traces",
+            "opentelemetry.proto.collector.metrics.v1.MetricsService": "metrics",
+            "opentelemetry.proto.collector.logs.v1.LogsService": "logs",
+        }
+        for service, signal in handlers.items():
+            # No (de)serializers: requests and responses stay raw bytes. An
+            # empty message is a valid Export*ServiceResponse.
+            handler = grpc.unary_unary_rpc_method_handler(self._receiver(signal))
+            self._server.add_generic_rpc_handlers(
+                (grpc.method_handlers_generic_handler(service, {"Export": handler}),)
+            )
+        self.port = self._server.add_insecure_port(f"127.0.0.1:{port}")
+
+    @property
+    def endpoint(self) -> str:
+        return f"localhost:{self.port}"
+
+    def _receiver(self, signal: str):
+        def export(request: bytes, context: grpc.ServicerContext) -> bytes:
+            if not self._record(signal, request):
+                context.abort(grpc.StatusCode.UNAVAILABLE, "receiver paused")
+            return b""
+        return export
+
+    def start(self) -> "StubOTLPReceiver":
+        self._server.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.stop(grace=None)
+
+
+class StubOTLPHttpReceiver(_Recorder):
+    """In-process OTLP/HTTP receiver that can be paused and resumed."""
+
+    def __init__(self, port: int = 0, latency: float = 0.0, keep: bool = True):
+        super().__init__(latency, keep)
+        recorder = self
+        signals = {"/v1/traces": "traces", "/v1/metrics": "metrics", "/v1/logs": "logs"}
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the Collector
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                signal = signals.get(self.path)
+                if signal is None:
+                    self.send_response(404)
+                elif self.headers.get("Content-Encoding") == "gzip":
+                    body = gzip.decompress(body)
+                if signal is not None:
+                    self.send_response(200 if recorder._record(signal, body) else 503)
+                self.send_header("Content-Type", "application/x-protobuf")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(name="StubOTLPHttpReceiver", target=self._server.serve_forever, daemon=True)
+
+    @property
+    def endpoint(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self) -> "StubOTLPHttpReceiver":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Local OTLP sink that accepts and discards requests")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--grpc", type=int, metavar="PORT")
+    group.add_argument("--http", type=int, metavar="PORT")
+    args = parser.parse_args(argv)
+    if args.http is not None:
+        receiver = StubOTLPHttpReceiver(args.http, keep=False).start()
+    else:
+        receiver = StubOTLPReceiver(args.grpc, keep=False).start()
+    print(f"listening on {receiver.endpoint}", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        receiver.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,181 @@
+# priority_export.py
+#
+# A span export queue that sheds the least useful spans first.
+#
+# When the Collector is slow or down, BatchSpanProcessor's queue fills and
+# every new span is dropped, whether it is a 2 ms healthy /health span or the
+# ERROR span create_order set up to explain a failed checkout.
+# PrioritySpanProcessor classifies each span when it ends:
+#
+#   error   status ERROR
+#   debug   debug.requested=true (x-debug requests, see debug_control.py)
+#   slow    duration ≥ slow_threshold_ms
+#   normal  everything else: fast, successful spans
+#
+# and keeps one FIFO per class. When the queue is full, the oldest span of
+# the lowest non-empty class is evicted to make room — unless the new span
+# ranks below everything queued, in which case the new span is dropped.
+# Exports send error spans first. Drops are counted per class
+# (otel.span_export.dropped{span.class}).
+import threading
+from collections import deque
+
+from loguru import logger
+from opentelemetry import metrics
+from opentelemetry.context import _SUPPRESS_INSTRUMENTATION_KEY, attach, detach, set_value
+from opentelemetry.metrics import CallbackOptions, Observation
+from opentelemetry.sdk.trace import ReadableSpan, SpanProcessor
+from opentelemetry.sdk.trace.export import SpanExporter
+from opentelemetry.trace import StatusCode
+
+from debug_control import DEBUG_ATTRIBUTE
+
+ERROR = "error"
+DEBUG = "debug"
+SLOW = "slow"
+NORMAL = "normal"
+# Lowest rank first: the eviction order.
+CLASSES = (NORMAL, SLOW, DEBUG, ERROR)
+
+
+class PrioritySpanProcessor(SpanProcessor):
+    """Batching span processor that evicts fast successful spans first."""
+
+    def __init__(
+        self,
+        span_exporter: SpanExporter,
+        max_queue_size: int = 2048,
+        max_export_batch_size: int = 512,
+        schedule_delay_millis: float = 5000,
+        slow_threshold_ms: float = 500,
+    ):
+        self.span_exporter = span_exporter
+        self.max_queue_size = max_queue_size
+        self.max_export_batch_size = max_export_batch_size
+        self.schedule_delay = schedule_delay_millis / 1000
+        self.slow_threshold_ns = int(slow_threshold_ms * 1e6)
+
+        self._queues: dict[str, deque[ReadableSpan]] = {name: deque() for name in CLASSES}
+        self._size = 0
+        self._lock = threading.Lock()
+        self._export_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._shutdown = False
+        self.dropped = dict.fromkeys(CLASSES, 0)
+        self.exported = dict.fromkeys(CLASSES, 0)
+
+        self._worker = threading.Thread(
+            name="OtelPrioritySpanProcessor", target=self._run, daemon=True
+        )
+        self._worker.start()
+
+    def classify(self, span: ReadableSpan) -> str:
+        if span.status.status_code is StatusCode.ERROR:
+            return ERROR
+        if span.attributes and span.attributes.get(DEBUG_ATTRIBUTE):
+            return DEBUG
+        if span.end_time - span.start_time >= self.slow_threshold_ns:
+            return SLOW
+        return NORMAL
+
+    # ──────────────────────────────────────────────
+    # SpanProcessor API
+    # ──────────────────────────────────────────────
+    def on_start(self, span, parent_context=None) -> None:
+        pass
+
+    def on_end(self, span: ReadableSpan) -> None:
+        if not span.context.trace_flags.sampled or self._shutdown:
+            return
+        span_class = self.classify(span)
+        with self._lock:
+            if self._size >= self.max_queue_size:
+                victim = next(name for name in CLASSES if self._queues[name])
+                if CLASSES.index(victim) > CLASSES.index(span_class):
+                    self.dropped[span_class] += 1
+                    return
+                self._queues[victim].popleft()
+                self.dropped[victim] += 1
+                self._size -= 1
+            self._queues[span_class].append(span)
+            self._size += 1
+            full_batch = self._size >= self.max_export_batch_size
+        if full_batch and not self._wake.is_set():
+            self._wake.set()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        if self._shutdown:
+            return False
+        self._export(everything=True)
+        return True
+
+    def shutdown(self) -> None:
+        if self._shutdown:
+            return
+        self._shutdown = True
+        self._wake.set()
+        self._worker.join()
+        self.span_exporter.shutdown()
+
+    def stats(self) -> dict:
+        with self._lock:
+            queued = {name: len(queue) for name, queue in self._queues.items()}
+        return {"queued": queued, "dropped": dict(self.dropped), "exported": dict(self.exported)}
+
+    # ──────────────────────────────────────────────
+    # Export thread
+    # ──────────────────────────────────────────────
+    def _run(self) -> None:
+        while not self._shutdown:
+            self._wake.wait(self.schedule_delay)
+            self._wake.clear()
+            self._export(everything=False)
+        self._export(everything=True)
+
+    def _take_batch(self) -> list[ReadableSpan]:
+        batch: list[ReadableSpan] = []
+        with self._lock:
+            for name in reversed(CLASSES):  # error spans leave first
+                queue = self._queues[name]
+                while queue and len(batch) < self.max_export_batch_size:
+                    batch.append(queue.popleft())
+                    self.exported[name] += 1
+            self._size -= len(batch)
+        return batch
+
+    def _export(self, everything: bool) -> None:
+        """Export one batch, or everything queued; full batches are always sent."""
+        with self._export_lock:
+            first = True
+            while first or everything or self._size >= self.max_export_batch_size:
+                first = False
+                batch = self._take_batch()
+                if not batch:
+                    return
+                token = attach(set_value(_SUPPRESS_INSTRUMENTATION_KEY, True))
+                try:
+                    self.span_exporter.export(batch)
+                except Exception:
+                    logger.exception("Exception while exporting spans")
+                finally:
+                    detach(token)
+
+
+def register_priority_metrics(processor: PrioritySpanProcessor) -> None:
+    """Export dropped / exported span counts per class through the OTel meter."""
+    meter = metrics.get_meter(__name__)
+
+    def observe(field: str):
+        def callback(_options: CallbackOptions):
+            counts = getattr(processor, field)
+            for name in CLASSES:
+                yield Observation(counts[name], {"span.class": name})
+        return callback
+
+    for field in ("dropped", "exported"):
+        meter.create_observable_counter(
+            name=f"otel.span_export.{field}",
+            callbacks=[observe(field)],
+            description=f"Spans {field} by the priority export queue, per class",
+            unit="1",
+        )
@@ -0,0 +1,184 @@
+# route_sampler.py
+#
+# Head sampling per route, from a rules file that is reloaded while running.
+#
+# ch9 samples in the Collector only, so every /health probe and every
+# /products/{id} lookup pays for span creation, attributes, encoding and
+# export even when the tail sampler drops it. With SAMPLING_RULES_FILE set,
+# the root span of each trace is sampled by the first matching rule:
+#
+#   {
+#     "default": 1.0,
+#     "rules": [
+#       {"name": "health", "route": "/health", "ratio": 0.0},
+#       {"name": "products", "method": "GET", "route": "/products/*", "ratio": 0.1}
+#     ]
+#   }
+#
+#   • `route` is an fnmatch pattern, matched against the server span's
+#     http.route (FastAPI's route template) or, without one, the URL path.
+#     `method` defaults to any. `name` defaults to "<method> <route>".
+#   • The decision comes from the trace ID, like TraceIdRatioBased, and
+#     child spans and downstream services follow it (ParentBased). So a
+#     trace is kept or dropped whole.
+#   • Trusted debug requests (x-debug: <LOG_DEBUG_TOKEN>) are always
+#     sampled: DebugSampler (debug_control.py) wraps this sampler.
+#   • The file is checked for changes every SAMPLING_RULES_CHECK_INTERVAL
+#     seconds (2) when spans are sampled. A file that fails to parse is
+#     logged and the previous rules stay in force.
+#   • otel.sampling.decisions counts sampled and dropped root spans per rule.
+import fnmatch
+import json
+import os
+import time
+from pathlib import Path
+
+from loguru import logger
+from opentelemetry import metrics, trace
+from opentelemetry.metrics import CallbackOptions, Observation
+from opentelemetry.sdk.trace.sampling import Decision, ParentBased, Sampler, SamplingResult, TraceIdRatioBased
+
+RULE_ATTRIBUTE = "sampling.rule"
+DEFAULT_RULE = "default"
+
+
+class SamplingRule:
+    __slots__ = ("name", "method", "route", "ratio", "bound")
+
+    def __init__(self, route: str = "*", ratio: float = 1.0, method: str = "*", name: str | None = None):
+        if not 0.0 <= ratio <= 1.0:
+            raise ValueError(f"sampling ratio must be between 0 and 1, got {ratio}")
+        self.method = method.upper()
+        self.route = route
+        self.ratio = ratio
+        self.bound = TraceIdRatioBased.get_bound_for_rate(ratio)
+        self.name = name or f"{self.method} {route}"
+
+    def matches(self, method: str, route: str) -> bool:
+        return (self.method == "*" or self.method == method) and fnmatch.fnmatchcase(route, self.route)
+
+
+def load_rules(path: str | Path) -> tuple[list[SamplingRule], SamplingRule]:
+    """Parse a rules file; return (rules in order, default rule)."""
+    with open(path) as f:
+        config = json.load(f)
+    rules = [
+        SamplingRule(
+            route=rule.get("route", "*"),
+            ratio=float(rule["ratio"]),
+            method=rule.get("method", "*"),
+            name=rule.get("name"),
+        )
+        for rule in config.get("rules", [])
+    ]
+    return rules, SamplingRule(ratio=float(config.get("default", 1.0)), name=DEFAULT_RULE)
+
+
+class RouteSampler(Sampler):
+    """Sample root spans by the first rule matching their route and method."""
+
+    def __init__(self, path: str | Path, check_interval: float = 2.0, clock=time.monotonic):
+        self.path = Path(path)
+        self.check_interval = check_interval
+        self._clock = clock
+        self._version = self._file_version()
+        self._rules, self._default = load_rules(self.path)
+        self._cache: dict[tuple[str, str], SamplingRule] = {}
+        self._next_check = clock() + check_interval
+        self.counts: dict[str, list[int]] = {}  # rule name → [sampled, dropped]
+        self.reloads = 0
+
+    def _file_version(self) -> tuple[int, int] | None:
+        try:
+            stat = self.path.stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _maybe_reload(self) -> None:
+        version = self._file_version()
+        if version is None or version == self._version:
+            return
+        self._version = version
+        try:
+            rules, default = load_rules(self.path)
+        except (OSError, ValueError, KeyError, TypeError) as exc:
+            logger.warning("Keeping previous sampling rules", path=str(self.path), error=str(exc))
+            return
+        # Swap both together; a concurrent should_sample sees old or new.
+        self._rules, self._default, self._cache = rules, default, {}
+        self.reloads += 1
+        logger.info("Sampling rules reloaded", path=str(self.path), rules=len(rules))
+
+    def rule_for(self, attributes) -> SamplingRule:
+        attributes = attributes or {}
+        method = str(attributes.get("http.request.method") or attributes.get("http.method") or "")
+        route = attributes.get("http.route")
+        if route is not None:
+            # Route templates are few; raw paths are not, so only they are cached.
+            rule = self._cache.get((method, route))
+            if rule is None:
+                rule = self._cache[(method, route)] = self._match(method, route)
+            return rule
+        path = attributes.get("url.path") or attributes.get("http.target") or ""
+        return self._match(method, str(path).split("?", 1)[0])
+
+    def _match(self, method: str, route: str) -> SamplingRule:
+        for rule in self._rules:
+            if rule.matches(method, route):
+                return rule
+        return self._default
+
+    def should_sample(
+        self, parent_context, trace_id, name, kind=None, attributes=None, links=None, trace_state=None
+    ) -> SamplingResult:
+        if self._clock() >= self._next_check:
+            self._next_check = self._clock() + self.check_interval
+            self._maybe_reload()
+        rule = self.rule_for(attributes)
+        sampled = trace_id & TraceIdRatioBased.TRACE_ID_LIMIT < rule.bound
+        counts = self.counts.get(rule.name)
+        if counts is None:
+            counts = self.counts[rule.name] = [0, 0]
+        counts[0 if sampled else 1] += 1
+        parent = trace.get_current_span(parent_context).get_span_context()
+        return SamplingResult(
+            Decision.RECORD_AND_SAMPLE if sampled else Decision.DROP,
+            {RULE_ATTRIBUTE: rule.name} if sampled else None,
+            parent.trace_state if parent.is_valid else None,
+        )
+
+    def get_description(self) -> str:
+        return f"RouteSampler{{{self.path}}}"
+
+
+def register_sampler_metrics(sampler: RouteSampler) -> None:
+    """Export sampled/dropped root span counts per rule through the OTel meter."""
+    meter = metrics.get_meter(__name__)
+
+    def observe(_options: CallbackOptions):
+        for rule, (sampled, dropped) in list(sampler.counts.items()):
+            yield Observation(sampled, {"rule": rule, "decision": "sampled"})
+            yield Observation(dropped, {"rule": rule, "decision": "dropped"})
+
+    meter.create_observable_counter(
+        name="otel.sampling.decisions",
+        callbacks=[observe],
+        description="Root spans sampled or dropped by each head sampling rule",
+        unit="1",
+    )
+
+
+def install_route_sampler(path: str | None = None) -> RouteSampler | None:
+    """With SAMPLING_RULES_FILE (or `path`), make the global provider sample
+    by route. Call before install_debug_propagation() so debug requests
+    still bypass it."""
+    path = path or os.getenv("SAMPLING_RULES_FILE")
+    provider = trace.get_tracer_provider()
+    if not path or not isinstance(getattr(provider, "sampler", None), Sampler):
+        return None
+    sampler = RouteSampler(path, check_interval=float(os.getenv("SAMPLING_RULES_CHECK_INTERVAL", "2")))
+    # Tracers created from here on (the ASGI server span's included) use it.
+    provider.sampler = ParentBased(root=sampler)
+    register_sampler_metrics(sampler)
+    return sampler
@@ -0,0 +1,67 @@
+# serve.py
+#
+# Run order-service or api-gateway with several worker processes.
+#
+# Usage (from the chapter directory):
+#   python serve.py order_service:app --service-name order-service --port 8001 --workers 4
+#
+# Each uvicorn worker is a fresh (spawned) interpreter that calls
+# worker_telemetry.create_app(): telemetry is set up in the worker, with
+# its own service.instance.id, before the service module is imported. The
+# supervisor never imports the app or builds providers, so there is nothing
+# for a worker to inherit.
+#
+# Exporters are configured with the usual environment variables
+# (OTEL_TRACES_EXPORTER, OTEL_EXPORTER_OTLP_ENDPOINT, ...). The Makefile's
+# run-order-workers / run-gateway-workers targets set the same ones the
+# single-process targets pass to opentelemetry-instrument. Don't wrap this
+# script in opentelemetry-instrument; if it is, the auto-instrumentation hook
+# is removed from PYTHONPATH so workers don't initialize twice.
+#
+# With gunicorn (not a dependency of this chapter), the equivalent is:
+#   SERVE_APP=order_service:app SERVE_SERVICE_NAME=order-service SERVE_PORT=8001 \
+#     gunicorn 'worker_telemetry:create_app()' -k uvicorn.workers.UvicornWorker -w 4 -b :8001
+# (without --preload).
+import argparse
+import os
+
+import uvicorn
+
+
+def _strip_auto_instrumentation() -> None:
+    python_path = os.getenv("PYTHONPATH")
+    if not python_path:
+        return
+    from opentelemetry.instrumentation import auto_instrumentation
+
+    hook_dir = os.path.dirname(os.path.abspath(auto_instrumentation.__file__))
+    os.environ["PYTHONPATH"] = os.pathsep.join(
+        entry for entry in python_path.split(os.pathsep) if os.path.abspath(entry) != hook_dir
+    )
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Multi-worker uvicorn with per-worker telemetry")
+    parser.add_argument("app", help="module:attribute, e.g. order_service:app")
+    parser.add_argument("--service-name", required=True)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "1")))
+    args = parser.parse_args(argv)
+
+    _strip_auto_instrumentation()
+    os.environ.update(
+        {"SERVE_APP": args.app, "SERVE_SERVICE_NAME": args.service_name, "SERVE_PORT": str(args.port)}
+    )
+    uvicorn.run(
+        "worker_telemetry:create_app",
+        factory=True,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        log_level="warning",
+    )
+
+
+if __name__ == "__main__":
+    main()
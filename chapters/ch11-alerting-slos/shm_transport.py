@@ -0,0 +1,420 @@
+# shm_transport.py
+#
+# Move log encoding and I/O out of the request-serving process.
+#
+# Even with BackgroundLogSink, JSON encoding and writes run on a thread of
+# the service process and compete with request handling for the GIL.
+# With LOG_TRANSPORT=shm:
+#
+#   • ShmLogSink (in the service) marshals each record's fields into a
+#     compact binary blob and copies it into a ring buffer in
+#     multiprocessing.shared_memory. No JSON, no syscalls.
+#   • A shipper process (`python -m shm_transport`, started by the sink)
+#     drains the ring, rebuilds the records and feeds them to the usual
+#     LOG_SINKS outputs (stdout JSON, rotating files, OTLP).
+#
+# The ring is single-producer / single-consumer: Loguru serializes calls to
+# a sink and there is one shipper per ring. Each side only writes its own
+# position counter, and the producer publishes its head only after the
+# record's bytes are in place. Each record is framed as length + CRC32 +
+# payload, and the shipper checks the frame before decoding: a torn or
+# garbage record (or one that fails to decode) is counted and skipped, so
+# it costs that record rather than the shipper.
+#
+# Backpressure when the ring is full (LOG_SHM_OVERFLOW):
+#   drop   count the record as dropped and return immediately (default)
+#   block  wait up to LOG_SHM_BLOCK_TIMEOUT seconds for the shipper, then drop
+# Dropped counts live in the shared header. The shipper reports them in a
+# WARNING log line, and logging_setup exports them as logging.records.dropped.
+import argparse
+import marshal
+import os
+import signal
+import struct
+import subprocess
+import sys
+import time
+import traceback
+import zlib
+from datetime import datetime, timedelta, timezone
+from multiprocessing import resource_tracker, shared_memory
+from pathlib import Path
+from types import SimpleNamespace
+
+from log_encoder import JsonLogEncoder
+
+DROP = "drop"
+BLOCK = "block"
+OVERFLOW_POLICIES = (DROP, BLOCK)
+
+# Shared header: one u64 per field, each written by a single side.
+_HEAD = 0          # producer: bytes written (monotonic)
+_TAIL = 8          # consumer: bytes consumed (monotonic)
+_DROPPED = 16      # producer: records dropped
+_READ = 24         # consumer: records consumed
+_CLOSED = 32       # producer: 1 once the sink is stopped
+HEADER_SIZE = 64
+
+_U64 = struct.Struct("<Q")
+_FRAME = struct.Struct("<II")  # payload length, crc32
+
+_BASIC_TYPES = (str, int, float, bool, type(None))
+
+
+def _pack(record: dict) -> bytes:
+    """Marshal the fields the outputs need (no JSON, no datetime formatting)."""
+    when = record["time"]
+    exception = record["exception"]
+    exc_text = None
+    if exception is not None and exception.type is not None:
+        exc_text = "".join(
+            traceback.format_exception(exception.type, exception.value, exception.traceback)
+        )
+    fields = (
+        when.timestamp(),
+        when.utcoffset().total_seconds(),
+        record["level"].name,
+        record["level"].no,
+        record["name"],
+        record["function"],
+        record["line"],
+        record["message"],
+        record["extra"],
+        exc_text,
+    )
+    try:
+        return marshal.dumps(fields)
+    except ValueError:  # an extra marshal can't handle (exception, datetime, ...)
+        extra = {
+            key: value if isinstance(value, _BASIC_TYPES) else str(value)
+            for key, value in record["extra"].items()
+        }
+        return marshal.dumps(fields[:8] + (extra, exc_text))
+
+
+_timezones: dict[float, timezone] = {}
+
+
+def unpack(payload: bytes) -> dict:
+    """Rebuild a Loguru-shaped record dict for JsonLogEncoder / OtlpLogSink."""
+    ts, offset, level, level_no, name, function, line, message, extra, exc_text = (
+        marshal.loads(payload)
+    )
+    tz = _timezones.get(offset)
+    if tz is None:
+        tz = _timezones[offset] = timezone(timedelta(seconds=offset))
+    if exc_text is not None:
+        extra["exception"] = exc_text
+    return {
+        "time": datetime.fromtimestamp(ts, tz),
+        "level": SimpleNamespace(name=level, no=level_no),
+        "name": name,
+        "function": function,
+        "line": line,
+        "message": message,
+        "extra": extra,
+        "exception": None,
+    }
+
+
+class _Ring:
+    """Byte ring over a SharedMemory block; positions wrap modulo capacity."""
+
+    def __init__(self, shm: shared_memory.SharedMemory):
+        self.shm = shm
+        self.buf = shm.buf
+        self.capacity = shm.size - HEADER_SIZE
+
+    def get(self, field: int) -> int:
+        return _U64.unpack_from(self.buf, field)[0]
+
+    def set(self, field: int, value: int) -> None:
+        _U64.pack_into(self.buf, field, value)
+
+    def put(self, position: int, data: bytes) -> None:
+        start = HEADER_SIZE + position % self.capacity
+        end = start + len(data)
+        if end <= HEADER_SIZE + self.capacity:
+            self.buf[start:end] = data
+        else:
+            first = HEADER_SIZE + self.capacity - start
+            self.buf[start:] = data[:first]
+            self.buf[HEADER_SIZE:HEADER_SIZE + len(data) - first] = data[first:]
+
+    def take(self, position: int, size: int) -> bytes:
+        start = HEADER_SIZE + position % self.capacity
+        first = min(size, HEADER_SIZE + self.capacity - start)
+        data = bytes(self.buf[start:start + first])
+        if first < size:
+            data += bytes(self.buf[HEADER_SIZE:HEADER_SIZE + size - first])
+        return data
+
+
+# ──────────────────────────────────────────────
+# Producer side (service process)
+# ──────────────────────────────────────────────
+class ShmLogSink:
+    """Loguru sink that hands records to a shipper process via shared memory."""
+
+    def __init__(
+        self,
+        service_name: str,
+        sinks: str = "stdout",
+        capacity: int = 16 << 20,
+        overflow: str = DROP,
+        block_timeout: float | None = None,
+        start_shipper: bool = True,
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(
+                f"unknown overflow policy {overflow!r}, expected one of {OVERFLOW_POLICIES}"
+            )
+        self.overflow = overflow
+        self.block_timeout = (
+            block_timeout
+            if block_timeout is not None
+            else float(os.getenv("LOG_SHM_BLOCK_TIMEOUT", "1.0"))
+        )
+        self._shm = shared_memory.SharedMemory(create=True, size=HEADER_SIZE + capacity)
+        self._shm.buf[:HEADER_SIZE] = bytes(HEADER_SIZE)
+        self._ring = _Ring(self._shm)
+        self._head = 0
+        self._written = 0
+        self._dropped = 0
+        self._max_used = 0  # high-water mark in bytes
+        self._max_depth = 0  # ... and in records, sampled when it moves
+        self._stopped = False
+
+        self.shipper = None
+        if start_shipper:
+            self.shipper = subprocess.Popen(
+                [
+                    sys.executable, "-m", "shm_transport",
+                    "--name", self._shm.name,
+                    "--service", service_name,
+                    "--sinks", sinks,
+                    "--parent", str(os.getpid()),
+                ],
+                cwd=Path(__file__).resolve().parent,
+            )
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def write(self, message) -> None:
+        if self._stopped:
+            self._dropped += 1
+            return
+        payload = _pack(message.record)
+        size = _FRAME.size + len(payload)
+        ring = self._ring
+        head = self._head
+        used = head - ring.get(_TAIL) + size
+        if used > ring.capacity and not self._wait_for_room(size):
+            self._dropped += 1
+            ring.set(_DROPPED, self._dropped)
+            return
+
+        ring.put(head, _FRAME.pack(len(payload), zlib.crc32(payload)) + payload)
+        self._head = head + size
+        ring.set(_HEAD, self._head)  # publish only after the bytes are in place
+        self._written += 1
+        if used > self._max_used:
+            self._max_used = used
+            self._max_depth = max(self._max_depth, self._written - ring.get(_READ))
+
+    def _wait_for_room(self, size: int) -> bool:
+        ring = self._ring
+        if self.overflow == DROP or size > ring.capacity:
+            return False
+        deadline = time.monotonic() + self.block_timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.0005)
+            if self._head - ring.get(_TAIL) + size <= ring.capacity:
+                return True
+        return False
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Let the shipper drain the ring, then release the shared memory."""
+        if self._stopped:
+            return
+        self._stopped = True
+        self._ring.set(_CLOSED, 1)
+        if self.shipper is not None:
+            try:
+                self.shipper.wait(timeout)
+            except subprocess.TimeoutExpired:
+                self.shipper.kill()
+                sys.stderr.write("shm_transport: shipper did not drain in time\n")
+        self._ring.buf = None
+        self._shm.close()
+        self._shm.unlink()
+
+    def stats(self) -> dict[str, int]:
+        if self._stopped:
+            return {
+                "enqueued": self._written, "dropped": self._dropped,
+                "flushed": self._written, "max_depth": self._max_depth, "depth": 0,
+            }
+        read = self._ring.get(_READ)
+        return {
+            "enqueued": self._written,
+            "dropped": self._dropped,
+            "flushed": read,
+            "max_depth": self._max_depth,
+            "depth": self._written - read,
+        }
+
+
+# ──────────────────────────────────────────────
+# Consumer side (shipper process)
+# ──────────────────────────────────────────────
+def _attach(name: str) -> shared_memory.SharedMemory:
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        # The service owns the block; don't let our tracker unlink it at exit.
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class Shipper:
+    """Drain a ring and feed the records to the output sinks."""
+
+    def __init__(self, ring: _Ring, outputs: list, service_name: str):
+        self.ring = ring
+        self.outputs = outputs
+        self.service_name = service_name
+        self._tail = ring.get(_TAIL)
+        self._read = ring.get(_READ)
+        self._reported_drops = 0
+        self.corrupt = 0  # records skipped: bad frame, bad checksum or undecodable
+        self._reported_corrupt = 0
+
+    def drain(self, max_records: int = 4096) -> int:
+        """Copy out up to `max_records`, free their space, then ship them."""
+        ring = self.ring
+        head = ring.get(_HEAD)
+        start = self._tail
+        payloads = []
+        consumed = 0
+        while self._tail < head and consumed < max_records:
+            size, crc = _FRAME.unpack(ring.take(self._tail, _FRAME.size))
+            end = self._tail + _FRAME.size + size
+            if end > head:
+                # A garbage length: nothing after it can be framed, so skip
+                # everything published so far.
+                self.corrupt += 1
+                self._tail = head
+                break
+            payload = ring.take(self._tail + _FRAME.size, size)
+            self._tail = end
+            consumed += 1
+            if zlib.crc32(payload) == crc:
+                payloads.append(payload)
+            else:
+                self.corrupt += 1
+        if self._tail == start:
+            return 0
+        ring.set(_TAIL, self._tail)
+        self._read += consumed
+        ring.set(_READ, self._read)
+
+        records = []
+        for payload in payloads:
+            try:
+                records.append(unpack(payload))
+            except (EOFError, ValueError, TypeError):
+                self.corrupt += 1
+        self.ship(records)
+        return consumed or 1  # a skipped garbage frame still counts as progress
+
+    def ship(self, records: list[dict]) -> None:
+        for output in self.outputs:
+            if isinstance(output, JsonLogEncoder):
+                # One write + flush per batch instead of per record
+                output.stream.write("".join(map(output.encode, records)))
+                flush = getattr(output.stream, "flush", None)
+                if flush is not None:
+                    flush()
+            else:
+                for record in records:
+                    output.write(SimpleNamespace(record=record))
+
+    def report_drops(self) -> None:
+        dropped = self.ring.get(_DROPPED)
+        if dropped != self._reported_drops:
+            self._warn(
+                "Log records dropped by shared-memory transport",
+                dropped=dropped - self._reported_drops,
+                dropped_total=dropped,
+            )
+            self._reported_drops = dropped
+        if self.corrupt != self._reported_corrupt:
+            self._warn(
+                "Corrupt log records skipped by shared-memory transport",
+                corrupt=self.corrupt - self._reported_corrupt,
+                corrupt_total=self.corrupt,
+            )
+            self._reported_corrupt = self.corrupt
+
+    def _warn(self, message: str, **extra) -> None:
+        now = datetime.now(timezone.utc).astimezone()
+        self.ship([{
+            "time": now,
+            "level": SimpleNamespace(name="WARNING", no=30),
+            "name": "shm_transport",
+            "function": "report_drops",
+            "line": 0,
+            "message": message,
+            "extra": {**extra, "trace_id": "0" * 32, "span_id": "0" * 16, "span_name": ""},
+            "exception": None,
+        }])
+
+    def run(self, parent_pid: int, poll_interval: float = 0.002, report_every: float = 10.0) -> None:
+        next_report = time.monotonic() + report_every
+        while True:
+            shipped = self.drain()
+            if time.monotonic() >= next_report:
+                self.report_drops()
+                next_report = time.monotonic() + report_every
+            if shipped:
+                continue
+            if self.ring.get(_CLOSED) or os.getppid() != parent_pid:
+                while self.drain():
+                    pass
+                self.report_drops()
+                return
+            time.sleep(poll_interval)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Shared-memory log shipper")
+    parser.add_argument("--name", required=True, help="shared memory block name")
+    parser.add_argument("--service", required=True)
+    parser.add_argument("--sinks", default="stdout")
+    parser.add_argument("--parent", type=int, default=os.getppid())
+    args = parser.parse_args(argv)
+
+    from logging_setup import build_outputs  # import here: logging_setup imports us
+
+    # Ctrl-C reaches the whole process group; keep draining until the
+    # service closes the ring (or exits).
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    shm = _attach(args.name)
+    outputs = build_outputs(args.service, args.sinks)
+    try:
+        Shipper(_Ring(shm), outputs, args.service).run(args.parent)
+    finally:
+        for output in outputs:
+            stop = getattr(output, "stop", None)
+            if stop is not None:
+                stop()
+        shm.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
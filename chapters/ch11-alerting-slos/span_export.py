@@ -0,0 +1,174 @@
+# span_export.py
+#
+# Choose the queues between the SDK and the OTLP exporters.
+#
+# `opentelemetry-instrument --traces_exporter otlp` wires a BatchSpanProcessor
+# around an OTLPSpanExporter configured from the environment. SPAN_EXPORT_QUEUE
+# swaps that processor for one of ours, keeping the exporter configuration:
+#
+#   SPAN_EXPORT_QUEUE=batch     the SDK default (no change)
+#   SPAN_EXPORT_QUEUE=priority  evict fast successful spans first when the
+#                               queue is full (priority_export.py)
+#
+# The stock processor is removed and shut down before any span is exported,
+# and the new one gets a fresh exporter of the same class, which reads the
+# same OTEL_EXPORTER_OTLP_* settings.
+#
+# EXPORT_DISK_QUEUE_DIR=<dir> puts a disk-backed write-ahead queue
+# (disk_queue.py) in front of the Collector for spans and metrics: batches
+# the endpoint can't take right now are spilled to <dir> and replayed in
+# order when it recovers. It works with either SPAN_EXPORT_QUEUE.
+#
+# OTLP_CAPTURE_DIR=<dir> writes span and metric batches to rotating local
+# files instead (otlp_capture.py), for replaying later with
+# `python otlp_capture.py replay`. It can't be combined with the disk queue.
+import os
+
+from opentelemetry import metrics, trace
+from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+from disk_queue import (
+    DiskExportQueue,
+    DiskMetricExporter,
+    DiskSpanExporter,
+    build_sender,
+    register_disk_queue_metrics,
+)
+from otlp_capture import CaptureWriter, FileMetricExporter, FileSpanExporter
+from priority_export import PrioritySpanProcessor, register_priority_metrics
+
+BATCH = "batch"
+PRIORITY = "priority"
+
+
+def replace_batch_processors(factory, provider=None, make_exporter=None) -> list:
+    """Replace each BatchSpanProcessor on `provider` (default: the global one)
+    with factory(exporter).
+
+    The exporter is make_exporter(old_exporter), by default a new instance of
+    the old exporter's class. Returns the new processors. Without an SDK
+    provider (e.g. under tests) nothing is replaced.
+    """
+    make_exporter = make_exporter or (lambda old: type(old)())
+    provider = provider or trace.get_tracer_provider()
+    # The SDK has no public API for removing a processor.
+    active = getattr(provider, "_active_span_processor", None)
+    if active is None or not hasattr(active, "_span_processors"):
+        return []
+    replaced, created = [], []
+    with active._lock:
+        processors = list(active._span_processors)
+        for index, processor in enumerate(processors):
+            if isinstance(processor, BatchSpanProcessor):
+                exporter = make_exporter(processor.span_exporter)
+                processors[index] = factory(exporter)
+                replaced.append(processor)
+                created.append(processors[index])
+        active._span_processors = tuple(processors)
+    for processor in replaced:
+        processor.shutdown()
+    return created
+
+
+def metric_readers(meter_provider=None) -> list:
+    """The readers of `meter_provider` (default: the global one); [] without an SDK."""
+    meter_provider = meter_provider or metrics.get_meter_provider()
+    readers = getattr(meter_provider, "_metric_readers", None)
+    if readers is None:  # SDKs before 1.27 kept them in the configuration
+        readers = getattr(getattr(meter_provider, "_sdk_config", None), "metric_readers", ())
+    return list(readers)
+
+
+def replace_metric_exporters(make_exporter, meter_provider=None) -> int:
+    """Swap the exporter of each PeriodicExportingMetricReader for
+    make_exporter(old_exporter); return how many were swapped."""
+    swapped = 0
+    for reader in metric_readers(meter_provider):
+        if isinstance(reader, PeriodicExportingMetricReader):
+            # The reader already took temporality and aggregation from the
+            # old exporter; the new one only has to export.
+            old, reader._exporter = reader._exporter, make_exporter(reader._exporter)
+            old.shutdown()
+            swapped += 1
+    return swapped
+
+
+def _env_number(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def install_disk_queue(directory: str | None = None) -> DiskExportQueue | None:
+    """With EXPORT_DISK_QUEUE_DIR (or `directory`), route metric exports
+    through a DiskExportQueue and return it for the span exporters."""
+    directory = directory or os.getenv("EXPORT_DISK_QUEUE_DIR")
+    if not directory:
+        return None
+    queue = DiskExportQueue(
+        directory,
+        build_sender(),
+        max_bytes=int(_env_number("EXPORT_DISK_QUEUE_MB", 256) * (1 << 20)),
+        segment_bytes=int(_env_number("EXPORT_DISK_QUEUE_SEGMENT_MB", 8) * (1 << 20)),
+    )
+    replace_metric_exporters(
+        lambda old: DiskMetricExporter(queue, old._preferred_temporality, old._preferred_aggregation)
+    )
+    register_disk_queue_metrics(queue)
+    return queue
+
+
+def install_capture(directory: str | None = None) -> CaptureWriter | None:
+    """With OTLP_CAPTURE_DIR (or `directory`), write metric exports to
+    capture files and return the writer for the span exporters."""
+    directory = directory or os.getenv("OTLP_CAPTURE_DIR")
+    if not directory:
+        return None
+    writer = CaptureWriter(
+        directory,
+        rotate_bytes=int(_env_number("OTLP_CAPTURE_FILE_MB", 64) * (1 << 20)),
+        max_files=int(_env_number("OTLP_CAPTURE_MAX_FILES", 0)),
+    )
+    replace_metric_exporters(
+        lambda old: FileMetricExporter(writer, old._preferred_temporality, old._preferred_aggregation)
+    )
+    return writer
+
+
+def install_span_export(
+    mode: str | None = None, disk_dir: str | None = None, capture_dir: str | None = None
+) -> list:
+    """Apply SPAN_EXPORT_QUEUE (or `mode`), EXPORT_DISK_QUEUE_DIR (or
+    `disk_dir`) and OTLP_CAPTURE_DIR (or `capture_dir`) to the global providers."""
+    mode = (mode or os.getenv("SPAN_EXPORT_QUEUE", BATCH)).lower()
+    if mode not in (BATCH, PRIORITY):
+        raise ValueError(f"unknown SPAN_EXPORT_QUEUE {mode!r}")
+    capture_dir = capture_dir or os.getenv("OTLP_CAPTURE_DIR")
+    if capture_dir and (disk_dir or os.getenv("EXPORT_DISK_QUEUE_DIR")):
+        raise ValueError("OTLP_CAPTURE_DIR and EXPORT_DISK_QUEUE_DIR both replace the exporters; set one")
+    writer = install_capture(capture_dir)
+    queue = install_disk_queue(disk_dir)
+    if writer is not None:
+        make_exporter = lambda old: FileSpanExporter(writer)
+    elif queue is not None:
+        make_exporter = lambda old: DiskSpanExporter(queue)
+    else:
+        make_exporter = None
+    if mode == BATCH:
+        if make_exporter is None:
+            return []
+        # BatchSpanProcessor reads OTEL_BSP_* itself.
+        return replace_batch_processors(BatchSpanProcessor, make_exporter=make_exporter)
+
+    def factory(exporter):
+        processor = PrioritySpanProcessor(
+            exporter,
+            max_queue_size=int(_env_number("OTEL_BSP_MAX_QUEUE_SIZE", 2048)),
+            max_export_batch_size=int(_env_number("OTEL_BSP_MAX_EXPORT_BATCH_SIZE", 512)),
+            schedule_delay_millis=_env_number("OTEL_BSP_SCHEDULE_DELAY", 5000),
+            slow_threshold_ms=_env_number("SPAN_EXPORT_SLOW_MS", 500),
+        )
+        register_priority_metrics(processor)
+        return processor
+
+    return replace_batch_processors(factory, make_exporter=make_exporter)
@@ -0,0 +1,108 @@
+# span_log_context.py
+#
+# Precompute the hex trace/span IDs that otel_patcher() injects into log
+# records — once per span instead of once per log line.
+#
+# LogContextSpanProcessor formats the IDs in on_start() and sets them in a
+# ContextVar next to OTel's own current-span contextvar; on_end() restores
+# the parent's entry. Each entry links to its parent's, so a context holds
+# at most one entry per live ancestor, and it goes away with the context:
+# a span that is never ended can't pile up entries. The patcher checks the
+# entry against the current span, so spans started before the processor
+# was registered fall back to the slow path and the output is identical
+# either way.
+from contextvars import ContextVar
+
+from opentelemetry import trace
+from opentelemetry.sdk.trace import ReadableSpan, Span, SpanProcessor
+
+INVALID_TRACE_ID = "00000000000000000000000000000000"
+INVALID_SPAN_ID = "0000000000000000"
+
+
+class _LogIds:
+    __slots__ = ("span_id", "trace_id_hex", "span_id_hex", "parent")
+
+    def __init__(self, span_id: int, trace_id_hex: str, span_id_hex: str, parent: "_LogIds | None"):
+        self.span_id = span_id
+        self.trace_id_hex = trace_id_hex
+        self.span_id_hex = span_id_hex
+        self.parent = parent
+
+
+_log_ids: ContextVar[_LogIds | None] = ContextVar("span_log_ids", default=None)
+
+
+def _entry_for(entry: _LogIds | None, span_id: int) -> _LogIds | None:
+    while entry is not None and entry.span_id != span_id:
+        entry = entry.parent
+    return entry
+
+
+class LogContextSpanProcessor(SpanProcessor):
+    """Precompute the hex IDs of each span into the context for the Loguru patcher."""
+
+    def on_start(self, span: Span, parent_context=None) -> None:
+        ctx = span.get_span_context()
+        parent_id = trace.get_current_span(parent_context).get_span_context().span_id
+        _log_ids.set(_LogIds(
+            ctx.span_id,
+            format(ctx.trace_id, "032x"),
+            format(ctx.span_id, "016x"),
+            _entry_for(_log_ids.get(), parent_id),
+        ))
+
+    def on_end(self, span: ReadableSpan) -> None:
+        # The SDK hands on_end a ReadableSpan snapshot, not the live span
+        # object, hence the span_id comparison.
+        entry = _entry_for(_log_ids.get(), span.context.span_id)
+        if entry is not None:
+            _log_ids.set(entry.parent)  # also drops unended spans started under it
+
+    def shutdown(self) -> None:
+        pass
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return True
+
+
+def otel_patcher(record):
+    """Inject OTel context into every log record."""
+    span = trace.get_current_span()
+    extra = record["extra"]
+    entry = _log_ids.get()
+    if entry is not None:
+        entry = _entry_for(entry, span.get_span_context().span_id)
+    if entry is not None:
+        extra["trace_id"] = entry.trace_id_hex
+        extra["span_id"] = entry.span_id_hex
+        extra["span_name"] = span.name
+    elif span.is_recording():
+        ctx = span.get_span_context()
+        extra["trace_id"] = format(ctx.trace_id, "032x")
+        extra["span_id"] = format(ctx.span_id, "016x")
+        extra["span_name"] = span.name
+    else:
+        extra["trace_id"] = INVALID_TRACE_ID
+        extra["span_id"] = INVALID_SPAN_ID
+        extra["span_name"] = ""
+
+
+_installed = False
+
+
+def install_span_processor() -> bool:
+    """Register LogContextSpanProcessor on the global SDK tracer provider.
+
+    Returns False when there is no SDK provider yet (e.g. the service runs
+    without opentelemetry-instrument); the patcher then uses the slow path.
+    """
+    global _installed
+    if _installed:
+        return True
+    provider = trace.get_tracer_provider()
+    if not hasattr(provider, "add_span_processor"):
+        return False
+    provider.add_span_processor(LogContextSpanProcessor())
+    _installed = True
+    return True
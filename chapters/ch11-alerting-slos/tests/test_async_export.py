@@ -0,0 +1,96 @@
+import asyncio
+import math
+import threading
+import time
+
+from opentelemetry._logs import LogRecord
+from opentelemetry.sdk._logs import LoggerProvider
+from opentelemetry.sdk.metrics import MeterProvider
+from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+from opentelemetry.sdk.trace import TracerProvider
+
+from async_export import AsyncOtlpExport
+from otlp_stub import StubOTLPHttpReceiver
+
+
+def _providers(export: AsyncOtlpExport):
+    tracer_provider = TracerProvider()
+    tracer_provider.add_span_processor(export.span_processor())
+    reader = PeriodicExportingMetricReader(export.metric_exporter(), export_interval_millis=math.inf)
+    export.add_metric_reader(reader, 60_000)
+    meter_provider = MeterProvider(metric_readers=[reader])
+    logger_provider = LoggerProvider()
+    logger_provider.add_log_record_processor(export.log_processor())
+    return tracer_provider, meter_provider, logger_provider
+
+
+def test_all_signals_share_one_loop_thread():
+    receiver = StubOTLPHttpReceiver().start()
+    threads_before = {thread.name for thread in threading.enumerate()}
+    export = AsyncOtlpExport(receiver.endpoint, span_delay_millis=60_000, log_delay_millis=60_000).start()
+    tracer_provider, meter_provider, logger_provider = _providers(export)
+
+    with tracer_provider.get_tracer(__name__).start_as_current_span("checkout"):
+        meter_provider.get_meter(__name__).create_counter("gateway.requests.total").add(1)
+        logger_provider.get_logger(__name__).emit(LogRecord(body="Checkout complete"))
+
+    new_threads = {thread.name for thread in threading.enumerate()} - threads_before
+    assert new_threads == {"OtelTelemetryLoop"}
+
+    assert export.force_flush(5)
+    assert receiver.span_names() == ["checkout"]
+    assert receiver.metric_names() == ["gateway.requests.total"]
+    assert receiver.log_bodies() == ["Checkout complete"]
+
+    for provider in (tracer_provider, meter_provider, logger_provider):
+        provider.shutdown()
+    assert not any(thread.name == "OtelTelemetryLoop" for thread in threading.enumerate())
+    receiver.stop()
+
+
+def test_exports_that_miss_their_budget_are_dropped():
+    receiver = StubOTLPHttpReceiver(latency=1.0).start()
+    export = AsyncOtlpExport(
+        receiver.endpoint, export_budget=0.1, max_export_batch_size=1, span_delay_millis=60_000
+    ).start()
+    tracer_provider = TracerProvider()
+    tracer_provider.add_span_processor(export.span_processor())
+    tracer = tracer_provider.get_tracer(__name__)
+
+    start = time.perf_counter()
+    for i in range(3):
+        with tracer.start_as_current_span(f"span-{i}"):
+            pass
+    assert time.perf_counter() - start < 0.1  # the request path never waits
+    assert export.force_flush(5)
+
+    assert export.stats()["traces"]["failed"] == 3
+    assert export.stats()["traces"]["exported"] == 0
+    tracer_provider.shutdown()
+    receiver.stop()
+
+
+def test_app_mode_exports_on_the_running_loop():
+    receiver = StubOTLPHttpReceiver().start()
+    export = AsyncOtlpExport(receiver.endpoint, span_delay_millis=60_000)
+    tracer_provider = TracerProvider()
+    tracer_provider.add_span_processor(export.span_processor())
+    tracer = tracer_provider.get_tracer(__name__)
+    with tracer.start_as_current_span("before-startup"):
+        pass
+
+    async def app():
+        export.attach()
+        with tracer.start_as_current_span("in-request"):
+            pass
+        await export.flush_async()
+
+    asyncio.run(app())
+    assert not [thread for thread in threading.enumerate() if thread.name.startswith("Otel")]
+    assert receiver.span_names() == ["before-startup", "in-request"]
+
+    with tracer.start_as_current_span("after-loop-closed"):
+        pass
+    tracer_provider.shutdown()  # the app's loop is gone: flushed on a loop of its own
+    assert receiver.span_names()[-1] == "after-loop-closed"
+    receiver.stop()
@@ -0,0 +1,125 @@
+import io
+import json
+import threading
+
+from loguru import logger
+
+from async_sink import BLOCK, DROP_LOW_PRIORITY, DROP_OLDEST, BackgroundLogSink
+from log_encoder import JsonLogEncoder
+from logging_setup import otel_patcher
+
+
+class GatedStream(io.StringIO):
+    """A stream whose writes block until the test opens the gate."""
+
+    def __init__(self):
+        super().__init__()
+        self.gate = threading.Event()
+        self.entered = threading.Event()
+
+    def write(self, s):
+        self.entered.set()
+        self.gate.wait(5)
+        return super().write(s)
+
+
+def _sink(stream, **kwargs):
+    encoder = JsonLogEncoder("order-service", stream=stream)
+    sink = BackgroundLogSink(encoder.encode, stream=stream, **kwargs)
+    logger.remove()
+    logger.configure(patcher=otel_patcher)
+    logger.add(sink, format="{message}", level="DEBUG")
+    return sink
+
+
+def _messages(stream):
+    return [json.loads(line)["message"] for line in stream.getvalue().splitlines()]
+
+
+def test_records_are_written_in_order_and_drained_on_remove():
+    stream = io.StringIO()
+    sink = _sink(stream)
+
+    for i in range(100):
+        logger.info("event {}", i)
+    logger.remove()
+
+    assert _messages(stream) == [f"event {i}" for i in range(100)]
+    stats = sink.stats()
+    assert stats["enqueued"] == stats["flushed"] == 100
+    assert stats["dropped"] == 0
+    assert stats["max_depth"] >= 1
+
+
+def _stall_writer(stream):
+    # First record is taken by the writer, which then blocks in write().
+    logger.info("first")
+    assert stream.entered.wait(5)
+
+
+def test_drop_oldest_keeps_newest_records():
+    stream = GatedStream()
+    sink = _sink(stream, capacity=3, overflow=DROP_OLDEST)
+    _stall_writer(stream)
+
+    for i in range(5):
+        logger.info("queued {}", i)
+    stream.gate.set()
+    logger.remove()
+
+    assert _messages(stream) == ["first", "queued 2", "queued 3", "queued 4"]
+    assert sink.stats()["dropped"] == 2
+
+
+def test_drop_low_priority_sheds_info_before_errors():
+    stream = GatedStream()
+    sink = _sink(stream, capacity=3, overflow=DROP_LOW_PRIORITY)
+    _stall_writer(stream)
+
+    logger.error("error 1")
+    logger.info("info 1")
+    logger.error("error 2")
+    logger.error("error 3")  # evicts "info 1"
+    logger.debug("debug 1")  # buffer is all errors — incoming debug is dropped
+    stream.gate.set()
+    logger.remove()
+
+    assert _messages(stream) == ["first", "error 1", "error 2", "error 3"]
+    assert sink.stats()["dropped"] == 2
+
+
+def test_drop_low_priority_keeps_arrival_order_across_levels():
+    stream = GatedStream()
+    sink = _sink(stream, capacity=4, overflow=DROP_LOW_PRIORITY)
+    _stall_writer(stream)
+
+    for name in ("info 1", "warning 1", "info 2", "warning 2"):
+        logger.log(name.split()[0].upper(), name)
+    logger.error("error 1")  # evicts "info 1"
+    logger.error("error 2")  # evicts "info 2"
+    logger.error("error 3")  # only WARNING+ left: evicts the oldest, "warning 1"
+    stream.gate.set()
+    logger.remove()
+
+    assert _messages(stream) == ["first", "warning 2", "error 1", "error 2", "error 3"]
+    assert sink.stats()["dropped"] == 3
+
+
+def test_block_policy_never_drops():
+    stream = GatedStream()
+    sink = _sink(stream, capacity=2, overflow=BLOCK)
+    _stall_writer(stream)
+
+    producer = threading.Thread(
+        target=lambda: [logger.info("queued {}", i) for i in range(4)]
+    )
+    producer.start()
+    producer.join(0.2)
+    assert producer.is_alive()  # blocked on the full buffer
+
+    stream.gate.set()
+    producer.join(5)
+    logger.remove()
+
+    assert _messages(stream) == ["first"] + [f"queued {i}" for i in range(4)]
+    assert sink.stats()["dropped"] == 0
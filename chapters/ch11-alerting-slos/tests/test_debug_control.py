@@ -0,0 +1,141 @@
+import io
+import json
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from loguru import logger
+from opentelemetry import context
+from opentelemetry.sdk.trace.sampling import ALWAYS_OFF, Decision
+
+from debug_control import (
+    DebugHeaderPropagator,
+    DebugSampler,
+    LevelControl,
+    admin_router,
+    debug_middleware,
+    is_debug_request,
+    level_control,
+    set_debug_request,
+)
+from log_encoder import JsonLogEncoder
+from logging_setup import otel_patcher
+
+
+def _record(name: str, level: str) -> dict:
+    return {"name": name, "level": logger.level(level)}
+
+
+def test_module_overrides_cover_submodules_and_can_be_cleared():
+    control = LevelControl("INFO")
+    assert not control(_record("order_service", "DEBUG"))
+
+    control.set_level("order_service", "DEBUG")
+    control.set_level("opentelemetry", "ERROR")
+    assert control(_record("order_service", "DEBUG"))
+    assert not control(_record("opentelemetry.sdk.trace", "WARNING"))
+    assert not control(_record("api_gateway", "DEBUG"))
+
+    control.set_level("order_service", None)
+    assert not control(_record("order_service", "DEBUG"))
+
+
+def test_clearing_the_default_restores_the_starting_level():
+    control = LevelControl("WARNING")
+    control.set_level(None, "DEBUG")
+    assert control(_record("order_service", "INFO"))
+
+    control.set_level(None, None)
+    assert control.levels()["default"] == "WARNING"
+    assert not control(_record("order_service", "INFO"))
+
+
+def test_debug_flag_round_trips_only_with_the_shared_token(monkeypatch):
+    propagator = DebugHeaderPropagator()
+    carrier: dict[str, str] = {}
+    assert not is_debug_request(propagator.extract({"x-debug": "1"}))  # no token configured
+
+    monkeypatch.setenv("LOG_DEBUG_TOKEN", "s3cret")
+    propagator.inject(carrier, set_debug_request())
+    assert carrier == {"x-debug": "s3cret"}
+    assert is_debug_request(propagator.extract(carrier))
+    assert not is_debug_request(propagator.extract({"x-debug": "1"}))
+
+
+def test_sampler_forces_debug_requests_only():
+    sampler = DebugSampler(ALWAYS_OFF)
+
+    forced = sampler.should_sample(set_debug_request(), 0x1234, "GET /checkout")
+    normal = sampler.should_sample(context.Context(), 0x1234, "GET /checkout")
+
+    assert forced.decision == Decision.RECORD_AND_SAMPLE
+    assert forced.attributes["debug.requested"] is True
+    assert normal.decision == Decision.DROP
+
+
+def test_admin_endpoint_refuses_without_a_configured_token(monkeypatch):
+    app = FastAPI()
+    app.include_router(admin_router)
+    client = TestClient(app)
+
+    monkeypatch.delenv("LOG_ADMIN_TOKEN", raising=False)
+    assert client.get("/admin/log-levels", headers={"x-admin-token": ""}).status_code == 403
+    monkeypatch.setenv("LOG_ADMIN_TOKEN", "s3cret")
+    assert client.get("/admin/log-levels").status_code == 403
+    assert client.get("/admin/log-levels", headers={"x-admin-token": "guess"}).status_code == 403
+    assert client.get("/admin/log-levels", headers={"x-admin-token": "s3cret"}).status_code == 200
+
+
+def test_sink_level_drops_debug_before_the_filter_until_needed():
+    calls = []
+    logger.remove()
+    control = LevelControl("INFO")
+    control.add_sink(io.StringIO(), filter=lambda record: calls.append(record["level"].name) or control(record))
+
+    logger.debug("skipped")
+    assert calls == []
+
+    control.set_level(__name__, "DEBUG")
+    logger.debug("wanted")
+    control.set_level(__name__, None)
+    logger.debug("skipped again")
+    control.debug_started()
+    logger.debug("debug request")
+    control.debug_finished()
+    logger.debug("skipped once more")
+    assert calls == ["DEBUG", "DEBUG"]
+
+
+def test_admin_endpoint_and_debug_header_control_logging(monkeypatch):
+    monkeypatch.setenv("LOG_ADMIN_TOKEN", "admin")
+    monkeypatch.setenv("LOG_DEBUG_TOKEN", "debug")
+    stream = io.StringIO()
+    logger.remove()
+    logger.configure(patcher=otel_patcher)
+    level_control.add_sink(JsonLogEncoder("api-gateway", stream=stream))
+
+    app = FastAPI()
+    app.include_router(admin_router)
+    app.middleware("http")(debug_middleware)
+
+    @app.get("/work")
+    async def work(request: Request):
+        logger.debug("debug detail", forwarded=request.headers.get("x-debug"))
+        return {}
+
+    client = TestClient(app, headers={"x-admin-token": "admin"})
+    client.get("/work")
+    client.get("/work", headers={"x-debug": "1"})  # untrusted: ignored and stripped
+    client.get("/work", headers={"x-debug": "debug"})
+    assert [json.loads(line)["message"] for line in stream.getvalue().splitlines()] == [
+        "debug detail"
+    ]
+
+    response = client.put("/admin/log-levels", json={"module": __name__, "level": "DEBUG"})
+    assert response.json()["modules"] == {__name__: "DEBUG"}
+    client.get("/work", headers={"x-debug": "1"})
+    records = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [r.get("forwarded") for r in records if r["message"] == "debug detail"] == ["debug", None]
+
+    assert client.put("/admin/log-levels", json={"level": "LOUD"}).status_code == 400
+    client.put("/admin/log-levels", json={"module": __name__})
+    assert level_control.levels()["modules"] == {}
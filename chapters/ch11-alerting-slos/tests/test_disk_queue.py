@@ -0,0 +1,160 @@
+import io
+
+from opentelemetry.sdk.metrics import MeterProvider
+from opentelemetry.sdk.metrics.export import ConsoleMetricExporter, PeriodicExportingMetricReader
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+
+from disk_queue import TRACES, DiskExportQueue, DiskMetricExporter, DiskSpanExporter, GrpcSender, SegmentLog
+from otlp_stub import StubOTLPReceiver
+from span_export import replace_metric_exporters
+
+
+def _drain(log: SegmentLog) -> list[bytes]:
+    payloads = []
+    while (record := log.peek()) is not None:
+        payloads.append(record[1])
+        log.ack(record[2])
+    return payloads
+
+
+def test_segment_log_replays_in_order_across_segments_and_restarts(tmp_path):
+    log = SegmentLog(tmp_path, segment_bytes=64, max_bytes=1 << 20)
+    for i in range(10):
+        log.append(TRACES, f"batch-{i}".encode() * 3)
+    assert log.segments > 1
+
+    for _ in range(3):
+        signal, payload, token = log.peek()
+        log.ack(token)
+    log.close()
+
+    reopened = SegmentLog(tmp_path, segment_bytes=64, max_bytes=1 << 20)
+    assert len(reopened) == 7
+    assert _drain(reopened) == [f"batch-{i}".encode() * 3 for i in range(3, 10)]
+    assert reopened.segments == 1  # replayed segments are deleted
+
+
+def test_segment_log_evicts_oldest_segments_over_the_cap(tmp_path):
+    log = SegmentLog(tmp_path, segment_bytes=100, max_bytes=200)
+    evicted = sum(log.append(TRACES, bytes([i]) * 41) for i in range(20))  # 2 records per segment
+
+    assert evicted > 0
+    assert log.size <= 200
+    remaining = _drain(log)
+    assert len(remaining) + evicted == 20
+    assert remaining == [bytes([i]) * 41 for i in range(evicted, 20)]
+
+
+def test_ack_after_the_peeked_segment_was_evicted_is_ignored(tmp_path):
+    log = SegmentLog(tmp_path, segment_bytes=100, max_bytes=200)
+    for i in range(4):
+        log.append(TRACES, bytes([65 + i]) * 41)  # 2 records per segment
+    _signal, payload, token = log.peek()
+    assert payload == b"A" * 41
+
+    # While the record is being sent, new batches push its segment out.
+    evicted = sum(log.append(TRACES, bytes([69 + i]) * 41) for i in range(2))
+    log.ack(token)
+
+    assert evicted == 2
+    assert _drain(log) == [bytes([67 + i]) * 41 for i in range(4)]
+
+
+def test_torn_record_is_truncated_on_open(tmp_path):
+    log = SegmentLog(tmp_path)
+    log.append(TRACES, b"complete")
+    log.append(TRACES, b"torn-record")
+    log.close()
+    segment = next(tmp_path.glob("*.seg"))
+    segment.write_bytes(segment.read_bytes()[:-4])
+
+    assert _drain(SegmentLog(tmp_path)) == [b"complete"]
+
+
+def test_spans_and_metrics_survive_a_receiver_outage(tmp_path):
+    receiver = StubOTLPReceiver().start()
+    queue = DiskExportQueue(tmp_path, GrpcSender(receiver.endpoint, timeout=1), min_backoff=0.05)
+    tracer_provider = TracerProvider()
+    tracer_provider.add_span_processor(SimpleSpanProcessor(DiskSpanExporter(queue)))
+    tracer = tracer_provider.get_tracer(__name__)
+    reader = PeriodicExportingMetricReader(DiskMetricExporter(queue), export_interval_millis=60_000)
+    meter_provider = MeterProvider(metric_readers=[reader])
+    meter_provider.get_meter(__name__).create_counter("orders").add(1)
+
+    with tracer.start_as_current_span("before-outage"):
+        pass
+    receiver.pause()
+    for i in range(5):
+        with tracer.start_as_current_span(f"during-outage-{i}"):
+            pass
+    reader.collect()
+    assert queue.stats()["spilled"] == 6
+    assert receiver.span_names() == ["before-outage"]
+
+    receiver.resume()
+    with tracer.start_as_current_span("after-outage"):
+        pass  # queued behind the backlog, not sent ahead of it
+    assert queue.flush(5)
+
+    assert receiver.span_names() == ["before-outage"] + [f"during-outage-{i}" for i in range(5)] + ["after-outage"]
+    assert receiver.metric_names() == ["orders"]
+    stats = queue.stats()
+    assert stats["queued"] == 0 and stats["evicted"] == 0
+    assert stats["sent"] + stats["replayed"] == 8
+
+    # The exporters share the queue: it closes with the last one.
+    tracer_provider.shutdown()
+    reader.collect()
+    assert receiver.metric_names() == ["orders", "orders"]
+    meter_provider.shutdown()
+    assert queue._closed
+    receiver.stop()
+
+
+def test_replace_metric_exporters_keeps_the_reader(tmp_path):
+    receiver = StubOTLPReceiver().start()
+    queue = DiskExportQueue(tmp_path, GrpcSender(receiver.endpoint, timeout=1))
+    stock = ConsoleMetricExporter(out=io.StringIO())
+    reader = PeriodicExportingMetricReader(stock, export_interval_millis=60_000)
+    meter_provider = MeterProvider(metric_readers=[reader])
+
+    assert replace_metric_exporters(lambda old: DiskMetricExporter(queue), meter_provider) == 1
+    meter_provider.get_meter(__name__).create_counter("orders").add(1)
+    reader.collect()
+    assert receiver.metric_names() == ["orders"]
+    queue.close()
+    receiver.stop()
+
+
+class _FlakySender:
+    """Raises on the first replay, then delivers."""
+
+    def __init__(self):
+        self.healthy = False
+        self.failures = 0
+        self.delivered = []
+
+    def send(self, signal: int, payload: bytes) -> bool:
+        if not self.healthy:
+            return False
+        if self.failures == 0:
+            self.failures += 1
+            raise RuntimeError("unexpected sender error")
+        self.delivered.append(payload)
+        return True
+
+    def close(self) -> None:
+        pass
+
+
+def test_replay_survives_a_sender_error(tmp_path):
+    sender = _FlakySender()
+    queue = DiskExportQueue(tmp_path, sender, min_backoff=0.01)
+    queue.submit(TRACES, b"spilled")
+    sender.healthy = True
+    queue._wake.set()
+
+    assert queue.flush(5)
+    assert sender.delivered == [b"spilled"]
+    queue.close()
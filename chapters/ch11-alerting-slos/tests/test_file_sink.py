@@ -0,0 +1,120 @@
+import gzip
+import json
+import time
+
+import pytest
+import zstandard
+from loguru import logger
+
+from file_sink import GZIP, NONE, ZSTD, RotatingFileWriter, resolve_compression
+from log_encoder import JsonLogEncoder
+from logging_setup import otel_patcher
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _log_to(writer):
+    logger.remove()
+    logger.configure(patcher=otel_patcher)
+    logger.add(JsonLogEncoder("order-service", stream=writer), format="{message}")
+
+
+def _read_segments(directory):
+    lines = []
+    for path in sorted(directory.iterdir()):
+        opener = gzip.open if path.suffix == ".gz" else open
+        with opener(path, "rt") as f:
+            lines.extend(json.loads(line) for line in f)
+    return lines
+
+
+def test_rotates_on_size_and_compresses_closed_segments(tmp_path):
+    writer = RotatingFileWriter(tmp_path, "order-service", segment_bytes=2048, compression=GZIP)
+    _log_to(writer)
+
+    for i in range(100):
+        logger.info("Order created", order_id=f"ord-{i}")
+    logger.remove()  # stops the writer: last segment closed and compressed
+
+    paths = sorted(tmp_path.iterdir())
+    assert len(paths) > 1
+    assert all(path.name.endswith(".jsonl.gz") for path in paths)
+    assert [line["order_id"] for line in _read_segments(tmp_path)] == [
+        f"ord-{i}" for i in range(100)
+    ]
+
+    stats = writer.stats()
+    assert stats["segments_closed"] == len(paths)
+    assert stats["compression_ratio"] > 1
+    assert stats["bytes_written"] == sum(
+        len(gzip.decompress(p.read_bytes())) for p in paths
+    )
+
+
+def test_rotates_on_time(tmp_path):
+    clock = FakeClock()
+    writer = RotatingFileWriter(
+        tmp_path, "api-gateway", rotate_interval=60, compression=NONE, clock=clock
+    )
+    _log_to(writer)
+
+    logger.info("first")
+    clock.now = 61
+    logger.info("second")  # crosses the boundary → segment closed after it
+    logger.info("third")
+    logger.remove()
+
+    segments = [p.read_text().splitlines() for p in sorted(tmp_path.iterdir())]
+    assert [len(lines) for lines in segments] == [2, 1]
+
+
+def test_idle_segment_is_closed_without_another_write(tmp_path):
+    clock = FakeClock()
+    closed = []
+    writer = RotatingFileWriter(
+        tmp_path, "api-gateway", rotate_interval=60, compression=NONE,
+        on_segment_closed=closed.append, idle_check=0.01, clock=clock,
+    )
+    writer.write('{"message": "last request"}\n')
+    clock.now = 61  # the service goes quiet
+    deadline = time.monotonic() + 5
+    while not closed and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert [path.read_text() for path in closed] == ['{"message": "last request"}\n']
+
+    clock.now = 200  # the new segment is empty: nothing more is closed
+    time.sleep(0.1)
+    writer.stop()
+    assert len(closed) == 2 and closed[1].read_text() == ""
+
+
+def test_zstd_is_the_default_codec(tmp_path):
+    writer = RotatingFileWriter(tmp_path, "order-service")
+    writer.write('{"message": "only line"}\n')
+    writer.stop()
+
+    assert writer.compression == ZSTD
+    (path,) = tmp_path.iterdir()
+    assert path.name.endswith(".jsonl.zst")
+    with open(path, "rb") as f:
+        assert zstandard.ZstdDecompressor().stream_reader(f).read() == b'{"message": "only line"}\n'
+
+
+def test_preallocated_tail_is_truncated(tmp_path):
+    writer = RotatingFileWriter(tmp_path, "order-service", compression=NONE)
+    writer.write('{"message": "only line"}\n')
+    writer.stop()
+
+    (path,) = tmp_path.iterdir()
+    assert path.read_bytes() == b'{"message": "only line"}\n'
+
+
+def test_unknown_compression_is_rejected():
+    with pytest.raises(ValueError):
+        resolve_compression("lz4")
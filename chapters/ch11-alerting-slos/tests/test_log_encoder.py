@@ -0,0 +1,98 @@
+import io
+import json
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from loguru import logger
+
+from log_encoder import JsonLogEncoder
+from logging_setup import otel_patcher
+
+
+def _capture(service_name="order-service"):
+    stream = io.StringIO()
+    logger.remove()
+    logger.configure(patcher=otel_patcher)
+    logger.add(JsonLogEncoder(service_name, stream=stream), format="{message}")
+    return stream
+
+
+def test_bound_kwargs_become_top_level_fields():
+    stream = _capture()
+
+    logger.info("Inserting order record", item="widget", qty=2, total_usd=49.98)
+
+    line = json.loads(stream.getvalue())
+    assert line["service"] == "order-service"
+    assert line["level"] == "INFO"
+    assert line["message"] == "Inserting order record"
+    assert line["item"] == "widget"
+    assert line["qty"] == 2
+    assert line["total_usd"] == 49.98
+    assert line["trace_id"] == "0" * 32
+    assert line["span_id"] == "0" * 16
+
+
+def test_quotes_and_newlines_in_message_stay_valid_json():
+    stream = _capture()
+
+    logger.info('user said "hi"\nthen left', note='a "quoted" value')
+
+    line = json.loads(stream.getvalue())
+    assert line["message"] == 'user said "hi"\nthen left'
+    assert line["note"] == 'a "quoted" value'
+
+
+def test_non_serializable_extras_fall_back_to_str():
+    stream = _capture()
+
+    logger.info("Error seen", error=ValueError("boom"))
+
+    assert json.loads(stream.getvalue())["error"] == "boom"
+
+
+def test_extras_named_like_record_fields_are_renamed():
+    stream = _capture()
+
+    logger.info("Order created", level="gold", service="billing", message="shadow", user_id=7)
+
+    line = json.loads(stream.getvalue())
+    assert (line["level"], line["service"], line["message"]) == ("INFO", "order-service", "Order created")
+    assert (line["extra.level"], line["extra.service"], line["extra.message"]) == ("gold", "billing", "shadow")
+    assert stream.getvalue().count('"level"') == 1
+
+
+def test_integers_wider_than_64_bits_are_encoded():
+    stream = _capture()
+
+    logger.info("Hash bucket", digest=1 << 80)
+
+    assert json.loads(stream.getvalue())["digest"] == 1 << 80
+
+
+def test_exception_traceback_is_included():
+    stream = _capture()
+
+    try:
+        raise RuntimeError("redis unreachable")
+    except RuntimeError:
+        logger.exception("Health check failed")
+
+    line = json.loads(stream.getvalue())
+    assert line["level"] == "ERROR"
+    assert "RuntimeError: redis unreachable" in line["exception"]
+
+
+def test_timestamp_prefix_is_reused_within_a_millisecond():
+    encoder = JsonLogEncoder("api-gateway", stream=io.StringIO())
+    record = {
+        "time": datetime(2025, 1, 1, 12, 0, 0, 123456, tzinfo=timezone.utc),
+        "level": SimpleNamespace(name="INFO"),
+        "message": "x",
+        "extra": {},
+        "exception": None,
+    }
+
+    first = encoder._prefix_for(record)
+    assert encoder._prefix_for(record) is first
+    assert first.startswith('{"timestamp":"2025-01-01T12:00:00.123+00:00"')
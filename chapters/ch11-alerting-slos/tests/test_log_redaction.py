@@ -0,0 +1,47 @@
+import io
+import json
+
+from loguru import logger
+
+from log_encoder import JsonLogEncoder
+from log_redaction import PiiRedactor, redact
+from logging_setup import otel_patcher
+
+
+def test_redacts_each_pattern_in_one_pass():
+    text = (
+        "My name is John Smith, SSN 123-45-6789. "
+        "My email is john.smith@example.com, card 4111 1111 1111 1111, "
+        "call me at (555) 123-4567."
+    )
+
+    assert redact(text) == (
+        "My name is John Smith, SSN [SSN_REDACTED]. "
+        "My email is [EMAIL_REDACTED], card [CARD_REDACTED], "
+        "call me at [PHONE_REDACTED]."
+    )
+
+
+def test_leaves_ids_and_non_luhn_numbers_alone():
+    assert redact("Processing payment") == "Processing payment"
+    assert redact("order 1234567890123 qty=2") == "order 1234567890123 qty=2"
+    assert redact("took 1523.4ms") == "took 1523.4ms"
+
+
+def test_patcher_scrubs_message_and_string_extras_only():
+    stream = io.StringIO()
+    redactor = PiiRedactor(otel_patcher)
+    logger.remove()
+    logger.configure(patcher=redactor)
+    logger.add(JsonLogEncoder("api-gateway", stream=stream), format="{message}")
+
+    logger.info(
+        "Question from jane@corp.io", question="SSN 987-65-4321?", qty=2
+    )
+
+    line = json.loads(stream.getvalue())
+    assert line["message"] == "Question from [EMAIL_REDACTED]"
+    assert line["question"] == "SSN [SSN_REDACTED]?"
+    assert line["qty"] == 2
+    assert line["trace_id"] == "0" * 32
+    assert redactor.redacted == 2
@@ -0,0 +1,110 @@
+import io
+import json
+
+from loguru import logger
+
+from log_encoder import JsonLogEncoder
+from log_suppression import LogStormFilter
+from logging_setup import otel_patcher
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _capture(storm_filter):
+    stream = io.StringIO()
+    logger.remove()
+    logger.configure(patcher=otel_patcher)
+    logger.add(
+        JsonLogEncoder("order-service", stream=stream),
+        format="{message}",
+        filter=storm_filter,
+    )
+    return stream
+
+
+def _lines(stream):
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def _insert_failed():
+    logger.error("Order insert failed", error_type="DatabaseError")
+
+
+def test_traffic_under_the_rate_passes_untouched():
+    clock = FakeClock()
+    stream = _capture(LogStormFilter(rate=10, burst=5, window=10, clock=clock))
+
+    for _ in range(20):
+        _insert_failed()
+        clock.now += 0.2  # 5/s, below the 10/s budget
+
+    assert len(_lines(stream)) == 20
+
+
+def test_storm_is_collapsed_into_one_summary_per_window():
+    clock = FakeClock()
+    storm_filter = LogStormFilter(rate=1, burst=3, window=10, clock=clock)
+    stream = _capture(storm_filter)
+
+    for _ in range(100):
+        _insert_failed()
+    assert len(_lines(stream)) == 3  # burst only
+
+    clock.now += 10
+    assert storm_filter.flush() == 1
+
+    lines = _lines(stream)
+    summary = lines[-1]
+    assert summary["message"] == "Order insert failed"
+    assert summary["level"] == "ERROR"
+    assert summary["suppressed_count"] == 97
+    assert summary["window_s"] == 10
+    assert ":_insert_failed:" in summary["callsite"]
+    assert storm_filter.suppressed_total == 97
+
+
+def test_first_occurrence_in_each_window_always_passes():
+    clock = FakeClock()
+    stream = _capture(LogStormFilter(rate=0.001, burst=1, window=5, clock=clock))
+
+    for _ in range(3):
+        for _ in range(10):
+            _insert_failed()
+        clock.now += 5
+
+    assert len(_lines(stream)) == 3
+
+
+def test_different_messages_are_tracked_separately():
+    clock = FakeClock()
+    storm_filter = LogStormFilter(rate=0.001, burst=1, window=5, clock=clock)
+    stream = _capture(storm_filter)
+
+    for i in range(4):
+        logger.warning("DB fetch failed for {}", i % 2)
+
+    messages = [line["message"] for line in _lines(stream)]
+    assert messages == ["DB fetch failed for 0", "DB fetch failed for 1"]
+
+    storm_filter.stop()
+    summaries = [line for line in _lines(stream) if "suppressed_count" in line]
+    assert sorted(s["suppressed_count"] for s in summaries) == [1, 1]
+
+
+def test_debug_flood_does_not_suppress_errors_from_the_same_callsite():
+    clock = FakeClock()
+    storm_filter = LogStormFilter(rate=0.001, burst=2, window=5, clock=clock)
+    stream = _capture(storm_filter)
+
+    for attempt in range(52):
+        logger.log("DEBUG" if attempt < 50 else "ERROR", "Charging card")
+
+    lines = _lines(stream)
+    assert [line["level"] for line in lines if line["level"] == "ERROR"] == ["ERROR", "ERROR"]
+    assert storm_filter.suppressed_total == 48  # DEBUG only, past its burst
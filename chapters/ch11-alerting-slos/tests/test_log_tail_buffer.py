@@ -0,0 +1,137 @@
+import io
+import json
+
+from loguru import logger
+from opentelemetry import trace
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.trace import StatusCode
+
+from log_encoder import JsonLogEncoder
+from log_tail_buffer import DROP, TailLogBuffer, TailLogSpanProcessor
+from logging_setup import otel_patcher
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _pipeline(**kwargs):
+    stream = io.StringIO()
+    buffer = TailLogBuffer(JsonLogEncoder("order-service", stream=stream), **kwargs)
+    logger.remove()
+    logger.configure(patcher=otel_patcher)
+    logger.add(buffer, format="{message}", level="DEBUG")
+
+    provider = TracerProvider()
+    provider.add_span_processor(TailLogSpanProcessor(buffer))
+    return stream, buffer, provider.get_tracer(__name__)
+
+
+def _lines(stream):
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_successful_trace_is_reduced_to_a_summary():
+    stream, buffer, tracer = _pipeline()
+
+    with tracer.start_as_current_span("POST /orders") as root:
+        logger.info("Starting inventory check")
+        with tracer.start_as_current_span("check_inventory"):
+            logger.debug("Inventory check complete")
+        logger.info("Order created")
+        assert _lines(stream) == []
+
+    (summary,) = _lines(stream)
+    assert summary["message"] == "Trace completed without errors"
+    assert summary["buffered_records"] == 3
+    assert summary["buffered_levels"] == {"INFO": 2, "DEBUG": 1}
+    assert summary["trace_id"] == format(root.get_span_context().trace_id, "032x")
+    assert summary["span_name"] == "POST /orders"
+    assert buffer.stats()["discarded"] == 3
+
+
+def test_drop_mode_writes_nothing_for_successful_traces():
+    stream, _buffer, tracer = _pipeline(on_success=DROP)
+
+    with tracer.start_as_current_span("GET /health"):
+        logger.info("Health check ok")
+
+    assert _lines(stream) == []
+
+
+def test_error_span_flushes_the_whole_trace():
+    stream, buffer, tracer = _pipeline()
+
+    with tracer.start_as_current_span("POST /orders"):
+        logger.info("Starting inventory check")
+        with tracer.start_as_current_span("insert_order_record") as span:
+            logger.info("Inserting order record")
+            logger.error("Order insert failed")  # flushes the held records first
+            span.set_status(StatusCode.ERROR, "connection refused")
+        logger.info("Returning 500")  # after the flush: passes straight through
+
+    messages = [line["message"] for line in _lines(stream)]
+    assert messages == [
+        "Starting inventory check",
+        "Inserting order record",
+        "Order insert failed",
+        "Returning 500",
+    ]
+    assert buffer.stats()["flushed"] == 2
+
+
+def test_late_records_follow_the_completed_trace():
+    clock = FakeClock()
+    stream, buffer, tracer = _pipeline(on_success=DROP, tombstone_ttl=5, clock=clock)
+
+    with tracer.start_as_current_span("POST /orders") as ok:
+        logger.info("Order created")
+    with tracer.start_as_current_span("POST /orders") as failed:
+        logger.info("Starting inventory check")
+        failed.set_status(StatusCode.ERROR, "inventory down")
+    # Background tasks whose spans outlive the request's root span
+    with tracer.start_as_current_span("send_receipt", context=trace.set_span_in_context(ok)):
+        logger.info("Sending receipt")
+    with tracer.start_as_current_span("release", context=trace.set_span_in_context(failed)):
+        logger.info("Releasing reservation")
+
+    assert [line["message"] for line in _lines(stream)] == [
+        "Starting inventory check",
+        "Releasing reservation",
+    ]
+    stats = buffer.stats()
+    assert (stats["open_traces"], stats["completed_traces"], stats["discarded"]) == (0, 2, 2)
+
+    clock.now = 6
+    with tracer.start_as_current_span("GET /health"):
+        pass
+    assert buffer.stats()["completed_traces"] == 1
+
+
+def test_records_outside_a_trace_pass_through():
+    stream, _buffer, _tracer = _pipeline()
+
+    logger.info("Service starting")
+
+    assert [line["message"] for line in _lines(stream)] == ["Service starting"]
+
+
+def test_traces_that_never_close_are_evicted():
+    clock = FakeClock()
+    stream, buffer, tracer = _pipeline(max_traces=2, ttl=30, clock=clock)
+
+    for _ in range(3):
+        with trace.use_span(tracer.start_span("orphan")):
+            logger.info("held forever")
+    assert buffer.stats()["open_traces"] == 2
+    assert buffer.stats()["evicted_traces"] == 1
+
+    clock.now = 31
+    with tracer.start_as_current_span("fresh"):
+        logger.info("new trace")
+    assert buffer.stats()["evicted_traces"] == 3
+    assert _lines(stream)[-1]["message"] == "Trace completed without errors"
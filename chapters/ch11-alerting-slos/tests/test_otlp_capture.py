@@ -0,0 +1,129 @@
+from opentelemetry.proto.collector.trace.v1.trace_service_pb2 import ExportTraceServiceRequest
+from opentelemetry.sdk.metrics import MeterProvider
+from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+
+from disk_queue import METRICS, TRACES, GrpcSender
+from otlp_capture import CaptureWriter, FileMetricExporter, FileSpanExporter, capture_files, read_capture, replay
+from otlp_stub import StubOTLPReceiver
+
+
+class _FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def clock(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(round(seconds, 6))
+        self.now += seconds
+
+
+class _RecordingSender:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, signal, payload) -> bool:
+        self.sent.append((signal, payload))
+        return True
+
+
+def _span_names(payload: bytes) -> list[str]:
+    request = ExportTraceServiceRequest.FromString(payload)
+    return [span.name for rs in request.resource_spans for ss in rs.scope_spans for span in ss.spans]
+
+
+def test_exporters_write_rotating_files_read_back_in_order(tmp_path):
+    writer = CaptureWriter(tmp_path, rotate_bytes=300)
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(FileSpanExporter(writer)))
+    metric_exporter = FileMetricExporter(writer)
+    reader = InMemoryMetricReader()
+    meter_provider = MeterProvider(metric_readers=[reader])
+    meter_provider.get_meter("test").create_counter("orders").add(1)
+
+    tracer = provider.get_tracer("test")
+    for i in range(20):
+        with tracer.start_as_current_span(f"span-{i}"):
+            pass
+    metric_exporter.export(reader.get_metrics_data())
+    provider.shutdown()
+    metric_exporter.shutdown()  # last user: closes the file
+
+    records = list(read_capture(tmp_path))
+    assert len(capture_files(tmp_path)) > 1
+    assert [signal for _, signal, _ in records] == [TRACES] * 20 + [METRICS]
+    assert [name for _, _, payload in records[:-1] for name in _span_names(payload)] == [f"span-{i}" for i in range(20)]
+    assert [ts for ts, _, _ in records] == sorted(ts for ts, _, _ in records)
+
+
+def test_torn_record_ends_the_file_and_restart_continues_after_it(tmp_path):
+    writer = CaptureWriter(tmp_path)
+    writer.append(TRACES, b"complete", timestamp_ns=1)
+    writer.append(TRACES, b"torn-record", timestamp_ns=2)
+    writer.close()
+    first = capture_files(tmp_path)[0]
+    first.write_bytes(first.read_bytes()[:-3])
+
+    writer = CaptureWriter(tmp_path)
+    writer.append(TRACES, b"after-restart", timestamp_ns=3)
+    writer.close()
+
+    assert len(capture_files(tmp_path)) == 2
+    assert [payload for _, _, payload in read_capture(tmp_path)] == [b"complete", b"after-restart"]
+
+
+def test_directories_are_merged_by_capture_time(tmp_path):
+    for name, times in (("order", (1, 4, 5)), ("gateway", (2, 3, 6))):
+        writer = CaptureWriter(tmp_path / name)
+        for ts in times:
+            writer.append(TRACES, f"{name}-{ts}".encode(), timestamp_ns=ts)
+        writer.close()
+
+    assert [ts for ts, _, _ in read_capture(tmp_path)] == [1, 2, 3, 4, 5, 6]
+
+
+def test_replay_keeps_scaled_spacing_or_a_fixed_rate(tmp_path):
+    records = [(0, TRACES, b"a"), (1_000_000_000, TRACES, b"b"), (3_000_000_000, METRICS, b"c")]
+
+    fake, sender = _FakeClock(), _RecordingSender()
+    stats = replay(records, sender, speed=2.0, clock=fake.clock, sleep=fake.sleep)
+    assert fake.sleeps == [0.5, 1.0]
+    assert stats["requests"] == 3 and stats["metrics"] == 1
+    assert [payload for _, payload in sender.sent] == [b"a", b"b", b"c"]
+
+    fake = _FakeClock()
+    replay(records, _RecordingSender(), rate=10, clock=fake.clock, sleep=fake.sleep)
+    assert fake.sleeps == [0.1, 0.1]
+
+
+def _start_time(payload: bytes) -> int:
+    return ExportTraceServiceRequest.FromString(payload).resource_spans[0].scope_spans[0].spans[0].start_time_unix_nano
+
+
+def test_replay_to_a_receiver_with_shifted_timestamps(tmp_path):
+    writer = CaptureWriter(tmp_path / "live")
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(FileSpanExporter(writer)))
+    with provider.get_tracer("test").start_as_current_span("checkout"):
+        pass
+    provider.shutdown()
+    timestamp_ns, signal, payload = next(read_capture(tmp_path / "live"))
+    an_hour_ago = CaptureWriter(tmp_path / "old")  # as if captured an hour earlier
+    an_hour_ago.append(signal, payload, timestamp_ns=timestamp_ns - 3600 * 10**9)
+    an_hour_ago.close()
+
+    receiver = StubOTLPReceiver().start()
+    sender = GrpcSender(receiver.endpoint, compression="none")
+    try:
+        stats = replay(read_capture(tmp_path / "old"), sender, speed=0, shift=True)
+    finally:
+        sender.close()
+        receiver.stop()
+
+    assert stats["failed"] == 0
+    assert receiver.span_names() == ["checkout"]
+    assert _start_time(receiver.requests["traces"][0]) - _start_time(payload) >= 3600 * 10**9
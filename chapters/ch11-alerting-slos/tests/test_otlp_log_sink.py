@@ -0,0 +1,65 @@
+from loguru import logger
+from opentelemetry._logs import SeverityNumber
+from opentelemetry.sdk._logs.export import InMemoryLogRecordExporter
+from opentelemetry.sdk.trace import TracerProvider
+
+from logging_setup import otel_patcher
+from otlp_log_sink import OtlpLogSink
+
+
+def _sink():
+    exporter = InMemoryLogRecordExporter()
+    sink = OtlpLogSink("order-service", exporter=exporter, schedule_delay_millis=10)
+    logger.remove()
+    logger.configure(patcher=otel_patcher)
+    logger.add(sink, format="{message}", level="INFO")
+    return exporter, sink
+
+
+def _exported(exporter, sink):
+    sink.logger_provider.force_flush()
+    return [data.log_record for data in exporter.get_finished_logs()]
+
+
+def test_records_carry_trace_correlation_and_bound_kwargs():
+    exporter, sink = _sink()
+    tracer = TracerProvider().get_tracer(__name__)
+
+    with tracer.start_as_current_span("insert_order_record") as span:
+        logger.error("Order insert failed", error_type="DatabaseError", qty=2)
+
+    (log_record,) = _exported(exporter, sink)
+    ctx = span.get_span_context()
+    assert log_record.trace_id == ctx.trace_id
+    assert log_record.span_id == ctx.span_id
+    assert log_record.body == "Order insert failed"
+    assert log_record.severity_text == "ERROR"
+    assert log_record.severity_number == SeverityNumber.ERROR
+    assert log_record.attributes["error_type"] == "DatabaseError"
+    assert log_record.attributes["qty"] == 2
+    assert "trace_id" not in log_record.attributes
+
+
+def test_uncorrelated_records_and_exceptions():
+    exporter, sink = _sink()
+
+    try:
+        raise ConnectionError("stripe API timeout")
+    except ConnectionError:
+        logger.exception("Payment charge failed", order=object())
+
+    (log_record,) = _exported(exporter, sink)
+    assert log_record.trace_id == 0
+    assert log_record.attributes["exception.type"] == "ConnectionError"
+    assert "stripe API timeout" in log_record.attributes["exception.stacktrace"]
+    assert log_record.attributes["order"].startswith("<object object")
+
+
+def test_stop_flushes_pending_batches():
+    exporter, _ = _sink()
+
+    for i in range(10):
+        logger.info("event {}", i)
+    logger.remove()
+
+    assert len(exporter.get_finished_logs()) == 10
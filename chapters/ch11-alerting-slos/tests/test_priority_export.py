@@ -0,0 +1,87 @@
+import threading
+
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, SpanExporter, SpanExportResult
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from opentelemetry.trace import Status, StatusCode
+
+from priority_export import PrioritySpanProcessor
+from span_export import replace_batch_processors
+
+
+class RecordingExporter(SpanExporter):
+    def __init__(self):
+        self.batches = []
+
+    def export(self, spans):
+        self.batches.append([span.name for span in spans])
+        return SpanExportResult.SUCCESS
+
+
+def _end(tracer, name, *, error=False, debug=False, duration_ms=1):
+    span = tracer.start_span(name, start_time=1_000_000_000)
+    if error:
+        span.set_status(Status(StatusCode.ERROR))
+    if debug:
+        span.set_attribute("debug.requested", True)
+    span.end(end_time=1_000_000_000 + int(duration_ms * 1e6))
+
+
+def test_fast_successful_spans_are_evicted_first():
+    exporter = RecordingExporter()
+    processor = PrioritySpanProcessor(
+        exporter, max_queue_size=4, max_export_batch_size=100, schedule_delay_millis=60_000,
+        slow_threshold_ms=500,
+    )
+    provider = TracerProvider()
+    provider.add_span_processor(processor)
+    tracer = provider.get_tracer(__name__)
+
+    for i in range(4):
+        _end(tracer, f"ok-{i}")
+    _end(tracer, "error", error=True)          # evicts ok-0
+    _end(tracer, "debug", debug=True)          # evicts ok-1
+    _end(tracer, "slow", duration_ms=800)      # evicts ok-2
+    _end(tracer, "error-2", error=True)        # evicts ok-3
+    _end(tracer, "ok-late")                    # everything queued outranks it
+    _end(tracer, "error-3", error=True)        # evicts slow
+
+    stats = processor.stats()
+    assert stats["queued"] == {"normal": 0, "slow": 0, "debug": 1, "error": 3}
+    assert stats["dropped"] == {"normal": 5, "slow": 1, "debug": 0, "error": 0}
+
+    processor.force_flush()
+    assert exporter.batches == [["error", "error-2", "error-3", "debug"]]
+    processor.shutdown()
+
+
+def test_full_batches_are_exported_without_waiting_for_the_delay():
+    exported = threading.Event()
+
+    class Exporter(RecordingExporter):
+        def export(self, spans):
+            exported.set()
+            return super().export(spans)
+
+    processor = PrioritySpanProcessor(Exporter(), max_export_batch_size=3, schedule_delay_millis=60_000)
+    provider = TracerProvider()
+    provider.add_span_processor(processor)
+    tracer = provider.get_tracer(__name__)
+    for i in range(3):
+        _end(tracer, f"ok-{i}")
+
+    assert exported.wait(2)
+    processor.shutdown()
+
+
+def test_replace_batch_processors_keeps_the_exporter_class():
+    provider = TracerProvider()
+    stock = BatchSpanProcessor(InMemorySpanExporter())
+    provider.add_span_processor(stock)
+
+    created = replace_batch_processors(lambda exporter: PrioritySpanProcessor(exporter), provider)
+
+    assert len(created) == 1
+    assert isinstance(created[0].span_exporter, InMemorySpanExporter)
+    assert provider._active_span_processor._span_processors == (created[0],)
+    created[0].shutdown()
@@ -0,0 +1,113 @@
+import json
+import os
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from opentelemetry.sdk.trace.sampling import Decision, ParentBased
+
+from debug_control import DebugSampler, set_debug_request
+from route_sampler import RULE_ATTRIBUTE, RouteSampler
+
+RULES = {
+    "default": 1.0,
+    "rules": [
+        {"name": "health", "route": "/health", "ratio": 0.0},
+        {"name": "product-reads", "method": "GET", "route": "/products/*", "ratio": 0.5},
+        {"route": "/admin/*", "ratio": 1.0},
+    ],
+}
+
+
+def _write(path, rules: dict, mtime_ns: int | None = None) -> None:
+    path.write_text(json.dumps(rules))
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def _server(route: str | None = None, method: str = "GET", target: str | None = None) -> dict:
+    attributes = {"http.method": method, "http.target": target or route}
+    if route is not None:
+        attributes["http.route"] = route
+    return attributes
+
+
+def test_first_matching_rule_by_route_template_method_or_path(tmp_path):
+    _write(tmp_path / "rules.json", RULES)
+    sampler = RouteSampler(tmp_path / "rules.json")
+
+    assert sampler.rule_for(_server("/health")).name == "health"
+    assert sampler.rule_for(_server("/products/{product_id}")).name == "product-reads"
+    assert sampler.rule_for(_server("/products/{product_id}", method="PUT")).name == "default"
+    assert sampler.rule_for(_server(target="/admin/log-levels?x=1")).name == "* /admin/*"
+    assert sampler.rule_for(None).name == "default"
+
+
+def test_ratio_decides_by_trace_id_and_counts_per_rule(tmp_path):
+    _write(tmp_path / "rules.json", RULES)
+    sampler = RouteSampler(tmp_path / "rules.json")
+    low, high = 1, (1 << 64) - 1  # below / above the 0.5 bound
+
+    assert sampler.should_sample(None, low, "GET /health", attributes=_server("/health")).decision == Decision.DROP
+    sampled = sampler.should_sample(None, low, "GET", attributes=_server("/products/{product_id}"))
+    dropped = sampler.should_sample(None, high, "GET", attributes=_server("/products/{product_id}"))
+
+    assert sampled.decision == Decision.RECORD_AND_SAMPLE
+    assert sampled.attributes[RULE_ATTRIBUTE] == "product-reads"
+    assert dropped.decision == Decision.DROP
+    assert sampler.counts == {"health": [0, 1], "product-reads": [1, 1]}
+
+
+def test_rules_reload_on_change_and_bad_files_keep_the_old_ones(tmp_path):
+    path = tmp_path / "rules.json"
+    _write(path, RULES, mtime_ns=1_000_000_000)
+    now = [0.0]
+    sampler = RouteSampler(path, check_interval=2.0, clock=lambda: now[0])
+    health = _server("/health")
+
+    _write(path, {"rules": [{"name": "health", "route": "/health", "ratio": 1.0}]}, mtime_ns=2_000_000_000)
+    assert sampler.should_sample(None, 1, "GET", attributes=health).decision == Decision.DROP  # not checked yet
+    now[0] = 2.0
+    assert sampler.should_sample(None, 1, "GET", attributes=health).decision == Decision.RECORD_AND_SAMPLE
+    assert sampler.reloads == 1
+
+    path.write_text("{not json")
+    os.utime(path, ns=(3_000_000_000, 3_000_000_000))
+    now[0] = 4.0
+    assert sampler.should_sample(None, 1, "GET", attributes=health).decision == Decision.RECORD_AND_SAMPLE
+    assert sampler.reloads == 1
+
+
+def test_dropped_routes_create_no_spans_but_debug_requests_do(tmp_path):
+    _write(tmp_path / "rules.json", RULES)
+    route_sampler = RouteSampler(tmp_path / "rules.json")
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider(sampler=DebugSampler(ParentBased(root=route_sampler)))
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+
+    app = FastAPI()
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    @app.get("/checkout")
+    async def checkout():
+        return {"checkout": "complete"}
+
+    FastAPIInstrumentor.instrument_app(app, tracer_provider=provider)
+    client = TestClient(app)
+    for _ in range(5):
+        client.get("/health")
+    client.get("/checkout")
+    assert {span.name for span in exporter.get_finished_spans()} >= {"GET /checkout"}
+    assert not [span for span in exporter.get_finished_spans() if span.name.startswith("GET /health")]
+
+    # The debug flag is extracted before the server span starts.
+    assert DebugSampler(ParentBased(root=route_sampler)).should_sample(
+        set_debug_request(), 1, "GET /health", attributes=_server("/health")
+    ).decision == Decision.RECORD_AND_SAMPLE
+    assert route_sampler.counts["health"] == [0, 5]
@@ -0,0 +1,135 @@
+import io
+import json
+import marshal
+import subprocess
+import sys
+import zlib
+from pathlib import Path
+
+from loguru import logger
+
+from log_encoder import JsonLogEncoder
+from logging_setup import otel_patcher
+from shm_transport import _FRAME, _HEAD, BLOCK, HEADER_SIZE, Shipper, ShmLogSink, _Ring
+
+CHAPTER = Path(__file__).resolve().parent.parent
+
+
+def _sink(capacity=4096, **kwargs):
+    sink = ShmLogSink("order-service", capacity=capacity, start_shipper=False, **kwargs)
+    logger.remove()
+    logger.configure(patcher=otel_patcher)
+    logger.add(sink, format="{message}", level="DEBUG")
+    return sink
+
+
+def _shipper(sink):
+    stream = io.StringIO()
+    encoder = JsonLogEncoder("order-service", stream=stream)
+    return Shipper(_Ring(sink._shm), [encoder], "order-service"), stream
+
+
+def test_records_survive_the_ring_across_wraparound():
+    sink = _sink(capacity=1024)
+    shipper, stream = _shipper(sink)
+    try:
+        for i in range(200):  # ~40 KB through a 1 KB ring
+            logger.info("Inserting order record", item="widget", qty=i)
+            shipper.drain()
+        lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+        assert [line["qty"] for line in lines] == list(range(200))
+        assert lines[0]["item"] == "widget"
+        assert lines[0]["trace_id"] == "0" * 32
+        assert sink.stats()["flushed"] == 200
+    finally:
+        logger.remove()
+
+
+def test_full_ring_drops_and_reports_the_count():
+    sink = _sink(capacity=1024)
+    shipper, stream = _shipper(sink)
+    try:
+        for i in range(50):
+            logger.info("Inserting order record", qty=i)
+        stats = sink.stats()
+        assert stats["dropped"] > 0
+        assert stats["enqueued"] + stats["dropped"] == 50
+
+        shipper.drain()
+        shipper.report_drops()
+        last = json.loads(stream.getvalue().splitlines()[-1])
+        assert last["level"] == "WARNING"
+        assert last["dropped"] == stats["dropped"]
+    finally:
+        logger.remove()
+
+
+def _raw_record(sink, payload: bytes, crc: int | None = None) -> None:
+    """Put a frame straight into the ring, as a broken producer would."""
+    ring = sink._ring
+    frame = _FRAME.pack(len(payload), zlib.crc32(payload) if crc is None else crc) + payload
+    ring.put(sink._head, frame)
+    sink._head += len(frame)
+    ring.set(_HEAD, sink._head)
+
+
+def test_corrupt_records_are_skipped_and_reported():
+    sink = _sink()
+    shipper, stream = _shipper(sink)
+    try:
+        logger.info("before")
+        _raw_record(sink, b"torn payload", crc=0)  # checksum mismatch
+        _raw_record(sink, marshal.dumps(("not", "a", "record")))  # fails to decode
+        logger.info("after")
+        assert shipper.drain() == 4
+        assert [json.loads(line)["message"] for line in stream.getvalue().splitlines()] == ["before", "after"]
+        assert shipper.corrupt == 2
+
+        shipper.report_drops()
+        last = json.loads(stream.getvalue().splitlines()[-1])
+        assert last["message"] == "Corrupt log records skipped by shared-memory transport"
+        assert last["corrupt"] == 2
+    finally:
+        logger.remove()
+
+
+def test_garbage_length_skips_to_the_published_head():
+    sink = _sink()
+    shipper, stream = _shipper(sink)
+    try:
+        logger.info("lost")
+        sink._ring.buf[HEADER_SIZE:HEADER_SIZE + 4] = b"\xff\xff\xff\x7f"
+        assert shipper.drain() == 1
+        assert shipper.corrupt == 1 and stream.getvalue() == ""
+
+        logger.info("next")  # the ring is usable again
+        shipper.drain()
+        assert json.loads(stream.getvalue())["message"] == "next"
+    finally:
+        logger.remove()
+
+
+def test_block_policy_gives_up_after_timeout():
+    sink = _sink(capacity=256, overflow=BLOCK, block_timeout=0.05)
+    try:
+        for i in range(20):
+            logger.info("x" * 40, qty=i)
+        assert sink.stats()["dropped"] > 0
+    finally:
+        logger.remove()
+
+
+def test_shipper_process_drains_before_exit():
+    script = (
+        "from logging_setup import setup_logging\n"
+        "log = setup_logging('order-service', shm_transport=True, shm_mb=1)\n"
+        "for i in range(1000):\n"
+        "    log.info('Inserting order record', qty=i)\n"
+        "log.remove()\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=CHAPTER, capture_output=True, text=True, timeout=30,
+    )
+    lines = [json.loads(line) for line in result.stdout.splitlines()]
+    assert [line["qty"] for line in lines] == list(range(1000))
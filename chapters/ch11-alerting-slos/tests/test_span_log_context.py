@@ -0,0 +1,103 @@
+import asyncio
+
+from opentelemetry.sdk.trace import TracerProvider
+
+import span_log_context
+from span_log_context import LogContextSpanProcessor, otel_patcher
+
+
+def _patched():
+    record = {"extra": {}}
+    otel_patcher(record)
+    return record["extra"]
+
+
+def _tracer(with_processor: bool):
+    provider = TracerProvider()
+    if with_processor:
+        provider.add_span_processor(LogContextSpanProcessor())
+    return provider.get_tracer(__name__)
+
+
+def test_cached_ids_match_span_context():
+    tracer = _tracer(with_processor=True)
+
+    with tracer.start_as_current_span("check_inventory") as span:
+        assert span_log_context._log_ids.get().span_id == span.get_span_context().span_id
+        extra = _patched()
+
+    ctx = span.get_span_context()
+    assert extra == {
+        "trace_id": format(ctx.trace_id, "032x"),
+        "span_id": format(ctx.span_id, "016x"),
+        "span_name": "check_inventory",
+    }
+    assert span_log_context._log_ids.get() is None
+
+
+def test_nested_spans_report_the_innermost_span():
+    tracer = _tracer(with_processor=True)
+
+    with tracer.start_as_current_span("create_order") as outer:
+        with tracer.start_as_current_span("insert_order_record") as inner:
+            inner_extra = _patched()
+        outer_extra = _patched()
+
+    assert inner_extra["span_id"] == format(inner.get_span_context().span_id, "016x")
+    assert inner_extra["span_name"] == "insert_order_record"
+    assert outer_extra["span_id"] == format(outer.get_span_context().span_id, "016x")
+    assert inner_extra["trace_id"] == outer_extra["trace_id"]
+
+
+def test_spans_without_the_processor_use_the_slow_path():
+    tracer = _tracer(with_processor=False)
+
+    with tracer.start_as_current_span("fetch_product") as span:
+        extra = _patched()
+
+    assert extra["trace_id"] == format(span.get_span_context().trace_id, "032x")
+    assert extra["span_name"] == "fetch_product"
+
+
+def test_no_active_span_gives_zero_ids():
+    assert _patched() == {
+        "trace_id": "0" * 32,
+        "span_id": "0" * 16,
+        "span_name": "",
+    }
+
+
+def test_unended_spans_do_not_accumulate():
+    tracer = _tracer(with_processor=True)
+
+    with tracer.start_as_current_span("handle_request") as parent:
+        for _ in range(100):
+            tracer.start_span("never_ended")  # dropped without end()
+        extra = _patched()
+        depth = 0
+        entry = span_log_context._log_ids.get()
+        while entry is not None:
+            depth, entry = depth + 1, entry.parent
+    assert depth == 2  # the last unended span and its parent
+    assert extra["span_id"] == format(parent.get_span_context().span_id, "016x")
+    assert span_log_context._log_ids.get() is None
+
+
+def test_tasks_inherit_the_ids_of_the_span_they_start_in():
+    tracer = _tracer(with_processor=True)
+
+    async def child(name):
+        with tracer.start_as_current_span(name) as span:
+            await asyncio.sleep(0)
+            return span, _patched()
+
+    async def main():
+        with tracer.start_as_current_span("create_order") as parent:
+            results = await asyncio.gather(child("check_inventory"), child("charge_card"))
+            return parent, results, _patched()
+
+    parent, results, after = asyncio.run(main())
+    for span, extra in results:
+        assert extra["span_id"] == format(span.get_span_context().span_id, "016x")
+        assert extra["span_name"] == span.name
+    assert after["span_id"] == format(parent.get_span_context().span_id, "016x")
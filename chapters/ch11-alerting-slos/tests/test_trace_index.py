@@ -0,0 +1,143 @@
+import gzip
+import json
+from pathlib import Path
+
+import pytest
+from loguru import logger
+from opentelemetry.sdk.trace import TracerProvider
+
+from file_sink import GZIP, NONE, ZSTD, RotatingFileWriter
+from log_encoder import JsonLogEncoder
+from logging_setup import otel_patcher
+from trace_index import TraceIndex, main
+
+
+def _log_to(writer):
+    logger.remove()
+    logger.configure(patcher=otel_patcher)
+    logger.add(JsonLogEncoder("order-service", stream=writer), format="{message}")
+
+
+def _simulate_orders(tracer, count):
+    """Interleave log lines of `count` traces, two spans each."""
+    trace_ids = []
+    for i in range(count):
+        with tracer.start_as_current_span("POST /orders") as root:
+            logger.info("Starting inventory check", order=i)
+            with tracer.start_as_current_span("insert_order_record"):
+                logger.info("Inserting order record", order=i)
+            logger.info("Order created", order=i)
+        trace_ids.append(format(root.get_span_context().trace_id, "032x"))
+    logger.info("outside any trace")
+    return trace_ids
+
+
+def test_index_segments_as_they_are_closed(tmp_path):
+    index = TraceIndex(tmp_path / "index.sqlite")
+    writer = RotatingFileWriter(
+        tmp_path / "logs",
+        "order-service",
+        segment_bytes=4096,
+        compression=GZIP,
+        on_segment_closed=index.index_file,
+    )
+    _log_to(writer)
+    tracer = TracerProvider().get_tracer(__name__)
+
+    trace_ids = _simulate_orders(tracer, 50)
+    logger.remove()
+
+    lines = [json.loads(line) for line in index.lookup(trace_ids[17])]
+    assert [line["message"] for line in lines] == [
+        "Starting inventory check",
+        "Order created",  # same span as the first line
+        "Inserting order record",
+    ]
+    assert {line["order"] for line in lines} == {17}
+    assert {line["trace_id"] for line in lines} == {trace_ids[17]}
+    assert index.lookup("f" * 32) == []
+
+
+def test_compressed_segments_decompress_only_the_frames_read(tmp_path, monkeypatch):
+    index = TraceIndex(tmp_path / "index.sqlite")
+    writer = RotatingFileWriter(
+        tmp_path / "logs",
+        "order-service",
+        segment_bytes=64 << 10,
+        compression=GZIP,
+        frame_bytes=4096,
+        on_segment_closed=index.index_file,
+        on_segment_compressed=index.index_frames,
+    )
+    _log_to(writer)
+    trace_ids = _simulate_orders(TracerProvider().get_tracer(__name__), 200)
+    logger.remove()
+
+    segment = index.locate(trace_ids[150])[0][0]
+    assert len(index.frames(segment)) > 1
+    decompressed = []
+    real_decompress = gzip.decompress
+    monkeypatch.setattr(gzip, "decompress", lambda data: decompressed.append(real_decompress(data)) or decompressed[-1])
+
+    lines = [json.loads(line) for line in index.lookup(trace_ids[150])]
+    assert [line["order"] for line in lines] == [150, 150, 150]
+    assert 1 <= len(decompressed) <= 2  # a trace's lines may straddle a frame boundary
+    assert all(len(frame) < 4096 + 1024 for frame in decompressed)
+
+
+def test_zstd_segments_are_read_frame_by_frame(tmp_path):
+    index = TraceIndex(tmp_path / "index.sqlite")
+    writer = RotatingFileWriter(
+        tmp_path / "logs",
+        "order-service",
+        segment_bytes=64 << 10,
+        compression=ZSTD,
+        frame_bytes=4096,
+        on_segment_closed=index.index_file,
+        on_segment_compressed=index.index_frames,
+    )
+    _log_to(writer)
+    trace_ids = _simulate_orders(TracerProvider().get_tracer(__name__), 200)
+    logger.remove()
+
+    segment = index.locate(trace_ids[150])[0][0]
+    assert not Path(segment).exists() and Path(segment + ".zst").exists()
+    assert len(index.frames(segment)) > 1
+    lines = [json.loads(line) for line in index.lookup(trace_ids[150])]
+    assert [line["order"] for line in lines] == [150, 150, 150]
+
+
+def test_build_is_incremental(tmp_path):
+    segment = tmp_path / "app.jsonl"
+    tid = "ab" * 16
+    line = json.dumps({"message": "m", "trace_id": tid, "span_id": "cd" * 8}) + "\n"
+    segment.write_text(line)
+    index = TraceIndex(tmp_path / "index.sqlite")
+
+    assert index.index_directory(tmp_path) == 1
+    assert index.index_directory(tmp_path) == 0
+
+    with open(segment, "a") as f:
+        f.write(line)
+        f.write(line[:10])  # partial line: not indexed yet
+    assert index.index_directory(tmp_path) == 1
+    assert len(index.lookup(tid)) == 2
+
+
+def test_cli_build_and_lookup(tmp_path, capsys):
+    writer = RotatingFileWriter(tmp_path, "api-gateway", compression=NONE)
+    _log_to(writer)
+    trace_ids = _simulate_orders(TracerProvider().get_tracer(__name__), 3)
+    logger.remove()
+
+    assert main(["build", str(tmp_path)]) == 0
+    capsys.readouterr()
+    assert main(["lookup", trace_ids[1], "--index", str(tmp_path / "trace-index.sqlite")]) == 0
+
+    out = capsys.readouterr().out.splitlines()
+    assert len(out) == 3
+    assert all(json.loads(line)["trace_id"] == trace_ids[1] for line in out)
+
+    with pytest.raises(SystemExit):
+        main(["lookup", "not-a-trace-id", "--index", str(tmp_path / "trace-index.sqlite")])
+    assert "invalid trace_id 'not-a-trace-id'" in capsys.readouterr().err
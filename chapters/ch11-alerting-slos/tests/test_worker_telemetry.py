@@ -0,0 +1,63 @@
+import multiprocessing
+import os
+
+import worker_telemetry
+from worker_telemetry import claim_worker_slot
+
+
+def _spawned_worker(runtime_dir, results, done) -> None:
+    from opentelemetry import trace
+
+    slot = worker_telemetry.init_worker_telemetry("order-service", 8001, runtime_dir)
+    resource = trace.get_tracer_provider().resource
+    results.put((slot, resource.attributes["service.instance.id"], resource.attributes["service.name"]))
+    done.wait(10)
+
+
+def _serve_inherited_app(results) -> None:
+    results.put("served")  # what a preloaded worker would do: no create_app()
+
+
+def test_slots_are_claimed_lowest_first_and_freed_on_close(tmp_path):
+    first, first_lock = claim_worker_slot(tmp_path)
+    second, second_lock = claim_worker_slot(tmp_path)
+    assert (first, second) == (0, 1)
+
+    first_lock.close()
+    again, again_lock = claim_worker_slot(tmp_path)
+    assert again == 0
+    again_lock.close()
+    second_lock.close()
+
+
+def test_workers_get_distinct_instance_ids(tmp_path, monkeypatch):
+    for signal in ("TRACES", "METRICS", "LOGS"):
+        monkeypatch.setenv(f"OTEL_{signal}_EXPORTER", "none")
+    context = multiprocessing.get_context("spawn")
+    results, done = context.Queue(), context.Event()
+    workers = [context.Process(target=_spawned_worker, args=(str(tmp_path), results, done)) for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    try:
+        seen = sorted(results.get(timeout=30) for _ in workers)
+    finally:
+        done.set()
+        for worker in workers:
+            worker.join(10)
+
+    assert [slot for slot, _, _ in seen] == [0, 1]
+    assert seen[0][1].endswith("-8001-w0") and seen[1][1].endswith("-8001-w1")
+    assert {name for _, _, name in seen} == {"order-service"}
+
+
+def test_fork_after_initialization_exits_the_child(monkeypatch):
+    # As after create_app() in a gunicorn --preload master.
+    monkeypatch.setattr(worker_telemetry, "_initialized_pid", os.getpid())
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    child = context.Process(target=_serve_inherited_app, args=(results,))
+    child.start()
+    child.join(10)
+
+    assert child.exitcode == worker_telemetry.WORKER_BOOT_ERROR
+    assert results.empty()
@@ -0,0 +1,287 @@
+# trace_index.py
+#
+# Trace-ID → log lines index over the JSON log segments written by
+# file_sink.py (or any JSON-lines file carrying otel_patcher's fields).
+#
+# Finding every log line of one Jaeger trace used to mean grepping every
+# segment. The index is a SQLite table keyed on (trace_id, segment, offset),
+# so a lookup is one B-tree descent plus the matching rows — it does not
+# grow with log volume. Lines are then read back with mmap slices.
+#
+# Once file_sink.py compresses a segment it reports the segment's frame
+# table (index_frames), and lookups decompress only the frames that hold the
+# trace's lines. Segments compressed without one are decompressed whole.
+#
+# Indexing is incremental: each segment remembers how many bytes were
+# indexed, so re-running `build` on a growing file only reads the new tail.
+#
+# Usage (from the chapter directory):
+#   uv run python -m trace_index build logs/
+#   uv run python -m trace_index lookup <trace_id> [--index logs/trace-index.sqlite]
+import argparse
+import bisect
+import gzip
+import mmap
+import re
+import sqlite3
+import sys
+from pathlib import Path
+
+import zstandard
+
+INDEX_FILENAME = "trace-index.sqlite"
+INVALID_TRACE_ID = b"0" * 32
+
+# Matches both JsonLogEncoder output and the older `"key": "value"` template.
+_TRACE_RE = re.compile(rb'"trace_id": ?"([0-9a-f]{32})"')
+_SPAN_RE = re.compile(rb'"span_id": ?"([0-9a-f]{16})"')
+_TRACE_ID_RE = re.compile(r"[0-9a-f]{32}")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS segments (
+    id            INTEGER PRIMARY KEY,
+    path          TEXT UNIQUE NOT NULL,
+    indexed_bytes INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS entries (
+    trace_id   BLOB NOT NULL,
+    segment_id INTEGER NOT NULL,
+    offset     INTEGER NOT NULL,
+    length     INTEGER NOT NULL,
+    span_id    BLOB NOT NULL,
+    PRIMARY KEY (trace_id, segment_id, offset)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS frames (
+    segment_id  INTEGER NOT NULL,
+    raw_offset  INTEGER NOT NULL,
+    file_offset INTEGER NOT NULL,
+    file_length INTEGER NOT NULL,
+    PRIMARY KEY (segment_id, raw_offset)
+) WITHOUT ROWID;
+"""
+
+
+class TraceIndex:
+    """On-disk trace_id → (segment, byte offset, length) index."""
+
+    def __init__(self, index_path: str | Path):
+        self.index_path = Path(index_path)
+        self._db = sqlite3.connect(self.index_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self._db.close()
+
+    # ──────────────────────────────────────────────
+    # Building
+    # ──────────────────────────────────────────────
+    def _segment(self, path: Path) -> tuple[int, int]:
+        """Return (segment id, indexed bytes), registering the segment if new."""
+        row = self._db.execute(
+            "SELECT id, indexed_bytes FROM segments WHERE path = ?", (str(path),)
+        ).fetchone()
+        if row is None:
+            segment_id = self._db.execute(
+                "INSERT INTO segments (path) VALUES (?)", (str(path),)
+            ).lastrowid
+            return segment_id, 0
+        return row
+
+    def index_file(self, path: str | Path) -> int:
+        """Index the not-yet-indexed tail of a JSON-lines file.
+
+        Returns the number of entries added. Only complete lines (ending
+        in a newline) are indexed, so a file that is still being written
+        can be indexed again later.
+        """
+        path = Path(path).resolve()
+        segment_id, start = self._segment(path)
+
+        size = path.stat().st_size
+        if size <= start:
+            return 0
+
+        entries = []
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            end = data.rfind(b"\n", start, size) + 1
+            if end <= start:
+                return 0  # no complete line yet
+            offset = start
+            while offset < end:
+                line_end = data.find(b"\n", offset, end) + 1
+                trace = _TRACE_RE.search(data, offset, line_end)
+                if trace is not None and trace.group(1) != INVALID_TRACE_ID:
+                    span = _SPAN_RE.search(data, offset, line_end)
+                    entries.append((
+                        bytes.fromhex(trace.group(1).decode()),
+                        segment_id,
+                        offset,
+                        line_end - offset,
+                        bytes.fromhex(span.group(1).decode()) if span else b"",
+                    ))
+                offset = line_end
+
+        with self._db:
+            self._db.executemany(
+                "INSERT OR IGNORE INTO entries VALUES (?, ?, ?, ?, ?)", entries
+            )
+            self._db.execute(
+                "UPDATE segments SET indexed_bytes = ? WHERE id = ?", (end, segment_id)
+            )
+        return len(entries)
+
+    def index_frames(self, path: str | Path, frames: list[tuple[int, int, int]]) -> None:
+        """Record the frame table of a compressed segment (file_sink.compress_file)."""
+        with self._db:
+            segment_id, _ = self._segment(Path(path).resolve())
+            self._db.executemany(
+                "INSERT OR REPLACE INTO frames VALUES (?, ?, ?, ?)",
+                [(segment_id, *frame) for frame in frames],
+            )
+
+    def index_directory(self, directory: str | Path) -> int:
+        """Index every uncompressed *.jsonl segment under `directory`."""
+        return sum(self.index_file(path) for path in sorted(Path(directory).glob("*.jsonl")))
+
+    # ──────────────────────────────────────────────
+    # Lookup
+    # ──────────────────────────────────────────────
+    def locate(self, trace_id: str) -> list[tuple[str, int, int, str]]:
+        """Return (segment path, offset, length, span_id) in write order."""
+        rows = self._db.execute(
+            """
+            SELECT s.path, e.offset, e.length, e.span_id
+            FROM entries e JOIN segments s ON s.id = e.segment_id
+            WHERE e.trace_id = ?
+            ORDER BY e.segment_id, e.offset
+            """,
+            (bytes.fromhex(trace_id),),
+        ).fetchall()
+        return [(path, offset, length, span.hex()) for path, offset, length, span in rows]
+
+    def frames(self, path: str) -> list[tuple[int, int, int]]:
+        """Return a segment's (raw offset, file offset, file length) frames."""
+        return self._db.execute(
+            """
+            SELECT f.raw_offset, f.file_offset, f.file_length
+            FROM frames f JOIN segments s ON s.id = f.segment_id
+            WHERE s.path = ?
+            ORDER BY f.raw_offset
+            """,
+            (path,),
+        ).fetchall()
+
+    def lookup(self, trace_id: str) -> list[bytes]:
+        """Return every log line of the trace, grouped by span in span order.
+
+        Spans are ordered by their first log line; lines within a span keep
+        their write order.
+        """
+        by_span: dict[str, list[bytes]] = {}
+        readers: dict[str, _SegmentReader] = {}
+        try:
+            for path, offset, length, span_id in self.locate(trace_id):
+                reader = readers.get(path)
+                if reader is None:
+                    reader = readers[path] = _SegmentReader(Path(path), self.frames)
+                by_span.setdefault(span_id, []).append(reader.read(offset, length))
+        finally:
+            for reader in readers.values():
+                reader.close()
+        return [line for lines in by_span.values() for line in lines]
+
+
+class _SegmentReader:
+    """mmap a segment; once compressed, decompress the frame holding each
+    requested line (or the whole file when it has no frame table)."""
+
+    def __init__(self, path: Path, frames_for):
+        self._file = None
+        self._map = None
+        self._frames = None
+        self._frame = -1
+        self._data_offset = 0  # offset of self._data in the uncompressed segment
+        if path.exists():
+            self._file = open(path, "rb")
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._data = self._map
+            return
+        compressed, decompress = _compressed_copy(path)
+        frames = frames_for(str(path))
+        if frames:
+            self._file = open(compressed, "rb")
+            self._frames = frames
+            self._starts = [raw_offset for raw_offset, _, _ in frames]
+            self._decompress = decompress
+            self._data = b""
+        elif compressed.suffix == ".gz":
+            self._data = gzip.decompress(compressed.read_bytes())
+        else:
+            with open(compressed, "rb") as f:
+                self._data = zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True).read()
+
+    def read(self, offset: int, length: int) -> bytes:
+        if self._frames is not None:
+            # Lines never span frames, and entries come in offset order.
+            frame = bisect.bisect_right(self._starts, offset) - 1
+            if frame != self._frame:
+                raw_offset, file_offset, file_length = self._frames[frame]
+                self._file.seek(file_offset)
+                self._data = self._decompress(self._file.read(file_length))
+                self._frame, self._data_offset = frame, raw_offset
+        start = offset - self._data_offset
+        return self._data[start:start + length]
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+        if self._file is not None:
+            self._file.close()
+
+
+def _compressed_copy(path: Path):
+    """Return (compressed file, frame decompressor) for a segment that is gone."""
+    gz = path.with_name(path.name + ".gz")
+    if gz.exists():
+        return gz, gzip.decompress
+    zst = path.with_name(path.name + ".zst")
+    if zst.exists():
+        return zst, zstandard.ZstdDecompressor().decompress
+    raise FileNotFoundError(f"segment {path} is gone (and no .gz/.zst copy was found)")
+
+
+# ──────────────────────────────────────────────
+# CLI
+# ──────────────────────────────────────────────
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Trace-ID index over JSON log segments")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="index new lines in a segment directory")
+    build.add_argument("directory")
+    build.add_argument("--index", help=f"index file (default: <directory>/{INDEX_FILENAME})")
+
+    lookup = commands.add_parser("lookup", help="print all log lines of a trace")
+    lookup.add_argument("trace_id")
+    lookup.add_argument("--index", default=f"logs/{INDEX_FILENAME}")
+
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        index = TraceIndex(args.index or Path(args.directory) / INDEX_FILENAME)
+        added = index.index_directory(args.directory)
+        print(f"indexed {added} lines", file=sys.stderr)
+    else:
+        trace_id = args.trace_id.lower()
+        if not _TRACE_ID_RE.fullmatch(trace_id):
+            parser.error(f"invalid trace_id {args.trace_id!r}: expected 32 hex digits")
+        index = TraceIndex(args.index)
+        for line in index.lookup(trace_id):
+            sys.stdout.buffer.write(line)
+    index.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+# worker_telemetry.py
+#
+# Per-worker OpenTelemetry setup for multi-process serving (serve.py).
+#
+# `opentelemetry-instrument uvicorn ... --workers N` sets up telemetry in the
+# wrong place. Either the supervisor builds the providers and the workers
+# inherit them across fork, with dead export threads, locks that may be held
+# and already-counted metric state. Or every worker reports under the same
+# resource, so their cumulative counters overwrite each other as one series
+# in Prometheus. Here each worker instead:
+#
+#   • claims a slot (0, 1, 2, …) by locking slot-<n>.lock in a runtime
+#     directory. The lock dies with the process, so a restarted worker reuses
+#     its slot and Prometheus sees the same `instance` again, not a new series
+#   • sets service.instance.id = <host>-<port>-w<slot> in
+#     OTEL_RESOURCE_ATTRIBUTES; the Collector's prometheus exporter turns it
+#     into the `instance` label, so sum(rate(...)) adds workers up correctly
+#   • gives EXPORT_DISK_QUEUE_DIR, OTLP_CAPTURE_DIR and LOG_FILE_DIR a
+#     worker-<slot> subdirectory, so no two processes append to the same files
+#   • runs the same auto-instrumentation as opentelemetry-instrument, in the
+#     worker, before the service module is imported
+#
+# create_app() is the app factory for uvicorn (serve.py) or gunicorn without
+# --preload. A process that initialized telemetry must not fork: the child
+# would export through the parent's providers, whose threads did not survive
+# the fork, under the parent's service.instance.id. With gunicorn --preload
+# the master calls create_app() once and forks the workers from it, so the
+# fork hook exits the child with status 3 — gunicorn's "worker failed to
+# boot" code, which stops the master instead of respawning forever.
+# Processes started with spawn (multiprocessing, subprocess) are unaffected.
+import fcntl
+import importlib
+import os
+import socket
+import sys
+import tempfile
+from pathlib import Path
+
+WORKER_BOOT_ERROR = 3  # gunicorn halts when a worker exits with this code
+
+_initialized_pid: int | None = None
+_slot_lock = None
+
+
+def claim_worker_slot(runtime_dir: str | Path, limit: int = 256):
+    """Lock the lowest free slot in `runtime_dir`; return (slot, lock file).
+
+    The slot stays claimed while the returned file is open.
+    """
+    runtime_dir = Path(runtime_dir)
+    runtime_dir.mkdir(parents=True, exist_ok=True)
+    for slot in range(limit):
+        lock = open(runtime_dir / f"slot-{slot}.lock", "w")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            continue
+        return slot, lock
+    raise RuntimeError(f"no free worker slot in {runtime_dir}")
+
+
+def _per_worker_dir(name: str, slot: int) -> None:
+    base = os.getenv(name)
+    if base:
+        os.environ[name] = str(Path(base) / f"worker-{slot}")
+
+
+def init_worker_telemetry(service_name: str, port: int | str = 0, runtime_dir: str | None = None) -> int:
+    """Set up this worker's providers and instrumentation; return its slot."""
+    global _initialized_pid, _slot_lock
+    if _initialized_pid == os.getpid():
+        raise RuntimeError("telemetry is already initialized in this worker")
+
+    runtime_dir = runtime_dir or os.getenv("SERVE_RUNTIME_DIR") or os.path.join(
+        tempfile.gettempdir(), f"{service_name}-{port}"
+    )
+    slot, _slot_lock = claim_worker_slot(runtime_dir)
+    instance_id = f"{socket.gethostname()}-{port}-w{slot}"
+    attributes = os.getenv("OTEL_RESOURCE_ATTRIBUTES", "")
+    os.environ["OTEL_RESOURCE_ATTRIBUTES"] = ",".join(
+        filter(None, [attributes, f"service.instance.id={instance_id}"])
+    )
+    os.environ["OTEL_SERVICE_NAME"] = service_name
+    _per_worker_dir("EXPORT_DISK_QUEUE_DIR", slot)
+    _per_worker_dir("OTLP_CAPTURE_DIR", slot)
+    _per_worker_dir("LOG_FILE_DIR", slot)
+
+    from opentelemetry.instrumentation import auto_instrumentation
+
+    auto_instrumentation.initialize()
+    _initialized_pid = os.getpid()
+    return slot
+
+
+def _after_fork_in_child() -> None:
+    if _initialized_pid is None:
+        return
+    sys.stderr.write(
+        "worker_telemetry: telemetry was initialized before this process forked "
+        "(gunicorn --preload?); start workers without preloading the app\n"
+    )
+    sys.stderr.flush()
+    os._exit(WORKER_BOOT_ERROR)
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def create_app():
+    """App factory: initialize telemetry, then import SERVE_APP (module:attr)."""
+    init_worker_telemetry(os.environ["SERVE_SERVICE_NAME"], os.getenv("SERVE_PORT", "0"))
+    module, _, attribute = os.environ["SERVE_APP"].partition(":")
+    return getattr(importlib.import_module(module), attribute or "app")
@@ -0,0 +1,195 @@
+# bench_context_scale.py
+#
+# Context propagation at 10k–100k concurrent requests: cost and isolation.
+#
+# Usage (from the chapter directory):
+#   uv run python -m benchmarks.bench_context_scale [--tasks 10000 50000 100000] [--thread-ratio 0.2]
+#
+# Each task mirrors handle_request() in final.py: set request_id_var, log,
+# await, hop to a thread pool (for --thread-ratio of the tasks), log again.
+# Two variants run the same workload:
+#   • explicit   — no ContextVar: request_id is passed along as an argument
+#                  and bound on each log call; thread hops go straight to
+#                  run_in_executor
+#   • contextvar — request_id_var + context_patcher + run_in_thread
+#                  (copy_context() and ctx.run on every hop)
+# The difference is what the propagation path costs per task. Every log line
+# also carries the ID the task expects, and the sink counts lines whose
+# patched request_id is missing or belongs to another request.
+#
+# Memory per task is measured in a separate run under tracemalloc (which
+# slows everything down), so it doesn't distort the timings.
+import argparse
+import asyncio
+import contextvars
+import sys
+import time
+import timeit
+import tracemalloc
+
+from loguru import logger
+
+from executors import get_pool, run_in_thread, shutdown_pools
+from request_context import context_patcher, request_id_var
+
+POOL = "bench"
+
+
+class IsolationSink:
+    """Loguru sink that only checks each line's request_id against the expected one."""
+
+    def __init__(self):
+        self.lines = 0
+        self.missing = 0
+        self.mismatched = 0
+
+    def write(self, message) -> None:
+        extra = message.record["extra"]
+        self.lines += 1
+        actual = extra.get("request_id")
+        if actual is None:
+            self.missing += 1
+        elif actual != extra["expected"]:
+            self.mismatched += 1
+
+
+def _blocking_step(expected: str) -> None:
+    logger.info("Processing in thread", expected=expected)
+
+
+async def handle_request_contextvar(request_id: str, hop: bool) -> float:
+    started = time.perf_counter()
+    token = request_id_var.set(request_id)
+    try:
+        logger.info("Started request", expected=request_id)
+        await asyncio.sleep(0)
+        if hop:
+            await run_in_thread(_blocking_step, request_id, pool=POOL)
+        logger.info("Finished request", expected=request_id)
+    finally:
+        request_id_var.reset(token)
+    return time.perf_counter() - started
+
+
+def _blocking_step_explicit(request_id: str) -> None:
+    logger.info("Processing in thread", request_id=request_id, expected=request_id)
+
+
+async def handle_request_explicit(request_id: str, hop: bool) -> float:
+    started = time.perf_counter()
+    logger.info("Started request", request_id=request_id, expected=request_id)
+    await asyncio.sleep(0)
+    if hop:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            get_pool(POOL)._pool, _blocking_step_explicit, request_id
+        )
+    logger.info("Finished request", request_id=request_id, expected=request_id)
+    return time.perf_counter() - started
+
+
+VARIANTS = {
+    "explicit": (handle_request_explicit, None),
+    "contextvar": (handle_request_contextvar, context_patcher),
+}
+
+
+def run_workload(variant: str, tasks: int, thread_ratio: float = 0.2, workers: int = 8) -> dict:
+    """Run `tasks` concurrent requests; return timings and the sink's isolation counts."""
+    handler, patcher = VARIANTS[variant]
+    sink = IsolationSink()
+    logger.remove()
+    logger.configure(patcher=patcher)
+    logger.add(sink, format="{message}", level="INFO")
+    get_pool(POOL, max_workers=workers, max_queue=tasks)
+    hop_every = round(1 / thread_ratio) if thread_ratio else 0
+
+    async def main():
+        return await asyncio.gather(*(
+            handler(f"req-{i}", bool(hop_every) and i % hop_every == 0)
+            for i in range(tasks)
+        ))
+
+    started = time.perf_counter()
+    try:
+        latencies = asyncio.run(main())
+    finally:
+        elapsed = time.perf_counter() - started
+        logger.remove()
+        logger.configure(patcher=None)
+        shutdown_pools()
+
+    latencies.sort()
+    return {
+        "tasks": tasks,
+        "elapsed_s": elapsed,
+        "per_task_us": elapsed / tasks * 1e6,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000,
+        "lines": sink.lines,
+        "missing": sink.missing,
+        "mismatched": sink.mismatched,
+    }
+
+
+def memory_per_task(variant: str, tasks: int, thread_ratio: float) -> float:
+    """Peak traced allocation per task, in bytes."""
+    tracemalloc.start()
+    try:
+        run_workload(variant, tasks, thread_ratio)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / tasks
+
+
+def micro() -> None:
+    """Per-call cost of the three pieces on the propagation path."""
+    request_id_var.set("req-micro")
+    ctx = contextvars.copy_context()
+    record = {"extra": {}}
+    rounds = 200_000
+    results = {
+        "copy_context()": timeit.timeit(contextvars.copy_context, number=rounds),
+        "context_patcher(record)": timeit.timeit(lambda: context_patcher(record), number=rounds),
+        "ctx.run(noop)": timeit.timeit(lambda: ctx.run(int), number=rounds),
+        "noop call (baseline)": timeit.timeit(lambda: int(), number=rounds),
+    }
+    for label, total in results.items():
+        print(f"  {label:<26} {total / rounds * 1e9:>8.0f} ns/call")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Context propagation at scale")
+    parser.add_argument("--tasks", type=int, nargs="+", default=[10_000, 50_000, 100_000])
+    parser.add_argument("--thread-ratio", type=float, default=0.2)
+    parser.add_argument("--skip-memory", action="store_true")
+    args = parser.parse_args()
+
+    print("micro-benchmarks:")
+    micro()
+    print(f"\nthread hops: {args.thread_ratio:.0%} of tasks\n")
+    print(f"{'variant':<11} {'tasks':>8} {'µs/task':>9} {'p50 ms':>9} {'p99 ms':>9} "
+          f"{'B/task':>8} {'lines':>9} {'leaks':>6}")
+    failed = False
+    for tasks in args.tasks:
+        baseline = None
+        for variant in VARIANTS:
+            result = run_workload(variant, tasks, args.thread_ratio)
+            memory = "-" if args.skip_memory else f"{memory_per_task(variant, tasks, args.thread_ratio):,.0f}"
+            leaks = result["missing"] + result["mismatched"] if variant == "contextvar" else 0
+            failed |= leaks > 0
+            overhead = ""
+            if baseline is not None:
+                overhead = f"  ({result['per_task_us'] - baseline:+.1f} µs/task)"
+            print(f"{variant:<11} {tasks:>8,} {result['per_task_us']:>9.1f} {result['p50_ms']:>9.1f} "
+                  f"{result['p99_ms']:>9.1f} {memory:>8} {result['lines']:>9,} {leaks:>6}{overhead}")
+            baseline = result["per_task_us"]
+    if failed:
+        print("\nFAIL: some log lines carried a missing or foreign request_id")
+        sys.exit(1)
+    print("\nOK: every log line carried its own request's ID")
+
+
+if __name__ == "__main__":
+    main()
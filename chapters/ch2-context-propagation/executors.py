@@ -0,0 +1,161 @@
+# executors.py
+#
+# Named, bounded thread pools that carry context into worker threads.
+#
+# `loop.run_in_executor(None, ...)` puts every blocking call on one shared
+# default executor: no size limit you chose, no isolation between kinds of
+# work, and no visibility when it backs up. A burst of
+# blocking_image_processing() calls can silently starve every other blocking
+# call in the process.
+#
+# ContextExecutor gives each kind of work its own pool:
+#   • bounded workers and a bounded queue; a submission over the limit is
+#     rejected with PoolSaturated instead of queueing forever
+#   • the caller's contextvars are copied into the worker, which covers
+#     request_id_var and the OpenTelemetry context (OTel keeps its current
+#     span in a ContextVar as well)
+#   • each call runs in a child span `<pool>.<function>` of the caller's span
+#   • metrics: executor.queue.wait, executor.run.duration, executor.rejections
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from opentelemetry import metrics, trace
+
+_tracer = trace.get_tracer(__name__)
+_meter = metrics.get_meter(__name__)
+_queue_wait = _meter.create_histogram(
+    name="executor.queue.wait",
+    description="Time a call waited for a worker thread",
+    unit="ms",
+)
+_run_duration = _meter.create_histogram(
+    name="executor.run.duration",
+    description="Time a call ran on a worker thread",
+    unit="ms",
+)
+_rejections = _meter.create_counter(
+    name="executor.rejections",
+    description="Calls rejected because the pool's queue was full",
+    unit="1",
+)
+
+
+class PoolSaturated(RuntimeError):
+    """Raised when a pool already has max_workers + max_queue calls pending."""
+
+
+class ContextExecutor:
+    """A named thread pool with a bounded queue and context propagation."""
+
+    def __init__(self, name: str, max_workers: int = 4, max_queue: int = 64):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._pending = 0  # queued + running
+
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.max_pending = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run `func(*args, **kwargs)` on this pool under the caller's context."""
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                _rejections.add(1, {"executor.pool": self.name})
+                raise PoolSaturated(
+                    f"pool {self.name!r} is full "
+                    f"({self.max_workers} workers, {self.max_queue} queued)"
+                )
+            self._pending += 1
+            self.submitted += 1
+            self.max_pending = max(self.max_pending, self._pending)
+
+        # CRITICAL: copy the context *here*, on the caller's task
+        ctx = contextvars.copy_context()
+        call = functools.partial(
+            ctx.run, self._invoke, time.perf_counter(), func, args, kwargs
+        )
+        future = self._pool.submit(call)
+        # Also runs when a queued call is cancelled and _invoke never does.
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def _release(self, _future) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    def _invoke(self, submitted_at: float, func, args, kwargs) -> Any:
+        started = time.perf_counter()
+        wait_ms = (started - submitted_at) * 1000
+        attributes = {"executor.pool": self.name}
+        try:
+            _queue_wait.record(wait_ms, attributes)
+            name = f"{self.name}.{getattr(func, '__name__', 'call')}"
+            with _tracer.start_as_current_span(name) as span:
+                span.set_attribute("executor.pool", self.name)
+                span.set_attribute("executor.queue_wait_ms", round(wait_ms, 3))
+                return func(*args, **kwargs)
+        finally:
+            run_ms = (time.perf_counter() - started) * 1000
+            _run_duration.record(run_ms, attributes)
+            with self._lock:
+                self.completed += 1
+                self.total_wait_ms += wait_ms
+                self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+
+    def stats(self) -> dict[str, float]:
+        with self._lock:
+            return {
+                "pending": self._pending,
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "completed": self.completed,
+                "max_pending": self.max_pending,
+                "avg_wait_ms": round(self.total_wait_ms / self.completed, 3)
+                if self.completed
+                else 0.0,
+                "max_wait_ms": round(self.max_wait_ms, 3),
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait)
+
+
+# ──────────────────────────────────────────────
+# Named pools
+# ──────────────────────────────────────────────
+_pools: dict[str, ContextExecutor] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(name: str = "default", max_workers: int = 4, max_queue: int = 64) -> ContextExecutor:
+    """Return the pool called `name`, creating it with these limits on first use."""
+    with _pools_lock:
+        pool = _pools.get(name)
+        if pool is None:
+            pool = _pools[name] = ContextExecutor(name, max_workers, max_queue)
+        return pool
+
+
+async def run_in_thread(func: Callable[..., Any], *args, pool: str = "default", **kwargs) -> Any:
+    """Run blocking `func` on the named pool, keeping request_id and the current span."""
+    return await get_pool(pool).run(func, *args, **kwargs)
+
+
+def shutdown_pools(wait: bool = True) -> None:
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=wait)
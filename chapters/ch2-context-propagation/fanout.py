@@ -0,0 +1,149 @@
+# fanout.py
+#
+# Bounded fan-out on top of asyncio.TaskGroup.
+#
+# `asyncio.gather(*tasks)` starts every coroutine at once. Fan out to 500
+# order lookups and you open 500 connections to a pool sized for 20.
+# BoundedTaskGroup is a TaskGroup with a limit:
+#   • at most `limit` children run at the same time (an asyncio.Semaphore);
+#     the rest wait their turn without holding a connection
+#   • children are tasks created from the caller's task, so they inherit its
+#     context: request_id_var and the OpenTelemetry current span
+#   • each child runs in its own span `<group>.<coroutine>`, a child of the
+#     caller's span, so a trace shows which child was the straggler
+#   • cancel_on_error=True (the TaskGroup default) cancels the siblings on the
+#     first failure; with False every child runs to completion and the
+#     failures are raised together as one ExceptionGroup at the end
+#   • per-batch metrics: fanout.size, fanout.max_concurrency and
+#     fanout.slowest_child.duration, plus the same values on the caller's span
+import asyncio
+import time
+from typing import Any, Coroutine
+
+from opentelemetry import metrics, trace
+
+_tracer = trace.get_tracer(__name__)
+_meter = metrics.get_meter(__name__)
+_size = _meter.create_histogram(
+    name="fanout.size",
+    description="Tasks started by one fan-out batch",
+    unit="1",
+)
+_max_concurrency = _meter.create_histogram(
+    name="fanout.max_concurrency",
+    description="Most tasks of one batch running at the same time",
+    unit="1",
+)
+_slowest = _meter.create_histogram(
+    name="fanout.slowest_child.duration",
+    description="Run time of the slowest task in a batch",
+    unit="ms",
+)
+
+
+class BoundedTaskGroup:
+    """An asyncio.TaskGroup that runs at most `limit` children at a time.
+
+    Usage:
+        async with BoundedTaskGroup("orders", limit=20) as group:
+            for order_id in order_ids:
+                group.create_task(fetch_order(order_id))
+        logger.info("Fan-out stats", **group.stats())
+    """
+
+    def __init__(self, name: str = "fanout", limit: int = 10, cancel_on_error: bool = True):
+        self.name = name
+        self.limit = limit
+        self.cancel_on_error = cancel_on_error
+        self._group = asyncio.TaskGroup()
+        self._semaphore = asyncio.Semaphore(limit)
+        self._running = 0
+
+        self.size = 0
+        self.max_concurrency = 0
+        self.slowest_child: str | None = None
+        self.slowest_ms = 0.0
+        self.errors: list[Exception] = []
+
+    async def __aenter__(self) -> "BoundedTaskGroup":
+        await self._group.__aenter__()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        try:
+            suppress = await self._group.__aexit__(exc_type, exc, tb)
+        finally:
+            self._record()
+        if self.errors and exc_type is None:
+            raise ExceptionGroup(
+                f"{len(self.errors)} of {self.size} tasks in {self.name!r} failed",
+                self.errors,
+            )
+        return suppress
+
+    def create_task(self, coro: Coroutine[Any, Any, Any], *, name: str | None = None) -> asyncio.Task:
+        """Schedule `coro`; it starts once one of the `limit` slots is free."""
+        name = name or getattr(coro, "__qualname__", "task")
+        self.size += 1
+        return self._group.create_task(self._run(coro, name), name=f"{self.name}.{name}")
+
+    async def _run(self, coro, name: str) -> Any:
+        try:
+            await self._semaphore.acquire()
+        except asyncio.CancelledError:
+            coro.close()  # never started: avoid "coroutine was never awaited"
+            raise
+        self._running += 1
+        self.max_concurrency = max(self.max_concurrency, self._running)
+        started = time.perf_counter()
+        try:
+            with _tracer.start_as_current_span(f"{self.name}.{name}") as span:
+                span.set_attribute("fanout.name", self.name)
+                return await coro
+        except Exception as e:
+            if self.cancel_on_error:
+                raise
+            self.errors.append(e)
+            return None
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if elapsed_ms > self.slowest_ms:
+                self.slowest_ms, self.slowest_child = elapsed_ms, name
+            self._running -= 1
+            self._semaphore.release()
+
+    def _record(self) -> None:
+        if not self.size:
+            return
+        attributes = {"fanout.name": self.name}
+        _size.record(self.size, attributes)
+        _max_concurrency.record(self.max_concurrency, attributes)
+        _slowest.record(self.slowest_ms, attributes)
+        span = trace.get_current_span()
+        span.set_attribute(f"fanout.{self.name}.size", self.size)
+        span.set_attribute(f"fanout.{self.name}.max_concurrency", self.max_concurrency)
+        if self.slowest_child is not None:
+            span.set_attribute(f"fanout.{self.name}.slowest_child", self.slowest_child)
+            span.set_attribute(f"fanout.{self.name}.slowest_child_ms", round(self.slowest_ms, 3))
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "size": self.size,
+            "limit": self.limit,
+            "max_concurrency": self.max_concurrency,
+            "failed": len(self.errors),
+            "slowest_child": self.slowest_child,
+            "slowest_ms": round(self.slowest_ms, 3),
+        }
+
+
+async def gather_bounded(
+    *coros: Coroutine[Any, Any, Any],
+    limit: int = 10,
+    name: str = "fanout",
+    cancel_on_error: bool = True,
+) -> list[Any]:
+    """Bounded drop-in for asyncio.gather: results in argument order."""
+    async with BoundedTaskGroup(name, limit, cancel_on_error) as group:
+        tasks = [group.create_task(coro) for coro in coros]
+    return [task.result() for task in tasks]
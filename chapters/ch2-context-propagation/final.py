@@ -1,32 +1,19 @@
 import asyncio
 import random
 import sys
-import os
-import contextvars
-import functools
 from loguru import logger
 from dotenv import load_dotenv
 
-load_dotenv()
-
-# 1. Define the ContextVar
-# This acts like a "Thread Local", but for Asyncio Tasks
-request_id_var = contextvars.ContextVar("request_id", default=None)
-
-# 2. Configure Logger
-# We need a 'patcher' to inject the ContextVar value into every log record
-def context_patcher(record):
-    rid = request_id_var.get()
-    if rid:
-        record["extra"]["request_id"] = rid
+from executors import get_pool, run_in_thread, shutdown_pools
+from fanout import BoundedTaskGroup
+from process_pool import get_process_pool, run_in_process, shutdown_process_pool
+from request_context import configure_logging, request_id_var
 
-# Configure logger with the patcher
-logger.configure(patcher=context_patcher)
+load_dotenv()
 
-# In production, use JSON serialization (same pattern as Ch1)
-if os.getenv("ENV") == "PROD":
-    logger.remove()  # Remove the default human-readable handler
-    logger.add(sys.stdout, serialize=True)
+# 1. The ContextVar and 2. the Loguru patcher that injects it into every
+# record live in request_context.py, so worker processes can import them too.
+configure_logging()
 
 async def process_database_query():
     # Simulate DB latency
@@ -45,16 +32,22 @@ def blocking_image_processing():
     rid = request_id_var.get()
     logger.info(f"Processing image in thread", thread_context_id=rid)
 
-async def run_in_thread(func, *args, **kwargs):
-    loop = asyncio.get_running_loop()
-    
-    # CRITICAL: Copy the current context
-    ctx = contextvars.copy_context()
-    
-    # Wrap the function execution with ctx.run
-    func_call = functools.partial(ctx.run, func, *args, **kwargs)
-    
-    return await loop.run_in_executor(None, func_call)
+def cpu_bound_thumbnail(image) -> str:
+    # This runs in a worker *process* (CPU-bound code, no GIL contention).
+    # Large images arrive through shared memory as a memoryview.
+    import hashlib
+    digest = hashlib.sha256(image).hexdigest()[:12]
+    logger.info("Generated thumbnail in process", size=len(image), digest=digest)
+    return digest
+
+# run_in_thread (executors.py) copies the current context, wraps the call
+# with ctx.run and submits it to a named, bounded pool instead of the
+# default executor. Image work gets its own pool so it can't starve others.
+get_pool("images", max_workers=4, max_queue=32)
+
+# Demo images are small and go through the pool's pipe. `python final.py
+# large-images` sends 2 MiB ones, which take the shared-memory path.
+IMAGE_BYTES = 2 << 20 if sys.argv[1:] == ["large-images"] else 16 << 10
 
 async def handle_request(request_id: str):
     # Set the ContextVar at the start of the request
@@ -66,8 +59,11 @@ async def handle_request(request_id: str):
         # Asyncio automatically propagates context to this child coroutine
         await process_database_query()
         
-        # Manually propagate context to thread pool
-        await run_in_thread(blocking_image_processing)
+        # Context is propagated to the thread pool by run_in_thread
+        await run_in_thread(blocking_image_processing, pool="images")
+
+        # ...and to a worker process by run_in_process (request_id + trace context)
+        await run_in_process(cpu_bound_thumbnail, random.randbytes(IMAGE_BYTES))
         
         logger.info("Finished request successfully")
         
@@ -77,10 +73,19 @@ async def handle_request(request_id: str):
 
 async def main():
     logger.info("Starting server simulation with ContextVars...")
+    await get_process_pool().warm()
     
-    tasks = [handle_request(f"req-{i}") for i in range(5)]
-    
-    await asyncio.gather(*tasks)
+    # Bounded fan-out instead of an unbounded asyncio.gather: at most 3
+    # requests in flight, each in its own span, stats for the whole batch.
+    async with BoundedTaskGroup("requests", limit=3) as group:
+        for i in range(5):
+            group.create_task(handle_request(f"req-{i}"), name=f"req-{i}")
+
+    logger.info("Fan-out stats", **group.stats())
+
+    logger.info("Thread pool stats", **get_pool("images").stats())
+    shutdown_pools()
+    shutdown_process_pool()
 
 if __name__ == "__main__":
     asyncio.run(main())
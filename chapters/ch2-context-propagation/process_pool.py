@@ -0,0 +1,220 @@
+# process_pool.py
+#
+# run_in_process(): the process-pool counterpart of run_in_thread().
+#
+# Threads don't help CPU-bound Python (image resizing, report generation)
+# because of the GIL; processes do. ContextVars, however, don't cross a
+# process boundary on their own. So run_in_process():
+#   • captures request_id_var and the W3C trace context (traceparent /
+#     tracestate) on the calling task
+#   • restores both in the worker before the call, so Loguru lines there
+#     carry the same request_id (and trace_id / span_id) and any span the
+#     worker starts joins the caller's trace
+#   • reuses a warm ProcessPoolExecutor (size and max tasks per child are
+#     configurable; warm() starts every worker up front)
+#   • passes large bytes-like arguments through multiprocessing.shared_memory
+#     instead of pickling them through the pool's pipe. The blocks are
+#     unlinked when the worker's call finishes, not when the awaiting task
+#     is cancelled: a call already running keeps using them.
+#
+# Functions must be importable (module-level) because workers are spawned.
+# Shared-memory arguments arrive as memoryviews that are only valid during
+# the call; copy them (bytes(view)) if the function keeps the data.
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Callable
+
+from loguru import logger
+from opentelemetry import context as otel_context
+from opentelemetry import propagate, trace
+
+from request_context import configure_logging, request_id_var
+
+# Arguments at least this large go through shared memory.
+SHM_THRESHOLD = 1 << 20  # 1 MiB
+
+
+class _SharedArg:
+    """Pickled in place of a large buffer: just the shared memory block's name."""
+
+    __slots__ = ("name", "size")
+
+    def __init__(self, name: str, size: int):
+        self.name = name
+        self.size = size
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # 3.13+
+    except TypeError:
+        # Spawned workers share the parent's resource tracker, which already
+        # knows this block; the parent's unlink() unregisters it once.
+        return shared_memory.SharedMemory(name=name)
+
+
+# ──────────────────────────────────────────────
+# Worker side
+# ──────────────────────────────────────────────
+def _init_worker(initializer: Callable[[], None] | None) -> None:
+    configure_logging()
+    if initializer is not None:
+        initializer()
+
+
+def _warm() -> int:
+    return os.getpid()
+
+
+def _call_with_context(func, request_id, carrier, args, kwargs):
+    """Restore request_id_var and the trace context, then run `func`."""
+    attached = []
+    views = []
+
+    def resolve(value):
+        if isinstance(value, _SharedArg):
+            shm = _attach(value.name)
+            attached.append(shm)
+            view = shm.buf[:value.size]
+            views.append(view)
+            return view
+        return value
+
+    args = [resolve(arg) for arg in args]
+    kwargs = {key: resolve(value) for key, value in kwargs.items()}
+
+    request_token = request_id_var.set(request_id)
+    parent = propagate.extract(carrier)
+    context_token = otel_context.attach(parent)
+    try:
+        tracer = trace.get_tracer(__name__)
+        name = f"process.{getattr(func, '__name__', 'call')}"
+        with tracer.start_as_current_span(name) as span:
+            span.set_attribute("process.pid", os.getpid())
+            span_context = span.get_span_context()
+            if not span_context.is_valid:
+                # No SDK in the worker: the span is a no-op, so log the
+                # caller's IDs from the extracted context instead.
+                span_context = trace.get_current_span(parent).get_span_context()
+            if not span_context.is_valid:
+                return func(*args, **kwargs)
+            with logger.contextualize(
+                trace_id=format(span_context.trace_id, "032x"),
+                span_id=format(span_context.span_id, "016x"),
+            ):
+                return func(*args, **kwargs)
+    finally:
+        otel_context.detach(context_token)
+        request_id_var.reset(request_token)
+        for view in views:
+            view.release()
+        for shm in attached:
+            shm.close()
+
+
+# ──────────────────────────────────────────────
+# Caller side
+# ──────────────────────────────────────────────
+class ContextProcessPool:
+    """A warm process pool that carries request and trace context into workers."""
+
+    def __init__(
+        self,
+        max_workers: int | None = None,
+        max_tasks_per_child: int | None = None,
+        shm_threshold: int = SHM_THRESHOLD,
+        initializer: Callable[[], None] | None = None,
+    ):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.shm_threshold = shm_threshold
+        # spawn: max_tasks_per_child can't be used with fork, and fork would
+        # copy the parent's threads' locks into the child.
+        self._pool = ProcessPoolExecutor(
+            self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(initializer,),
+            max_tasks_per_child=max_tasks_per_child,
+        )
+
+    async def warm(self) -> set[int]:
+        """Start every worker now, so the first requests don't pay for spawning."""
+        loop = asyncio.get_running_loop()
+        pids = await asyncio.gather(
+            *(loop.run_in_executor(self._pool, _warm) for _ in range(self.max_workers))
+        )
+        return set(pids)
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run `func(*args, **kwargs)` in a worker under the caller's context."""
+        carrier: dict[str, str] = {}
+        propagate.inject(carrier)  # traceparent / tracestate of the current span
+
+        blocks: list[shared_memory.SharedMemory] = []
+
+        def share(value):
+            if (
+                isinstance(value, (bytes, bytearray, memoryview))
+                and len(value) >= self.shm_threshold
+            ):
+                shm = shared_memory.SharedMemory(create=True, size=len(value))
+                shm.buf[:len(value)] = value
+                blocks.append(shm)
+                return _SharedArg(shm.name, len(value))
+            return value
+
+        try:
+            args = tuple(share(arg) for arg in args)
+            kwargs = {key: share(value) for key, value in kwargs.items()}
+            future = self._pool.submit(
+                _call_with_context, func, request_id_var.get(), carrier, args, kwargs
+            )
+        except BaseException:
+            _release(blocks)
+            raise
+        if blocks:
+            # Runs when the call finishes or is cancelled before it starts.
+            future.add_done_callback(lambda _future: _release(blocks))
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait)
+
+
+def _release(blocks: list[shared_memory.SharedMemory]) -> None:
+    for shm in blocks:
+        shm.close()
+        shm.unlink()
+
+
+_default_pool: ContextProcessPool | None = None
+
+
+def get_process_pool(
+    max_workers: int | None = None, max_tasks_per_child: int | None = None
+) -> ContextProcessPool:
+    """Return the shared pool, creating it with these settings on first use.
+
+    Defaults come from PROCESS_POOL_SIZE and PROCESS_POOL_MAX_TASKS_PER_CHILD.
+    """
+    global _default_pool
+    if _default_pool is None:
+        size = max_workers or int(os.getenv("PROCESS_POOL_SIZE", "0")) or None
+        tasks = max_tasks_per_child or int(os.getenv("PROCESS_POOL_MAX_TASKS_PER_CHILD", "0")) or None
+        _default_pool = ContextProcessPool(size, tasks)
+    return _default_pool
+
+
+async def run_in_process(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run CPU-bound `func` in the shared process pool, keeping request_id and the trace."""
+    return await get_process_pool().run(func, *args, **kwargs)
+
+
+def shutdown_process_pool(wait: bool = True) -> None:
+    global _default_pool
+    if _default_pool is not None:
+        _default_pool.shutdown(wait=wait)
+        _default_pool = None
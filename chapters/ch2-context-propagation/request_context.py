@@ -0,0 +1,32 @@
+# request_context.py
+#
+# The request ContextVar and Loguru setup from final.py, in a module of their
+# own so that worker processes (process_pool.py) can import them without
+# running the demo.
+import contextvars
+import os
+import sys
+
+from loguru import logger
+
+# 1. Define the ContextVar
+# This acts like a "Thread Local", but for Asyncio Tasks
+request_id_var = contextvars.ContextVar("request_id", default=None)
+
+
+# 2. Configure Logger
+# We need a 'patcher' to inject the ContextVar value into every log record
+def context_patcher(record):
+    rid = request_id_var.get()
+    if rid:
+        record["extra"]["request_id"] = rid
+
+
+def configure_logging() -> None:
+    # Configure logger with the patcher
+    logger.configure(patcher=context_patcher)
+
+    # In production, use JSON serialization (same pattern as Ch1)
+    if os.getenv("ENV") == "PROD":
+        logger.remove()  # Remove the default human-readable handler
+        logger.add(sys.stdout, serialize=True)
@@ -0,0 +1,9 @@
+from benchmarks.bench_context_scale import run_workload
+
+
+def test_no_log_line_carries_another_requests_id_under_load():
+    result = run_workload("contextvar", tasks=5_000, thread_ratio=0.5)
+
+    assert result["lines"] == 5_000 * 2 + 2_500
+    assert result["missing"] == 0
+    assert result["mismatched"] == 0
@@ -0,0 +1,108 @@
+import asyncio
+import contextvars
+import threading
+
+import pytest
+
+from executors import ContextExecutor, PoolSaturated
+
+request_id_var = contextvars.ContextVar("request_id", default=None)
+
+
+def test_context_reaches_worker_and_stats_are_kept():
+    pool = ContextExecutor("test", max_workers=2, max_queue=4)
+
+    async def handle(request_id):
+        request_id_var.set(request_id)
+        return await pool.run(lambda: (request_id_var.get(), threading.current_thread().name))
+
+    async def main():
+        return await asyncio.gather(*(handle(f"req-{i}") for i in range(6)))
+
+    results = asyncio.run(main())
+    pool.shutdown()
+
+    assert [rid for rid, _ in results] == [f"req-{i}" for i in range(6)]
+    assert all(name.startswith("test") for _, name in results)
+    stats = pool.stats()
+    assert stats["completed"] == 6
+    assert stats["pending"] == 0
+
+
+def test_full_pool_rejects_instead_of_queueing():
+    pool = ContextExecutor("tiny", max_workers=1, max_queue=1)
+    gate = threading.Event()
+
+    async def main():
+        first = asyncio.ensure_future(pool.run(gate.wait, 5))
+        second = asyncio.ensure_future(pool.run(gate.wait, 5))
+        await asyncio.sleep(0)
+        with pytest.raises(PoolSaturated):
+            await pool.run(gate.wait, 5)
+        gate.set()
+        await asyncio.gather(first, second)
+
+    asyncio.run(main())
+    pool.shutdown()
+    assert pool.stats()["rejected"] == 1
+    assert pool.stats()["completed"] == 2
+
+
+def test_cancelled_queued_calls_free_their_slots():
+    pool = ContextExecutor("cancel", max_workers=1, max_queue=2)
+    gate = threading.Event()
+
+    async def main():
+        running = asyncio.ensure_future(pool.run(gate.wait, 5))
+        queued = [asyncio.ensure_future(pool.run(gate.wait, 5)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        for task in queued:
+            task.cancel()
+        await asyncio.gather(*queued, return_exceptions=True)
+        gate.set()
+        await running
+        # All three slots are free again.
+        await asyncio.gather(*(pool.run(lambda: None) for _ in range(3)))
+
+    asyncio.run(main())
+    pool.shutdown()
+    stats = pool.stats()
+    assert stats["pending"] == 0
+    assert stats["completed"] == 4
+    assert stats["rejected"] == 0
+
+
+def test_each_call_gets_a_child_span_of_the_caller():
+    from opentelemetry import trace
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    tracer = provider.get_tracer(__name__)
+    pool = ContextExecutor("images", max_workers=1)
+
+    def resize():
+        return trace.get_current_span().get_span_context().trace_id
+
+    async def main():
+        with tracer.start_as_current_span("handle_request") as parent:
+            return parent.get_span_context().trace_id, await pool.run(resize)
+
+    # Route the executor's module tracer through this provider.
+    import executors
+
+    original = executors._tracer
+    executors._tracer = tracer
+    try:
+        parent_trace_id, child_trace_id = asyncio.run(main())
+    finally:
+        executors._tracer = original
+        pool.shutdown()
+
+    spans = {span.name: span for span in exporter.get_finished_spans()}
+    assert child_trace_id == parent_trace_id
+    assert spans["images.resize"].parent.span_id == spans["handle_request"].context.span_id
+    assert "executor.queue_wait_ms" in spans["images.resize"].attributes
@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+from fanout import BoundedTaskGroup, gather_bounded
+from request_context import request_id_var
+
+
+def test_limit_is_respected_and_context_reaches_children():
+    async def child(i):
+        await asyncio.sleep(0.01 * (i % 3))
+        return request_id_var.get(), i
+
+    async def main():
+        request_id_var.set("req-1")
+        async with BoundedTaskGroup("test", limit=3) as group:
+            tasks = [group.create_task(child(i), name=f"child-{i}") for i in range(10)]
+        return group, [task.result() for task in tasks]
+
+    group, results = asyncio.run(main())
+
+    assert results == [("req-1", i) for i in range(10)]
+    stats = group.stats()
+    assert stats["size"] == 10
+    assert stats["max_concurrency"] == 3
+    assert stats["slowest_child"] in {f"child-{i}" for i in range(10) if i % 3 == 2}
+
+
+def test_first_failure_cancels_siblings():
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def boom():
+        raise ValueError("boom")
+
+    async def main():
+        async with BoundedTaskGroup("test", limit=5) as group:
+            group.create_task(slow())
+            group.create_task(slow())
+            group.create_task(boom())
+
+    with pytest.raises(ExceptionGroup) as info:
+        asyncio.run(main())
+    assert info.group_contains(ValueError)
+    assert len(cancelled) == 2
+
+
+def test_without_cancel_every_child_finishes_and_errors_are_grouped():
+    async def ok(i):
+        await asyncio.sleep(0.01)
+        return i
+
+    async def boom():
+        raise ValueError("boom")
+
+    async def main():
+        return await gather_bounded(ok(1), boom(), ok(2), limit=1, cancel_on_error=False)
+
+    with pytest.raises(ExceptionGroup) as info:
+        asyncio.run(main())
+    assert [type(e) for e in info.value.exceptions] == [ValueError]
+    assert asyncio.run(gather_bounded(ok(1), ok(2), limit=1)) == [1, 2]
+
+
+def test_children_get_their_own_span_under_the_caller(monkeypatch):
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+    import fanout
+
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    tracer = provider.get_tracer("test")
+
+    async def child():
+        await asyncio.sleep(0)
+
+    async def main():
+        with tracer.start_as_current_span("parent"):
+            async with BoundedTaskGroup("batch", limit=2) as group:
+                group.create_task(child(), name="a")
+                group.create_task(child(), name="b")
+
+    monkeypatch.setattr(fanout, "_tracer", tracer)
+    asyncio.run(main())
+
+    spans = {span.name: span for span in exporter.get_finished_spans()}
+    parent = spans["parent"]
+    assert {"batch.a", "batch.b"} <= spans.keys()
+    assert spans["batch.a"].parent.span_id == parent.context.span_id
+    assert parent.attributes["fanout.batch.size"] == 2
@@ -0,0 +1,121 @@
+import asyncio
+import hashlib
+import os
+import time
+
+import pytest
+from opentelemetry import trace
+
+from process_pool import ContextProcessPool
+from request_context import request_id_var
+
+
+# Worker functions live at module level: spawned workers import them by name.
+def whoami():
+    from opentelemetry import trace
+
+    span_context = trace.get_current_span().get_span_context()
+    return request_id_var.get(), format(span_context.trace_id, "032x")
+
+
+def describe(data):
+    return type(data).__name__, hashlib.sha256(data).hexdigest()
+
+
+def pid():
+    return os.getpid()
+
+
+def slow_digest(data):
+    time.sleep(0.5)
+    return hashlib.sha256(data).hexdigest()
+
+
+def test_request_id_and_trace_context_reach_the_worker():
+    parent = trace.NonRecordingSpan(
+        trace.SpanContext(
+            trace_id=0x4BF92F3577B34DA6A3CE929D0E0E4736,
+            span_id=0x00F067AA0BA902B7,
+            is_remote=False,
+            trace_flags=trace.TraceFlags(trace.TraceFlags.SAMPLED),
+        )
+    )
+    pool = ContextProcessPool(max_workers=1)
+
+    async def handle(request_id):
+        request_id_var.set(request_id)
+        with trace.use_span(parent):
+            return await pool.run(whoami)
+
+    async def main():
+        await pool.warm()
+        return await asyncio.gather(*(handle(f"req-{i}") for i in range(3)))
+
+    try:
+        results = asyncio.run(main())
+    finally:
+        pool.shutdown()
+
+    assert [rid for rid, _ in results] == ["req-0", "req-1", "req-2"]
+    assert {trace_id for _, trace_id in results} == {"4bf92f3577b34da6a3ce929d0e0e4736"}
+
+
+def test_large_arguments_go_through_shared_memory():
+    pool = ContextProcessPool(max_workers=1, shm_threshold=1024)
+    big = os.urandom(64 * 1024)
+
+    async def main():
+        return await pool.run(describe, big), await pool.run(describe, b"small")
+
+    try:
+        (big_type, big_digest), (small_type, _) = asyncio.run(main())
+    finally:
+        pool.shutdown()
+
+    assert big_type == "memoryview"
+    assert big_digest == hashlib.sha256(big).hexdigest()
+    assert small_type == "bytes"
+
+
+@pytest.mark.skipif(not os.path.isdir("/dev/shm"), reason="needs POSIX shared memory in /dev/shm")
+def test_shared_memory_outlives_a_cancelled_caller():
+    pool = ContextProcessPool(max_workers=1, shm_threshold=1024)
+    big = os.urandom(64 * 1024)
+
+    def blocks():
+        return {name for name in os.listdir("/dev/shm") if name.startswith("psm_")}
+
+    async def main():
+        await pool.warm()
+        before = blocks()
+        task = asyncio.ensure_future(pool.run(slow_digest, big))
+        await asyncio.sleep(0.2)  # the worker is inside the call now
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        during = blocks() - before
+        digest = await pool.run(describe, b"small")  # queued behind the running call
+        return during, blocks() - before, digest
+
+    try:
+        during, after, (small_type, _) = asyncio.run(main())
+    finally:
+        pool.shutdown()
+
+    assert len(during) == 1  # still linked while the worker reads it
+    assert after == set()
+    assert small_type == "bytes"
+
+
+def test_workers_are_recycled_after_max_tasks_per_child():
+    pool = ContextProcessPool(max_workers=1, max_tasks_per_child=1)
+
+    async def main():
+        return [await pool.run(pid) for _ in range(3)]
+
+    try:
+        pids = asyncio.run(main())
+    finally:
+        pool.shutdown()
+
+    assert len(set(pids)) == 3
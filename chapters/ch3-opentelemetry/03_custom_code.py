@@ -11,37 +11,14 @@ load_dotenv()
 
 # OTel Imports
 from opentelemetry import trace
-from opentelemetry.sdk.resources import Resource
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
 from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
 
-# 1. Setup OTel Provider
-resource = Resource.create({
-    "service.name": "custom-code-service",
-    "instrumentation.level": "custom"
-})
-provider = TracerProvider(resource=resource)
-
-# Export to OTLP if configured, otherwise Console
-otlp_endpoint = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
-if otlp_endpoint:
-    is_insecure = os.getenv("OTEL_EXPORTER_OTLP_INSECURE", "false").lower() == "true"
-    
-    # Simple logic: If port ends in 18 or 20, use HTTP. Otherwise gRPC.
-    if otlp_endpoint.endswith(":4318") or otlp_endpoint.endswith(":4320"):
-        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
-        exporter = OTLPSpanExporter(endpoint=f"{otlp_endpoint}/v1/traces" if "/v1/traces" not in otlp_endpoint else otlp_endpoint)
-    else:
-        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
-        exporter = OTLPSpanExporter(endpoint=otlp_endpoint, insecure=is_insecure)
-else:
-    from opentelemetry.sdk.trace.export import ConsoleSpanExporter
-    exporter = ConsoleSpanExporter()
+from telemetry import setup_telemetry
 
-processor = BatchSpanProcessor(exporter)
-provider.add_span_processor(processor)
-trace.set_tracer_provider(provider)
+# 1. Setup OTel Provider
+# Protocol, compression, endpoint and batching come from the environment
+# (see telemetry.py and .env.example).
+telemetry = setup_telemetry("custom-code-service", {"instrumentation.level": "custom"})
 
 tracer = trace.get_tracer(__name__)
 
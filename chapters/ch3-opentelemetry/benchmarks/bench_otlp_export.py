@@ -0,0 +1,152 @@
+# bench_otlp_export.py
+#
+# OTLP span export throughput and client CPU across protocol × compression.
+#
+# Usage (from the chapter directory):
+#   uv run python -m benchmarks.bench_otlp_export [--batches 20] [--batch-size 512] [--prompt-chars 2000]
+#
+# Spans carry llm.prompt / llm.completion attributes of realistic size.
+# Exporters come from telemetry.build_exporter(), so this measures what the
+# examples run. Each batch is sent with exporter.export() to a local OTLP
+# receiver (gRPC and HTTP) running in a separate process, so client CPU
+# (time.process_time, exporter threads included) isn't mixed with the
+# receiver's. Payload sizes are the encoded request, raw and gzipped.
+import argparse
+import gzip
+import multiprocessing
+import random
+import time
+from concurrent import futures
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from opentelemetry.exporter.otlp.proto.common.trace_encoder import encode_spans
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor, SpanExporter, SpanExportResult
+
+from telemetry import GRPC, GZIP, HTTP, NONE, build_exporter
+
+WORDS = (
+    "the order service returned a timeout while the gateway retried the checkout "
+    "request for the customer and the inventory check reported low stock on the "
+    "widget so the model should summarise the incident and suggest a remediation"
+).split()
+
+
+class _Collect(SpanExporter):
+    def __init__(self):
+        self.spans = []
+
+    def export(self, spans):
+        self.spans.extend(spans)
+        return SpanExportResult.SUCCESS
+
+
+def make_spans(count: int, prompt_chars: int) -> list:
+    rng = random.Random(7)
+    collect = _Collect()
+    provider = TracerProvider(resource=Resource.create({"service.name": "bench"}))
+    provider.add_span_processor(SimpleSpanProcessor(collect))
+    tracer = provider.get_tracer(__name__)
+
+    def text(chars):
+        words = []
+        while sum(len(w) + 1 for w in words) < chars:
+            words.append(rng.choice(WORDS))
+        return " ".join(words)
+
+    for i in range(count):
+        with tracer.start_as_current_span("llm.generate") as span:
+            span.set_attribute("llm.model", "gpt-4o-mini")
+            span.set_attribute("llm.prompt", text(prompt_chars))
+            span.set_attribute("llm.completion", text(prompt_chars // 2))
+            span.set_attribute("llm.tokens.total", rng.randint(200, 2000))
+            span.set_attribute("request.id", f"req-{i}")
+    return collect.spans
+
+
+# ──────────────────────────────────────────────
+# Receiver (separate process)
+# ──────────────────────────────────────────────
+class _HttpReceiver(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, as a Collector would
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-protobuf")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def _serve(ports) -> None:
+    import grpc
+    from opentelemetry.proto.collector.trace.v1 import trace_service_pb2, trace_service_pb2_grpc
+
+    class GrpcReceiver(trace_service_pb2_grpc.TraceServiceServicer):
+        def Export(self, request, context):
+            return trace_service_pb2.ExportTraceServiceResponse()
+
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+    trace_service_pb2_grpc.add_TraceServiceServicer_to_server(GrpcReceiver(), server)
+    grpc_port = server.add_insecure_port("127.0.0.1:0")
+    server.start()
+    http_server = ThreadingHTTPServer(("127.0.0.1", 0), _HttpReceiver)
+    ports.put((grpc_port, http_server.server_address[1]))
+    http_server.serve_forever()
+
+
+# ──────────────────────────────────────────────
+# Client
+# ──────────────────────────────────────────────
+def bench(protocol: str, compression: str, port: int, batches: list) -> tuple[float, float]:
+    settings = {"endpoint": f"http://127.0.0.1:{port}", "protocol": protocol, "compression": compression, "insecure": True}
+    exporter = build_exporter("traces", settings)
+    exporter.export(batches[0])  # connect / warm up
+    spans = sum(len(batch) for batch in batches)
+    wall, cpu = time.perf_counter(), time.process_time()
+    for batch in batches:
+        result = exporter.export(batch)
+        if result is not SpanExportResult.SUCCESS:
+            raise RuntimeError(f"{protocol}/{compression} export failed")
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    exporter.shutdown()
+    return spans / wall, cpu / spans * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="OTLP export: protocol × compression")
+    parser.add_argument("--batches", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=512)
+    parser.add_argument("--prompt-chars", type=int, default=2000)
+    args = parser.parse_args()
+
+    spans = make_spans(args.batch_size, args.prompt_chars)
+    batches = [spans] * args.batches
+    payload = encode_spans(spans).SerializeToString()
+    print(
+        f"{args.batches} batches × {args.batch_size} spans, prompt ≈ {args.prompt_chars} chars\n"
+        f"batch payload: {len(payload) / 1024:,.0f} KiB raw, "
+        f"{len(gzip.compress(payload)) / 1024:,.0f} KiB gzip\n"
+    )
+
+    ctx = multiprocessing.get_context("spawn")
+    ports = ctx.Queue()
+    receiver = ctx.Process(target=_serve, args=(ports,), daemon=True)
+    receiver.start()
+    grpc_port, http_port = ports.get(timeout=30)
+    try:
+        print(f"{'protocol':<14} {'compression':<12} {'spans/s':>10} {'client CPU µs/span':>20}")
+        for protocol, port in ((GRPC, grpc_port), (HTTP, http_port)):
+            for compression in (NONE, GZIP):
+                rate, cpu = bench(protocol, compression, port, batches)
+                print(f"{protocol:<14} {compression:<12} {rate:>10,.0f} {cpu:>20.1f}")
+    finally:
+        receiver.terminate()
+
+
+if __name__ == "__main__":
+    main()
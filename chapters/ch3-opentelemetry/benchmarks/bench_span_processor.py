@@ -0,0 +1,126 @@
+# bench_span_processor.py
+#
+# BatchSpanProcessor vs RingBufferSpanProcessor: on_end cost on the request
+# path, spans/sec, and how many spans each one drops.
+#
+# Usage (from the chapter directory):
+#   uv run python -m benchmarks.bench_span_processor [--spans 200000] [--threads 1 4] [--export-ms 2] [--work-us 20]
+#
+# Producers call processor.on_end() directly with finished spans, timing
+# every call, so the numbers are the processor's own cost and not span
+# creation. Between spans each producer busy-waits --work-us to stand in for
+# the request's own work; with --work-us 0 producers run flat out and the
+# export thread barely gets the GIL, so both processors mostly drop. The
+# exporter sleeps --export-ms per batch to stand in for the network round
+# trip. Both processors get the same total queue size (2048):
+# the ring's capacity is per producer thread, so each ring gets 2048/threads
+# slots. Batch size (512) and schedule delay (5 s) are the same too.
+import argparse
+import statistics
+import threading
+import time
+
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, SpanExporter, SpanExportResult
+
+from ring_processor import RingBufferSpanProcessor
+
+QUEUE_SIZE = 2048  # total, for both processors
+
+
+class SleepyExporter(SpanExporter):
+    def __init__(self, export_ms: float):
+        self.delay = export_ms / 1000
+        self.exported = 0
+
+    def export(self, spans):
+        time.sleep(self.delay)
+        self.exported += len(spans)
+        return SpanExportResult.SUCCESS
+
+
+def finished_spans(count: int) -> list:
+    tracer = TracerProvider().get_tracer(__name__)
+    spans = []
+    for i in range(count):
+        span = tracer.start_span("GET /items/{item_id}", attributes={"item.id": str(i)})
+        span.end()
+        spans.append(span)
+    return spans
+
+
+def run(label: str, make_processor, spans: list, total: int, threads: int, export_ms: float, work_us: float) -> None:
+    exporter = SleepyExporter(export_ms)
+    processor = make_processor(exporter, threads)
+    per_thread = total // threads
+    latencies: list[list[int]] = [[] for _ in range(threads)]
+    start_gate = threading.Barrier(threads + 1)
+
+    def produce(index: int) -> None:
+        on_end = processor.on_end
+        clock = time.perf_counter_ns
+        samples = latencies[index]
+        work_ns = int(work_us * 1000)
+        start_gate.wait()
+        for i in range(per_thread):
+            span = spans[i % len(spans)]
+            started = clock()
+            on_end(span)
+            ended = clock()
+            samples.append(ended - started)
+            while clock() - ended < work_ns:
+                pass
+
+    workers = [threading.Thread(target=produce, args=(n,)) for n in range(threads)]
+    for worker in workers:
+        worker.start()
+    start_gate.wait()
+    began = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - began
+    processor.force_flush()
+    processor.shutdown()
+
+    samples = sorted(ns for thread_samples in latencies for ns in thread_samples)
+    produced = per_thread * threads
+    p50 = samples[len(samples) // 2] / 1000
+    p99 = samples[int(len(samples) * 0.99)] / 1000
+    mean = statistics.fmean(samples) / 1000
+    print(
+        f"{label:<7} {threads:>7} {produced / elapsed:>12,.0f} {mean:>9.2f} {p50:>9.2f} {p99:>9.2f} "
+        f"{exporter.exported:>10,} {produced - exporter.exported:>9,}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Span processor benchmark")
+    parser.add_argument("--spans", type=int, default=200_000)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--export-ms", type=float, default=2.0)
+    parser.add_argument("--work-us", type=float, default=20.0)
+    args = parser.parse_args()
+
+    spans = finished_spans(1000)
+    processors = {
+        "batch": lambda exporter, threads: BatchSpanProcessor(
+            exporter, max_queue_size=QUEUE_SIZE, max_export_batch_size=512, schedule_delay_millis=5000
+        ),
+        # Per-thread rings: split the same total, rounded down to a power of two.
+        "ring": lambda exporter, threads: RingBufferSpanProcessor(
+            exporter,
+            capacity=1 << ((QUEUE_SIZE // threads).bit_length() - 1),
+            max_export_batch_size=512,
+            schedule_delay_millis=5000,
+        ),
+    }
+    print(f"{args.spans:,} spans, {args.work_us} µs of work per span, exporter {args.export_ms} ms per batch\n")
+    print(f"{'':<7} {'threads':>7} {'spans/s':>12} {'mean µs':>9} {'p50 µs':>9} {'p99 µs':>9} "
+          f"{'exported':>10} {'dropped':>9}")
+    for threads in args.threads:
+        for label, make_processor in processors.items():
+            run(label, make_processor, spans, args.spans, threads, args.export_ms, args.work_us)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+# ring_processor.py
+#
+# RingBufferSpanProcessor: a BatchSpanProcessor replacement for high span rates.
+#
+# BatchSpanProcessor's on_end runs on the request path. For every span it
+# checks the pid, pushes onto a shared deque and records queue metrics, and
+# then the export thread pops spans off one at a time. This processor keeps
+# on_end down to a few attribute reads and one list store:
+#
+#   • every producer thread gets its own preallocated ring (capacity slots,
+#     a power of two), so up to capacity × threads spans can be queued.
+#     One writer and one reader per ring means no lock on the fast path;
+#     the GIL makes each index update atomic. A lock is only taken the
+#     first time a thread ends a span, to register its ring.
+#   • the export thread takes whole slices out of each ring (batch hand-off)
+#     and exports up to max_export_batch_size spans per call
+#   • a full ring drops the new span and counts it. `dropped` is explicit
+#     and a warning is logged once per export cycle in which spans were lost.
+#   • adaptive flush: a ring passing `watermark` wakes the exporter early;
+#     otherwise the delay between exports shrinks under load (down to
+#     min_delay_millis) and grows when traffic is light (up to
+#     schedule_delay_millis)
+#
+# Select it with setup_telemetry(span_processor="ring") or
+# TELEMETRY_SPAN_PROCESSOR=ring.
+import threading
+
+from loguru import logger
+from opentelemetry.context import _SUPPRESS_INSTRUMENTATION_KEY, attach, detach, set_value
+from opentelemetry.sdk.trace import ReadableSpan, SpanProcessor
+from opentelemetry.sdk.trace.export import SpanExporter
+
+
+class _Ring:
+    """Single-producer, single-consumer ring of spans."""
+
+    __slots__ = ("slots", "mask", "head", "tail", "dropped", "thread")
+
+    def __init__(self, capacity: int, thread: threading.Thread):
+        self.slots: list[ReadableSpan | None] = [None] * capacity
+        self.mask = capacity - 1
+        self.head = 0  # written by the producer only
+        self.tail = 0  # written by the consumer only
+        self.dropped = 0
+        self.thread = thread
+
+    def take(self, limit: int) -> list[ReadableSpan]:
+        """Consumer side: remove and return up to `limit` of the oldest spans."""
+        count = min(self.head - self.tail, limit)
+        if count <= 0:
+            return []
+        start = self.tail & self.mask
+        end = start + count
+        capacity = self.mask + 1
+        if end <= capacity:
+            batch = self.slots[start:end]
+            self.slots[start:end] = [None] * count
+        else:
+            end -= capacity
+            batch = self.slots[start:] + self.slots[:end]
+            self.slots[start:] = [None] * (capacity - start)
+            self.slots[:end] = [None] * end
+        self.tail += count
+        return batch
+
+
+class RingBufferSpanProcessor(SpanProcessor):
+    """Per-thread ring buffers drained by one export thread."""
+
+    def __init__(
+        self,
+        span_exporter: SpanExporter,
+        capacity: int = 2048,
+        max_export_batch_size: int = 512,
+        schedule_delay_millis: float = 5000,
+        min_delay_millis: float = 100,
+        watermark: float = 0.5,
+    ):
+        if capacity & (capacity - 1):
+            raise ValueError("capacity must be a power of two")
+        self.span_exporter = span_exporter
+        self.capacity = capacity
+        self.max_export_batch_size = max_export_batch_size
+        self.max_delay = schedule_delay_millis / 1000
+        self.min_delay = min(min_delay_millis, schedule_delay_millis) / 1000
+        self.watermark = max(1, int(capacity * watermark))
+
+        self._local = threading.local()
+        self._rings: list[_Ring] = []
+        self._rings_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._flush_waiters: list[threading.Event] = []
+        self._shutdown = False
+        self._delay = self.max_delay
+
+        self.exported = 0
+        self.batches = 0
+        self._reported_drops = 0
+        self._retired_drops = 0
+
+        self._worker = threading.Thread(
+            name="OtelRingSpanProcessor", target=self._run, daemon=True
+        )
+        self._worker.start()
+
+    # ──────────────────────────────────────────────
+    # Producer side (request path)
+    # ──────────────────────────────────────────────
+    def on_start(self, span, parent_context=None) -> None:
+        pass
+
+    def on_end(self, span: ReadableSpan) -> None:
+        if not span.context.trace_flags.sampled or self._shutdown:
+            return
+        ring = getattr(self._local, "ring", None)
+        if ring is None:
+            ring = self._register()
+        head = ring.head
+        fill = head - ring.tail
+        if fill >= self.capacity:
+            ring.dropped += 1
+            self._wake.set()  # the exporter is behind; don't let it sleep
+            return
+        ring.slots[head & ring.mask] = span
+        ring.head = head + 1
+        if fill + 1 == self.watermark:
+            self._wake.set()
+
+    def _register(self) -> _Ring:
+        ring = _Ring(self.capacity, threading.current_thread())
+        with self._rings_lock:
+            self._rings.append(ring)
+        self._local.ring = ring
+        return ring
+
+    # ──────────────────────────────────────────────
+    # Consumer side (export thread)
+    # ──────────────────────────────────────────────
+    def _run(self) -> None:
+        while True:
+            woken = self._wake.wait(self._delay)
+            self._wake.clear()
+            shutdown = self._shutdown
+            # Only flushes requested before this drain starts are covered by
+            # it; one that arrives mid-drain waits for the next cycle.
+            waiters = self._take_flush_waiters()
+            exported = self._drain()
+            if woken or exported >= self.max_export_batch_size:
+                self._delay = max(self.min_delay, self._delay / 2)
+            elif exported < self.max_export_batch_size // 8:
+                self._delay = min(self.max_delay, self._delay * 2)
+            for waiter in waiters:
+                waiter.set()
+            if shutdown:
+                return
+
+    def _drain(self) -> int:
+        """Export everything queued right now; return how many spans went out."""
+        total = 0
+        while True:
+            batch: list[ReadableSpan] = []
+            with self._rings_lock:
+                rings = list(self._rings)
+            for ring in rings:
+                batch += ring.take(self.max_export_batch_size - len(batch))
+                if len(batch) >= self.max_export_batch_size:
+                    break
+            if not batch:
+                break
+            self._export(batch)
+            total += len(batch)
+        self._prune(rings)
+        self._report_drops()
+        return total
+
+    def _export(self, batch: list[ReadableSpan]) -> None:
+        token = attach(set_value(_SUPPRESS_INSTRUMENTATION_KEY, True))
+        try:
+            self.span_exporter.export(batch)
+        except Exception:
+            logger.exception("Exception while exporting spans")
+        finally:
+            detach(token)
+        self.exported += len(batch)
+        self.batches += 1
+
+    def _prune(self, rings: list[_Ring]) -> None:
+        dead = [r for r in rings if not r.thread.is_alive() and r.head == r.tail]
+        if dead:
+            with self._rings_lock:
+                for ring in dead:
+                    self._rings.remove(ring)
+                    self._retired_drops += ring.dropped  # keep `dropped` monotonic
+
+    @property
+    def dropped(self) -> int:
+        with self._rings_lock:
+            return self._retired_drops + sum(ring.dropped for ring in self._rings)
+
+    def _report_drops(self) -> None:
+        dropped = self.dropped
+        if dropped > self._reported_drops:
+            logger.warning(
+                "Span ring full, dropped spans",
+                dropped=dropped - self._reported_drops,
+                dropped_total=dropped,
+            )
+            self._reported_drops = dropped
+
+    def _take_flush_waiters(self) -> list[threading.Event]:
+        with self._rings_lock:
+            waiters, self._flush_waiters = self._flush_waiters, []
+        return waiters
+
+    # ──────────────────────────────────────────────
+    # SpanProcessor API
+    # ──────────────────────────────────────────────
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        if self._shutdown:
+            return False
+        done = threading.Event()
+        with self._rings_lock:
+            self._flush_waiters.append(done)
+        self._wake.set()
+        return done.wait(timeout_millis / 1000)
+
+    def shutdown(self) -> None:
+        if self._shutdown:
+            return
+        self._shutdown = True
+        self._wake.set()
+        self._worker.join()
+        self.span_exporter.shutdown()
+
+    def stats(self) -> dict[str, int]:
+        with self._rings_lock:
+            queued = sum(ring.head - ring.tail for ring in self._rings)
+            rings = len(self._rings)
+        return {
+            "queued": queued,
+            "exported": self.exported,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "rings": rings,
+            "delay_ms": round(self._delay * 1000),
+        }
@@ -0,0 +1,93 @@
+import threading
+import time
+
+import pytest
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+
+from ring_processor import RingBufferSpanProcessor, _Ring
+
+
+class ListExporter(SpanExporter):
+    def __init__(self, delay: float = 0.0):
+        self.batches = []
+        self.delay = delay
+        self.started = threading.Event()
+
+    def export(self, spans):
+        self.started.set()
+        time.sleep(self.delay)
+        self.batches.append(list(spans))
+        return SpanExportResult.SUCCESS
+
+    @property
+    def names(self):
+        return [span.name for batch in self.batches for span in batch]
+
+
+def _tracer(processor):
+    provider = TracerProvider()
+    provider.add_span_processor(processor)
+    return provider.get_tracer(__name__)
+
+
+def test_ring_hands_off_oldest_first_across_the_wrap():
+    ring = _Ring(4, threading.current_thread())
+    for value in range(3):
+        ring.slots[ring.head & ring.mask] = value
+        ring.head += 1
+    assert ring.take(2) == [0, 1]
+    for value in range(3, 6):
+        ring.slots[ring.head & ring.mask] = value
+        ring.head += 1
+    assert ring.take(10) == [2, 3, 4, 5]
+    assert ring.slots == [None] * 4
+
+
+def test_spans_from_several_threads_are_exported_in_batches():
+    exporter = ListExporter()
+    processor = RingBufferSpanProcessor(exporter, capacity=1024, max_export_batch_size=100)
+    tracer = _tracer(processor)
+
+    def work(prefix):
+        for i in range(300):
+            with tracer.start_as_current_span(f"{prefix}-{i}"):
+                pass
+
+    threads = [threading.Thread(target=work, args=(f"t{n}",)) for n in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert processor.force_flush()
+
+    names = exporter.names
+    assert len(names) == 900
+    assert all(len(batch) <= 100 for batch in exporter.batches)
+    t0 = [name for name in names if name.startswith("t0-")]
+    assert t0 == [f"t0-{i}" for i in range(300)]  # per-thread order is kept
+    assert processor.stats()["dropped"] == 0
+    processor.shutdown()
+
+
+def test_full_ring_drops_and_counts():
+    exporter = ListExporter(delay=0.5)
+    processor = RingBufferSpanProcessor(exporter, capacity=8, max_export_batch_size=8, watermark=1.0)
+    tracer = _tracer(processor)
+
+    for i in range(8):  # fills the ring and wakes the exporter (slow export)
+        with tracer.start_as_current_span(f"s{i}"):
+            pass
+    assert exporter.started.wait(2)  # the first 8 are taken; export is busy
+    for i in range(20):
+        with tracer.start_as_current_span(f"late{i}"):
+            pass
+    processor.shutdown()
+
+    assert processor.dropped == 12
+    assert len(exporter.names) == 16
+
+
+def test_capacity_must_be_a_power_of_two():
+    with pytest.raises(ValueError):
+        RingBufferSpanProcessor(ListExporter(), capacity=1000)
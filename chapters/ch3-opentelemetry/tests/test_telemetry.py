@@ -0,0 +1,42 @@
+import pytest
+
+import telemetry
+
+
+def test_settings_come_from_env_and_are_validated(monkeypatch):
+    monkeypatch.setenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://collector:4318")
+    monkeypatch.setenv("OTEL_EXPORTER_OTLP_PROTOCOL", "http/protobuf")
+    monkeypatch.delenv("OTEL_EXPORTER_OTLP_COMPRESSION", raising=False)
+
+    settings = telemetry.exporter_settings()
+
+    assert settings["endpoint"] == "http://collector:4318"
+    assert settings["protocol"] == telemetry.HTTP
+    assert settings["compression"] == telemetry.GZIP  # on by default
+    assert telemetry.exporter_settings(protocol="grpc", compression="none")["compression"] == "none"
+    with pytest.raises(ValueError):
+        telemetry.exporter_settings(protocol="http/json")
+    with pytest.raises(ValueError):
+        telemetry.exporter_settings(compression="zstd")
+
+
+def test_http_exporters_share_one_session_and_get_signal_paths():
+    settings = telemetry.exporter_settings("http://collector:4318/", "http/protobuf", "gzip")
+
+    spans = telemetry.build_exporter("traces", settings)
+    logs = telemetry.build_exporter("logs", settings)
+
+    assert spans._endpoint == "http://collector:4318/v1/traces"
+    assert logs._endpoint == "http://collector:4318/v1/logs"
+    assert telemetry._session is not None  # created once, reused by every HTTP exporter
+    assert spans._compression.value == "gzip"
+
+
+def test_grpc_exporter_is_compressed():
+    grpc = pytest.importorskip("grpc")
+    settings = telemetry.exporter_settings("http://collector:4317", "grpc", "gzip")
+
+    exporter = telemetry.build_exporter("traces", settings)
+
+    assert exporter._compression == grpc.Compression.Gzip
+    exporter.shutdown()
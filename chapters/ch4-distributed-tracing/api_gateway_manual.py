@@ -2,7 +2,9 @@ from contextlib import asynccontextmanager
 
 import httpx
 from fastapi import FastAPI
-from opentelemetry import propagate, trace
+from opentelemetry import trace
+
+from fast_propagation import inject_headers
 
 ORDER_SERVICE_URL = "http://localhost:8001"
 tracer = trace.get_tracer(__name__)
@@ -23,8 +25,7 @@ async def checkout():
     client = app.state.http_client
 
     with tracer.start_as_current_span("GET /checkout (manual)"):
-        headers = {}
-        propagate.inject(headers)
+        headers = inject_headers()
 
         response = await client.post(
             f"{ORDER_SERVICE_URL}/orders",
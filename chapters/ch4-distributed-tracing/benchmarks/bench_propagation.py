@@ -0,0 +1,69 @@
+# bench_propagation.py
+#
+# Per-hop cost of W3C propagation: stock propagate.inject/extract vs
+# fast_propagation.inject_headers/extract_scope.
+#
+# Usage (from the chapter directory):
+#   uv run python -m benchmarks.bench_propagation [--rounds 200000]
+#
+# Inject runs inside a recording SDK span, as in api_gateway_manual.checkout.
+# Extract runs on an ASGI scope with the headers an httpx client sends plus
+# traceparent, as in order_service_manual.create_order, where the stock path
+# includes `dict(request.headers)`.
+import argparse
+import timeit
+
+from opentelemetry import propagate
+from opentelemetry.sdk.trace import TracerProvider
+from starlette.requests import Request
+
+from fast_propagation import extract_scope, inject_headers
+
+HEADERS = [
+    (b"host", b"localhost:8001"),
+    (b"accept", b"*/*"),
+    (b"accept-encoding", b"gzip, deflate"),
+    (b"connection", b"keep-alive"),
+    (b"user-agent", b"python-httpx/0.28.1"),
+    (b"content-length", b"27"),
+    (b"content-type", b"application/json"),
+    (b"traceparent", b"00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"),
+]
+
+
+def stock_inject() -> dict:
+    headers = {}
+    propagate.inject(headers)
+    return headers
+
+
+def stock_extract(scope: dict):
+    return propagate.extract(dict(Request(scope).headers))
+
+
+def fast_extract(scope: dict):
+    return extract_scope(Request(scope).scope)
+
+
+def report(label: str, stock, fast, rounds: int) -> None:
+    stock_ns = timeit.timeit(stock, number=rounds) / rounds * 1e9
+    fast_ns = timeit.timeit(fast, number=rounds) / rounds * 1e9
+    print(f"{label:<8} stock {stock_ns:>7.0f} ns   fast {fast_ns:>7.0f} ns   {stock_ns / fast_ns:>5.1f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="W3C propagation microbenchmark")
+    parser.add_argument("--rounds", type=int, default=200_000)
+    args = parser.parse_args()
+
+    tracer = TracerProvider().get_tracer(__name__)
+    with tracer.start_as_current_span("GET /checkout (manual)"):
+        assert inject_headers() == stock_inject()
+        report("inject", stock_inject, inject_headers, args.rounds)
+
+    scope = {"type": "http", "headers": HEADERS}
+    report("extract", lambda: stock_extract(scope), lambda: fast_extract(scope), args.rounds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# fast_propagation.py
+#
+# A fast path for the default W3C propagators (tracecontext + baggage).
+#
+# propagate.inject() / propagate.extract() are generic: they go through the
+# CompositePropagator, a Getter/Setter per header, a regex search and, on the
+# receiving side, usually `dict(request.headers)`, which decodes and copies
+# every header of the request just to read one or two of them.
+#
+#   inject_headers()  formats traceparent once per span (cached) and only
+#                     touches baggage/tracestate when there is any
+#   extract_scope()   reads traceparent/tracestate/baggage straight from the
+#                     ASGI scope's raw (bytes, bytes) header list
+#
+# Both produce the same headers / Context as the stock propagators (see
+# tests/test_fast_propagation.py). Anything unusual — a global textmap other
+# than the default, a traceparent that isn't the plain version-00 shape, or
+# a baggage header — goes through the stock propagator, so only the common
+# path is specialized.
+import re
+from functools import lru_cache
+
+from opentelemetry import baggage, propagate, trace
+from opentelemetry.baggage.propagation import W3CBaggagePropagator
+from opentelemetry.context.context import Context
+from opentelemetry.propagators.composite import CompositePropagator
+from opentelemetry.trace.propagation.tracecontext import TraceContextTextMapPropagator
+
+_TRACEPARENT_00 = re.compile(r"00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})")
+_W3C_HEADERS = {b"traceparent": "traceparent", b"tracestate": "tracestate", b"baggage": "baggage"}
+
+_tracecontext = TraceContextTextMapPropagator()
+_baggage = W3CBaggagePropagator()
+
+
+def _is_default_textmap(textmap) -> bool:
+    propagators = getattr(textmap, "_propagators", None)
+    return (
+        type(textmap) is CompositePropagator
+        and propagators is not None
+        and [type(p) for p in propagators] == [TraceContextTextMapPropagator, W3CBaggagePropagator]
+    )
+
+
+_checked_textmap = None
+_checked_result = False
+
+
+def _fast_path_enabled() -> bool:
+    """True while the global textmap is the default tracecontext + baggage pair."""
+    global _checked_textmap, _checked_result
+    textmap = propagate.get_global_textmap()
+    if textmap is not _checked_textmap:
+        _checked_textmap, _checked_result = textmap, _is_default_textmap(textmap)
+    return _checked_result
+
+
+@lru_cache(maxsize=1024)
+def _traceparent(trace_id: int, span_id: int, trace_flags: int) -> str:
+    return f"00-{trace_id:032x}-{span_id:016x}-{trace_flags:02x}"
+
+
+# ──────────────────────────────────────────────
+# Inject
+# ──────────────────────────────────────────────
+def inject_headers(headers: dict[str, str] | None = None, context: Context | None = None) -> dict[str, str]:
+    """Return `headers` (or a new dict) with the W3C headers of `context` added."""
+    if headers is None:
+        headers = {}
+    if not _fast_path_enabled():
+        propagate.inject(headers, context)
+        return headers
+
+    span_context = trace.get_current_span(context).get_span_context()
+    if span_context != trace.INVALID_SPAN_CONTEXT:  # same check as the stock propagator
+        headers["traceparent"] = _traceparent(
+            span_context.trace_id, span_context.span_id, span_context.trace_flags
+        )
+        if span_context.trace_state:
+            headers["tracestate"] = span_context.trace_state.to_header()
+    if baggage.get_all(context):
+        _baggage.inject(headers, context)
+    return headers
+
+
+# ──────────────────────────────────────────────
+# Extract
+# ──────────────────────────────────────────────
+def extract_scope(scope: dict, context: Context | None = None) -> Context:
+    """Extract the W3C trace context and baggage from an ASGI scope's headers."""
+    headers = scope.get("headers", ())
+    if not _fast_path_enabled():
+        carrier: dict[str, str] = {}
+        for name, value in headers:
+            carrier.setdefault(name.decode("latin-1"), value.decode("latin-1"))
+        return propagate.extract(carrier, context)
+
+    found: dict[str, str] = {}
+    for name, value in headers:
+        key = _W3C_HEADERS.get(name)
+        if key is not None and key not in found:  # first occurrence, like Starlette
+            found[key] = value.decode("latin-1")
+
+    if context is None:
+        context = Context()
+    traceparent = found.get("traceparent")
+    if traceparent is not None:
+        match = None if "tracestate" in found else _TRACEPARENT_00.fullmatch(traceparent)
+        if match is None:
+            # tracestate, whitespace, other versions, invalid input: the stock
+            # rules decide. None of these is on the common path.
+            context = _tracecontext.extract(found, context)
+        else:
+            trace_id = int(match.group(1), 16)
+            span_id = int(match.group(2), 16)
+            if trace_id and span_id:
+                span_context = trace.SpanContext(
+                    trace_id=trace_id,
+                    span_id=span_id,
+                    is_remote=True,
+                    trace_flags=trace.TraceFlags(int(match.group(3), 16)),
+                )
+                context = trace.set_span_in_context(trace.NonRecordingSpan(span_context), context)
+    if "baggage" in found:
+        context = _baggage.extract(found, context)
+    return context
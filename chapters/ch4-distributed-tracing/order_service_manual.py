@@ -1,7 +1,9 @@
 import asyncio
 
 from fastapi import FastAPI, Request
-from opentelemetry import propagate, trace
+from opentelemetry import trace
+
+from fast_propagation import extract_scope
 
 app = FastAPI()
 tracer = trace.get_tracer(__name__)
@@ -9,8 +11,9 @@ tracer = trace.get_tracer(__name__)
 
 @app.post("/orders")
 async def create_order(order: dict, request: Request):
-    carrier = dict(request.headers)
-    extracted_context = propagate.extract(carrier)
+    # Reads traceparent/tracestate/baggage from the raw ASGI headers
+    # instead of copying every header with dict(request.headers).
+    extracted_context = extract_scope(request.scope)
 
     with tracer.start_as_current_span(
         "POST /orders (manual)", context=extracted_context
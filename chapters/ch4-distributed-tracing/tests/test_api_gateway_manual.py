@@ -30,11 +30,11 @@ def span_context_manager():
 def test_checkout_injects_context_and_calls_order_service(monkeypatch):
     injected = {"called": False}
 
-    def fake_inject(headers):
+    def fake_inject_headers():
         injected["called"] = True
-        headers["traceparent"] = "00-aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa-bbbbbbbbbbbbbbbb-01"
+        return {"traceparent": "00-aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa-bbbbbbbbbbbbbbbb-01"}
 
-    monkeypatch.setattr(api_gateway_manual.propagate, "inject", fake_inject)
+    monkeypatch.setattr(api_gateway_manual, "inject_headers", fake_inject_headers)
     monkeypatch.setattr(
         api_gateway_manual.tracer,
         "start_as_current_span",
@@ -0,0 +1,106 @@
+import pytest
+from opentelemetry import baggage, propagate, trace
+from opentelemetry.context.context import Context
+from opentelemetry.trace.propagation.tracecontext import TraceContextTextMapPropagator
+from starlette.datastructures import Headers
+
+from fast_propagation import extract_scope, inject_headers
+
+TRACEPARENT = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+
+EXTRACT_CASES = {
+    "sampled": [("traceparent", TRACEPARENT)],
+    "not sampled": [("traceparent", TRACEPARENT[:-2] + "00")],
+    "tracestate": [("traceparent", TRACEPARENT), ("tracestate", "vendor=abc,other=x1")],
+    "whitespace": [("traceparent", f" {TRACEPARENT}\t")],
+    "future version": [("traceparent", "01" + TRACEPARENT[2:] + "-extra")],
+    "v00 with suffix": [("traceparent", TRACEPARENT + "-extra")],
+    "version ff": [("traceparent", "ff" + TRACEPARENT[2:])],
+    "zero trace id": [("traceparent", f"00-{'0' * 32}-b7ad6b7169203331-01")],
+    "uppercase": [("traceparent", TRACEPARENT.upper())],
+    "garbage": [("traceparent", "not-a-traceparent")],
+    "duplicate": [("traceparent", TRACEPARENT), ("traceparent", "00-" + "1" * 32 + "-" + "2" * 16 + "-01")],
+    "baggage only": [("baggage", "user.id=42,tenant=acme%20corp")],
+    "everything": [
+        ("traceparent", TRACEPARENT),
+        ("tracestate", "vendor=abc"),
+        ("baggage", "user.id=42"),
+    ],
+    "no headers": [],
+}
+
+
+def _scope(headers):
+    common = [("host", "order-service"), ("content-type", "application/json"), ("accept", "*/*")]
+    return {
+        "type": "http",
+        "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in common + headers],
+    }
+
+
+@pytest.mark.parametrize("headers", EXTRACT_CASES.values(), ids=EXTRACT_CASES.keys())
+def test_extract_scope_matches_stock_propagator(headers):
+    scope = _scope(headers)
+
+    expected = propagate.extract(dict(Headers(scope=scope)))
+    actual = extract_scope(scope)
+
+    assert trace.get_current_span(actual).get_span_context() == trace.get_current_span(
+        expected
+    ).get_span_context()
+    assert baggage.get_all(actual) == baggage.get_all(expected)
+
+
+def _context(trace_flags=1, trace_state=None, entries=None, span_id=0xB7AD6B7169203331):
+    span_context = trace.SpanContext(
+        trace_id=0x0AF7651916CD43DD8448EB211C80319C,
+        span_id=span_id,
+        is_remote=False,
+        trace_flags=trace.TraceFlags(trace_flags),
+        trace_state=trace_state,
+    )
+    context = trace.set_span_in_context(trace.NonRecordingSpan(span_context), Context())
+    for key, value in (entries or {}).items():
+        context = baggage.set_baggage(key, value, context)
+    return context
+
+
+INJECT_CASES = {
+    "sampled": _context(),
+    "not sampled": _context(trace_flags=0),
+    "tracestate": _context(trace_state=trace.TraceState([("vendor", "abc"), ("other", "x1")])),
+    "baggage": _context(entries={"user.id": "42", "tenant": "acme corp/eu"}),
+    "invalid span": _context(span_id=0),
+    "empty context": Context(),
+}
+
+
+@pytest.mark.parametrize("context", INJECT_CASES.values(), ids=INJECT_CASES.keys())
+def test_inject_headers_matches_stock_propagator(context):
+    expected = {}
+    propagate.inject(expected, context)
+
+    assert inject_headers(context=context) == expected
+    assert inject_headers(context=context) == expected  # cached traceparent
+
+
+def test_round_trip_through_the_asgi_scope():
+    context = _context(entries={"user.id": "42"})
+    scope = _scope(list(inject_headers(context=context).items()))
+
+    extracted = extract_scope(scope)
+
+    assert trace.get_current_span(extracted).get_span_context().span_id == 0xB7AD6B7169203331
+    assert baggage.get_all(extracted) == {"user.id": "42"}
+
+
+def test_other_global_textmaps_use_the_stock_path(monkeypatch):
+    monkeypatch.setattr(propagate, "_HTTP_TEXT_FORMAT", TraceContextTextMapPropagator())
+    context = _context(entries={"user.id": "42"})
+
+    headers = inject_headers(context=context)
+    extracted = extract_scope(_scope([("traceparent", TRACEPARENT), ("baggage", "user.id=42")]))
+
+    assert "baggage" not in headers  # the configured textmap has no baggage propagator
+    assert baggage.get_all(extracted) == {}
+    assert trace.get_current_span(extracted).get_span_context().is_valid
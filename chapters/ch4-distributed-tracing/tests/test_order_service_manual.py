@@ -11,14 +11,14 @@ def span_context_manager():
 
 
 def test_orders_extracts_context_and_creates_child_span(monkeypatch):
-    captured = {"carrier": None, "context": None}
+    captured = {"headers": None, "context": None}
     extracted_context = object()
 
     async def fake_sleep(_seconds):
         return None
 
-    def fake_extract(carrier):
-        captured["carrier"] = carrier
+    def fake_extract_scope(scope):
+        captured["headers"] = dict(scope["headers"])
         return extracted_context
 
     def fake_start_as_current_span(name, context=None):
@@ -27,7 +27,7 @@ def test_orders_extracts_context_and_creates_child_span(monkeypatch):
         return span_context_manager()
 
     monkeypatch.setattr(order_service_manual.asyncio, "sleep", fake_sleep)
-    monkeypatch.setattr(order_service_manual.propagate, "extract", fake_extract)
+    monkeypatch.setattr(order_service_manual, "extract_scope", fake_extract_scope)
     monkeypatch.setattr(
         order_service_manual.tracer,
         "start_as_current_span",
@@ -45,6 +45,6 @@ def test_orders_extracts_context_and_creates_child_span(monkeypatch):
 
     assert response.status_code == 200
     assert response.json()["status"] == "created"
-    assert captured["carrier"] is not None
-    assert "traceparent" in captured["carrier"]
+    assert captured["headers"] is not None
+    assert b"traceparent" in captured["headers"]
     assert captured["context"] is extracted_context